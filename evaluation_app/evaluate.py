@@ -4,6 +4,7 @@ import os
 import argparse
 import sys
 import psycopg2
+import pandas as pd
 from evaluation_helpers import (
     get_abstract_metadata,
     get_valid_indices,
@@ -12,6 +13,10 @@ from evaluation_helpers import (
     get_navigation
 )
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+from metrics import (REFERENCE_MODEL, agreement_by_model, agreement_summary, per_index_identifiers,
+                     presence_confusion, assessment_confusion)
+
 app = Flask(__name__)
 
 def get_args():
@@ -169,33 +174,21 @@ def delete_assessment():
     conn.close()
     return jsonify({'status': 'success'})
 
+def read_results_frame(conn, q, models):
+    """results rows (idx, model, identifier) for the given models as a DataFrame."""
+    placeholders = ', '.join('?' for _ in models)
+    sql = q(f"SELECT idx, model, identifier FROM results WHERE model IN ({placeholders})")
+    return pd.read_sql_query(sql, conn, params=tuple(models))
+
+def read_assessments_frame(conn, q, assessor):
+    sql = q("SELECT idx, identifier, assessment FROM assessment WHERE assessor = ?")
+    return pd.read_sql_query(sql, conn, params=(assessor,))
+
 def calculate_confusion_matrix(model):
     conn, cursor, paramstyle, q, db_path = get_db_connection()
-    # Get all indices where medmentions has a result
-    sql = q('''
-        SELECT mm.idx, mm.identifier as medmentions_id, m.identifier as model_id, m.rowid as model_row_exists
-        FROM results mm
-        LEFT JOIN results m ON m.idx = mm.idx AND m.model = ?
-        WHERE mm.model = 'medmentions' AND mm.identifier IS NOT NULL
-    ''')
-    cursor.execute(sql, (model,))
-    rows = cursor.fetchall()
-    summary = {'match': 0, 'disagree': 0, 'null': 0}
-    for idx, medmentions_id, model_id, model_row_exists in rows:
-        if model_row_exists is None:
-            # No row for the model: skip
-            continue
-        if model_id is None:
-            # Model row exists and identifier is NULL
-            summary['null'] += 1
-        elif model_id == medmentions_id:
-            summary['match'] += 1
-        else:
-            summary['disagree'] += 1
-    # Add total for agree/disagree/null percentage calculation
-    summary['total'] = summary['match'] + summary['disagree'] + summary['null']
+    results = read_results_frame(conn, q, [REFERENCE_MODEL, model])
     conn.close()
-    return summary
+    return agreement_summary(agreement_by_model(results), model)
 
 @app.route('/results')
 def results_summary():
@@ -207,6 +200,9 @@ def results_summary():
     sql_models = q("SELECT DISTINCT model FROM results WHERE model != 'medmentions' ORDER BY model")
     cursor.execute(sql_models)
     models = [row[0] for row in cursor.fetchall()]
+    # Load results once and compute agreement with MedMentions for every model in one pass
+    results = read_results_frame(conn, q, [REFERENCE_MODEL] + models)
+    agreement = agreement_by_model(results)
     model_summaries = []
     for model in models:
         # Total results for this model
@@ -228,9 +224,9 @@ def results_summary():
         cursor.execute(sql_assessed, (model, assessor))
         assessed_count = cursor.fetchone()[0]
         # Add confusion matrix
-        confusion = calculate_confusion_matrix(model)
+        confusion = agreement_summary(agreement, model)
         # Add assessment confusion matrix
-        assessment_confusion = calculate_confusion_matrix_vs_assessment(model, assessor)
+        assessment_confusion = calculate_confusion_matrix_vs_assessment(model, assessor, results)
         # Calculate row, column, and grand totals for the assessment confusion matrix
         med_states = ['True', 'False', 'Unsure']
         model_states = ['True', 'False', 'Unsure', 'Null']
@@ -261,104 +257,21 @@ def confusion_matrix():
         selected_model = app.config['MODEL']
     model = selected_model
     conn, cursor, paramstyle, q, db_path = get_db_connection()
-    # Get all rows for this model, with medmentions
-    sql = q('''
-        SELECT r.idx,
-               mm.identifier as medmentions_id,
-               m.identifier as model_id
-        FROM results r
-        LEFT JOIN results mm ON mm.idx = r.idx AND mm.model = 'medmentions'
-        LEFT JOIN results m ON m.idx = r.idx AND m.model = ?
-        WHERE r.model = 'medmentions' OR r.model = ?
-        GROUP BY r.idx
-    ''')
-    cursor.execute(sql, (model, model))
-    rows = cursor.fetchall()
-    # Build confusion matrix
+    # One medmentions and one model identifier per idx
     # Rows: medmentions (present, null)
     # Columns: model (agrees, disagrees, is null)
-    matrix = {
-        'medmentions_present': {'agrees': 0, 'disagrees': 0, 'is_null': 0},
-        'medmentions_null': {'agrees': 0, 'disagrees': 0, 'is_null': 0}
-    }
-    for idx, medmentions_id, model_id in rows:
-        medmentions_is_null = medmentions_id is None
-        model_is_null = model_id is None
-        if medmentions_is_null:
-            row_key = 'medmentions_null'
-        else:
-            row_key = 'medmentions_present'
-        if model_is_null:
-            col_key = 'is_null'
-        elif not medmentions_is_null and model_id == medmentions_id:
-            col_key = 'agrees'
-        else:
-            col_key = 'disagrees'
-        matrix[row_key][col_key] += 1
+    matrix = presence_confusion(per_index_identifiers(read_results_frame(conn, q, [REFERENCE_MODEL, model]), model))
     conn.close()
     return render_template('confusion_matrix.html', matrix=matrix, model=model)
 
-def calculate_confusion_matrix_vs_assessment(model, assessor):
+def calculate_confusion_matrix_vs_assessment(model, assessor, results=None):
     conn, cursor, paramstyle, q, db_path = get_db_connection()
-    # Get all idx with medmentions and model results
-    sql = q('''
-        SELECT r.idx,
-               mm.identifier as medmentions_id,
-               m.identifier as model_id
-        FROM results r
-        LEFT JOIN results mm ON mm.idx = r.idx AND mm.model = 'medmentions'
-        LEFT JOIN results m ON m.idx = r.idx AND m.model = ?
-        WHERE r.model = 'medmentions' OR r.model = ?
-        GROUP BY r.idx
-    ''')
-    cursor.execute(sql, (model, model))
-    rows = cursor.fetchall()
-    # Confusion matrix: rows=medmentions (True, False, Unsure), cols=model (True, False, Unsure, Null)
-    matrix = {
-        'True':    {'True': 0, 'False': 0, 'Unsure': 0, 'Null': 0},
-        'False':   {'True': 0, 'False': 0, 'Unsure': 0, 'Null': 0},
-        'Unsure':  {'True': 0, 'False': 0, 'Unsure': 0, 'Null': 0},
-    }
-    from evaluation_helpers import get_assessor_assessments
-    for idx, medmentions_id, model_id in rows:
-        # If medmentions and model agree (same non-null identifier), both are True
-        if medmentions_id is not None and model_id is not None and medmentions_id == model_id:
-            matrix['True']['True'] += 1
-            continue
-        # Otherwise, only consider idx if:
-        # - For every non-null result (medmentions or model), there is an assessment for that identifier
-        # - There is a result for the model (not missing)
-        if model_id is None:
-            model_state = 'Null'
-        else:
-            model_state = None
-        # Get all assessments for this idx and assessor
-        assessments = get_assessor_assessments(idx, assessor, conn, paramstyle)
-        # Check if all non-null results have assessments
-        needed = []
-        if medmentions_id is not None:
-            needed.append(medmentions_id)
-        if model_id is not None:
-            needed.append(model_id)
-        if any(nid not in assessments for nid in needed):
-            continue  # skip idx if any assessment missing
-        # Map assessment values to states
-        def map_assessment(val):
-            if val is None:
-                return 'Null'
-            v = val.lower()
-            if v == 'agree':
-                return 'True'
-            elif v == 'disagree':
-                return 'False'
-            elif v == 'unsure':
-                return 'Unsure'
-            return 'Null'
-        med_state = map_assessment(assessments.get(medmentions_id)) if medmentions_id is not None else 'Null'
-        model_state = map_assessment(assessments.get(model_id)) if model_id is not None else 'Null'
-        matrix[med_state][model_state] += 1
+    if results is None:
+        results = read_results_frame(conn, q, [REFERENCE_MODEL, model])
+    assessments = read_assessments_frame(conn, q, assessor)
     conn.close()
-    return matrix
+    # Confusion matrix: rows=medmentions (True, False, Unsure), cols=model (True, False, Unsure, Null)
+    return assessment_confusion(per_index_identifiers(results, model), assessments)
 
 @app.route('/confusion_matrix_assessment')
 def confusion_matrix_assessment():
@@ -57,42 +57,27 @@ def get_abstract_from_db(pmid):
 
 def get_available_thresholds():
     c = get_conn().cursor()
-    c.execute('PRAGMA table_info(results)')
-    columns = [row[1] for row in c.fetchall()]
-    thresholds = set()
-    import re
-    for col in columns:
-        m = re.match(r'exact_matches_(\d+)', col)
-        if m:
-            thresholds.add(int(m.group(1)))
-    return sorted(thresholds)
+    c.execute('SELECT threshold FROM result_thresholds ORDER BY threshold')
+    return [row[0] for row in c.fetchall()]
 
 def load_candidates_for_index(idx, thresholds=None):
     if thresholds is None:
         thresholds = get_available_thresholds()
-    base_dir = os.path.join(get_run_dir(), 'parsed_inputs')
+    c = get_conn().cursor()
+    # One primary-key range of candidates
+    c.execute('SELECT threshold, color, label, taxon FROM candidates WHERE idx=? ORDER BY threshold, position', (idx,))
+    wanted = {int(t) for t in thresholds}
     candidates_by_threshold = {}
+    for threshold, color, label, taxon in c.fetchall():
+        if threshold in wanted:
+            display = f"{label} ({taxon})" if taxon else label
+            candidates_by_threshold.setdefault(str(threshold), []).append({'color': color, 'display': display})
     entity = None
-    for threshold in thresholds:
-        filename = f"bodies_{threshold}_colormap.jsonl"
-        path = os.path.join(base_dir, filename)
-        if not os.path.exists(path):
-            continue
-        with open(path) as f:
-            for line in f:
-                obj = json.loads(line)
-                if obj.get('index') == idx:
-                    if entity is None:
-                        entity = obj.get('entity')
-                    labels = obj.get('labels', {})
-                    taxons = obj.get('taxons', {})
-                    candidates = []
-                    for color, label in labels.items():
-                        taxon = taxons.get(color, "")
-                        display = f"{label} ({taxon})" if taxon else label
-                        candidates.append({'color': color, 'display': display})
-                    candidates_by_threshold[str(threshold)] = candidates
-                    break
+    if candidates_by_threshold:
+        c.execute('SELECT entity FROM entities_by_index WHERE idx=?', (idx,))
+        row = c.fetchone()
+        if row:
+            entity = row[0]
     return candidates_by_threshold, entity
 
 def get_pmid_for_index(idx):
@@ -136,24 +121,16 @@ def get_exact_model_map(idx, threshold):
       color_code -> set of models that flagged it as exact
     """
     c = get_conn().cursor()
-    tstr = str(threshold)
-    col = f'exact_matches_{tstr}'
-    c.execute(f'SELECT model, {col} FROM results WHERE idx=?', (idx,))
+    # One primary-key range of result_matches
+    c.execute("SELECT color_code, model FROM result_matches WHERE idx=? AND threshold=? AND relation_type='exact'", (idx, threshold))
     model_map = defaultdict(set)
-    for model, exact_json in c.fetchall():
-        if not exact_json:
-            continue
-        try:
-            codes = [code.strip() for code in exact_json.split(',') if code.strip()]
-        except Exception:
-            codes = []
-        for code in codes:
-            model_map[code].add(model)
+    for code, model in c.fetchall():
+        model_map[code].add(model)
     return model_map
 
 def get_all_models():
     c = get_conn().cursor()
-    c.execute('SELECT DISTINCT model FROM results')
+    c.execute('SELECT DISTINCT model FROM result_outputs')
     return sorted([row[0] for row in c.fetchall()])
 
 @app.route('/')
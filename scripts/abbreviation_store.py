@@ -0,0 +1,137 @@
+import os
+import re
+import json
+import sqlite3
+
+DEFAULT_STORE_PATH = os.path.join('input_data', 'abbreviation_index.db')
+
+
+class AbbreviationStore:
+    """
+    SQLite-backed index of abbreviation definitions keyed by (pmid, short form), kept in step with
+    abbreviation_llm_results.jsonl. The byte offset of the last ingested line is stored alongside,
+    so syncing after new abstracts are appended only reads the new lines.
+    """
+
+    def __init__(self, db_path=DEFAULT_STORE_PATH):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS abbreviations (
+            pmid TEXT,
+            short_form TEXT,
+            long_form TEXT,
+            source TEXT,
+            PRIMARY KEY (pmid, short_form)
+        ) WITHOUT ROWID''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS store_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )''')
+        self.conn.commit()
+        self._cache = None
+        self._patterns = {}
+        self._pending = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def _get_state(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM store_state WHERE key=?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO store_state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def add_row(self, row):
+        """Index one abbreviation_llm_results.jsonl row; malformed LLM entries are skipped."""
+        pmid = str(row.get("pmid"))
+        source = row.get("source", "llm")
+        entries = row.get("abbreviation_map") or []
+        if not isinstance(entries, list):
+            return
+        values = []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            short_form = entry.get("abbreviation")
+            long_form = entry.get("definition")
+            if isinstance(short_form, str) and isinstance(long_form, str) and short_form and long_form:
+                values.append((pmid, short_form, long_form, source))
+        self.conn.executemany('INSERT OR REPLACE INTO abbreviations (pmid, short_form, long_form, source) VALUES (?, ?, ?, ?)', values)
+        if self._cache is not None:
+            for pmid_, short_form, long_form, _ in values:
+                self._cache.setdefault(pmid_, {})[short_form] = long_form
+        self._patterns.pop(pmid, None)
+
+    def record(self, row, jsonl_path, offset):
+        """Index a row just appended to jsonl_path, whose end is now at byte offset."""
+        self.add_row(row)
+        self._set_state(f"offset:{os.path.abspath(jsonl_path)}", offset)
+        self._pending += 1
+        if self._pending >= 100:
+            self.conn.commit()
+            self._pending = 0
+
+    def sync(self, jsonl_path):
+        """Ingest lines appended to jsonl_path since the last sync. Returns the number of rows read."""
+        if not os.path.exists(jsonl_path):
+            return 0
+        key = f"offset:{os.path.abspath(jsonl_path)}"
+        offset = int(self._get_state(key, 0))
+        if offset > os.path.getsize(jsonl_path):
+            # The results file was rewritten; rebuild from scratch
+            self.conn.execute('DELETE FROM abbreviations')
+            self._cache = None
+            self._patterns = {}
+            offset = 0
+        count = 0
+        with open(jsonl_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # partially written line; pick it up next time
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    self.add_row(json.loads(line))
+                    count += 1
+                except Exception:
+                    continue
+        self._set_state(key, offset)
+        self.conn.commit()
+        return count
+
+    def _load_cache(self):
+        if self._cache is None:
+            self._cache = {}
+            for pmid, short_form, long_form in self.conn.execute('SELECT pmid, short_form, long_form FROM abbreviations'):
+                self._cache.setdefault(pmid, {})[short_form] = long_form
+        return self._cache
+
+    def lookup(self, pmid, short_form):
+        """O(1) lookup of the long form defined for short_form in abstract pmid, or None."""
+        return self._load_cache().get(str(pmid), {}).get(short_form)
+
+    def definitions(self, pmid):
+        return self._load_cache().get(str(pmid), {})
+
+    def expand(self, pmid, text, max_depth=3):
+        """
+        Replace every short form defined in abstract pmid that appears as a whole word in text with its
+        long form, repeating so that abbreviations inside definitions are fully expanded.
+        """
+        defs = self.definitions(pmid)
+        if not defs:
+            return text
+        pmid = str(pmid)
+        pattern = self._patterns.get(pmid)
+        if pattern is None:
+            pattern = re.compile(r'(?<!\w)(' + '|'.join(re.escape(sf) for sf in sorted(defs, key=len, reverse=True)) + r')(?!\w)')
+            self._patterns[pmid] = pattern
+        for _ in range(max_depth):
+            expanded = pattern.sub(lambda m: defs[m.group(1)], text)
+            if expanded == text:
+                break
+            text = expanded
+        return text
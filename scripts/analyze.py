@@ -1,13 +1,25 @@
-import json
 import os
 import argparse
 import sys
-from collections import defaultdict
+import pandas as pd
+from metrics import (load_evaluation_frame, model_threshold_metrics, pairwise_agreement, bootstrap_intervals, BOOTSTRAP_METRICS,
+                     count_prompts, corpus_extrapolation)
+from result_files import find_bodies_files
+
+def fmt(value, spec):
+    return value if value == "" else format(value, spec)
 
 def main():
     parser = argparse.ArgumentParser(description="Aggregate evaluation results by model and threshold.")
     parser.add_argument('--run', help='Run directory name')
     parser.add_argument("--input", help="Input evaluation summary JSONL file")
+    parser.add_argument('--bootstrap', type=int, default=2000, help='Bootstrap replicates for confidence intervals (default: 2000, 0 to disable)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the bootstrap intervals (default: 0.95)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the bootstrap (default: 0)')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for the bootstrap (default: 1)')
+    parser.add_argument('--corpus-run', help='Run whose bodies files give the prompt count per threshold for the full-corpus estimates (default: --run)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight per host assumed for TotalDurationDays (default: 1)')
+    parser.add_argument('--hosts', type=int, default=1, help='Hosts serving the model assumed for TotalDurationDays (default: 1)')
     args = parser.parse_args()
 
     run_dir = os.path.join('data', args.run)
@@ -17,72 +29,73 @@ def main():
         print(f"Error: {input_path} does not exist.")
         sys.exit(1)
 
-    # Aggregate stats: model -> threshold -> stats
-    stats = defaultdict(lambda: defaultdict(lambda: {"completed": 0, "single_exact": 0, "json_error": 0, "total_exact": 0, "sum_frac_missing": 0.0, "sum_frac_mismatched": 0.0, "sum_duration": 0.0, "duration_count": 0, "sum_cost": 0.0, "cost_count": 0}))
+    # Full-corpus estimates use the number of prompts in each threshold's bodies file
+    corpus_dir = os.path.join('data', args.corpus_run) if args.corpus_run else run_dir
+    prompt_counts = {str(t): count_prompts(path) for t, path in find_bodies_files(corpus_dir).items()}
+    if not prompt_counts:
+        print(f"Warning: no bodies files in {corpus_dir}/parsed_inputs; full-corpus estimates are left empty.")
+
+    df = load_evaluation_frame(input_path)
+    # Structured-output OpenAI rows are kept apart from plain ones so their deltas can be reported.
+    summaries = {}
+    metrics = corpus_extrapolation(model_threshold_metrics(df), prompt_counts, args.concurrency, args.hosts)
+    for m in metrics.to_dict("records"):
+        for key in ("avg_duration", "avg_cost", "avg_completion_tokens", "corpus_prompts", "prompts_per_hour", "total_duration_days", "total_cost"):
+            if pd.isna(m[key]):
+                m[key] = ""
+        summaries[((m["model"], bool(m["structured"])), m["threshold"])] = m
 
-    with open(input_path) as f:
-        for line in f:
-            if not line.strip():
-                continue
-            row = json.loads(line)
-            model = row.get("model name", "unknown")
-            threshold = row.get("threshold", "unknown")
-            stats[model][threshold]["completed"] += 1
-            num_exact = row.get("Number of exact matches", 0)
-            if num_exact == 1:
-                stats[model][threshold]["single_exact"] += 1
-            stats[model][threshold]["total_exact"] += num_exact
-            if not row.get("Valid JSON", True):
-                stats[model][threshold]["json_error"] += 1
-            # Calculate fraction of missing and mismatched codes for this row
-            colormap_length = row.get("Colormap Length", 0)
-            num_missing = row.get("Number of missing codes", 0)
-            num_mismatched = row.get("Number of mismatched codes", 0)
-            frac_missing = num_missing / colormap_length if colormap_length else 0.0
-            frac_mismatched = num_mismatched / colormap_length if colormap_length else 0.0
-            stats[model][threshold]["sum_frac_missing"] += frac_missing
-            stats[model][threshold]["sum_frac_mismatched"] += frac_mismatched
-            # Duration
-            duration = row.get("Duration (s)")
-            if duration is not None:
-                stats[model][threshold]["sum_duration"] += duration
-                stats[model][threshold]["duration_count"] += 1
-            # Cost
-            cost = row.get("Cost (USD)")
-            if cost is not None:
-                stats[model][threshold]["sum_cost"] += cost
-                stats[model][threshold]["cost_count"] += 1
+    # Percentile bootstrap intervals, appended as <Metric>Low/<Metric>High columns
+    ci_columns = [f"{name}{bound}" for name in BOOTSTRAP_METRICS for bound in ("Low", "High")] if args.bootstrap > 0 else []
+    if ci_columns:
+        for ci in bootstrap_intervals(df, args.bootstrap, args.confidence, args.seed, args.workers).to_dict("records"):
+            summaries[((ci["model"], bool(ci["structured"])), ci["threshold"])].update({c: ci[c] for c in ci_columns})
 
     # Print header and write to file
     output_path = os.path.splitext(input_path)[0] + "_aggregated.tsv"
+    header = "Model\tThreshold\tStructured\tCompleted\tFracSingleExact\tFracJsonError\tAvgNumExact\tAvgFracMissing\tAvgFracMismatched\tAvgDuration\tCorpusPrompts\tPromptsPerHour\tTotalDurationDays\tAvgCost\tTotalCost\tAvgCompletionTokens" + "".join(f"\t{c}" for c in ci_columns)
     with open(output_path, "w") as out:
-        out.write("Model\tThreshold\tCompleted\tFracSingleExact\tFracJsonError\tAvgNumExact\tAvgFracMissing\tAvgFracMismatched\tAvgDuration\tTotalDuration\tAvgCost\tTotalCost\n")
-        print("Model\tThreshold\tCompleted\tFracSingleExact\tFracJsonError\tAvgNumExact\tAvgFracMissing\tAvgFracMismatched\tAvgDuration\tTotalDuration\tAvgCost\tTotalCost")
-        for model in sorted(stats):
-            for threshold in sorted(stats[model], key=lambda x: (int(x) if str(x).isdigit() else x)):
-                s = stats[model][threshold]
-                completed = s["completed"]
-                frac_single_exact = s["single_exact"] / completed if completed else 0
-                frac_json_error = s["json_error"] / completed if completed else 0
-                avg_num_exact = s["total_exact"] / completed if completed else 0
-                avg_frac_missing = s["sum_frac_missing"] / completed if completed else 0
-                avg_frac_mismatched = s["sum_frac_mismatched"] / completed if completed else 0
-                # Duration columns
-                avg_duration = s["sum_duration"] / s["duration_count"] if s["duration_count"] else ""
-                if avg_duration != "":
-                    total_seconds = float(avg_duration) * 232429
-                    days = int(total_seconds // 86400)
-                    hours = int((total_seconds % 86400) // 3600)
-                    minutes = int((total_seconds % 3600) // 60)
-                    total_duration_str = f"{days}d {hours}h {minutes}m"
-                else:
-                    total_duration_str = ""
-                # Cost columns
-                avg_cost = s["sum_cost"] / s["cost_count"] if s["cost_count"] else ""
-                total_cost = float(avg_cost) * 232429 if avg_cost != "" else ""
-                out.write(f"{model}\t{threshold}\t{completed}\t{frac_single_exact:.3f}\t{frac_json_error:.3f}\t{avg_num_exact:.3f}\t{avg_frac_missing:.3f}\t{avg_frac_mismatched:.3f}\t{avg_duration if avg_duration == '' else f'{avg_duration:.3f}'}\t{total_duration_str}\t{avg_cost if avg_cost == '' else f'{avg_cost:.4f}'}\t{total_cost if total_cost == '' else f'{total_cost:.0f}'}\n")
-                print(f"{model}\t{threshold}\t{completed}\t{frac_single_exact:.3f}\t{frac_json_error:.3f}\t{avg_num_exact:.3f}\t{avg_frac_missing:.3f}\t{avg_frac_mismatched:.3f}\t{avg_duration if avg_duration == '' else f'{avg_duration:.3f}'}\t{total_duration_str}\t{avg_cost if avg_cost == '' else f'{avg_cost:.4f}'}\t{total_cost if total_cost == '' else f'{total_cost:.0f}'}")
+        out.write(header + "\n")
+        print(header)
+        for ((model, structured), threshold), m in summaries.items():
+            line = f"{model}\t{threshold}\t{structured}\t{m['completed']}\t{m['frac_single_exact']:.3f}\t{m['frac_json_error']:.3f}\t{m['avg_num_exact']:.3f}\t{m['avg_frac_missing']:.3f}\t{m['avg_frac_mismatched']:.3f}\t{fmt(m['avg_duration'], '.3f')}"
+            line += f"\t{fmt(m['corpus_prompts'], '.0f')}\t{fmt(m['prompts_per_hour'], '.1f')}\t{fmt(m['total_duration_days'], '.3f')}"
+            line += f"\t{fmt(m['avg_cost'], '.4f')}\t{fmt(m['total_cost'], '.2f')}\t{fmt(m['avg_completion_tokens'], '.1f')}"
+            line += "".join(f"\t{m[c]:.3f}" for c in ci_columns)
+            out.write(line + "\n")
+            print(line)
     print(f"Aggregated results written to {output_path}")
 
+    # Agreement between models on the exact-match choice for the same prompts
+    agreement = pairwise_agreement(df)
+    if not agreement.empty:
+        agreement_path = os.path.splitext(input_path)[0] + "_pairwise_agreement.tsv"
+        agreement.rename(columns={"threshold": "Threshold", "model_a": "ModelA", "model_b": "ModelB",
+                                  "shared": "SharedIndices", "agreement": "ExactAgreement"}) \
+            .to_csv(agreement_path, sep="\t", index=False, float_format="%.3f")
+        print(f"Pairwise exact-match agreement written to {agreement_path}")
+
+    # Structured vs. plain deltas for model/threshold pairs evaluated both ways
+    deltas_path = os.path.splitext(input_path)[0] + "_structured_deltas.tsv"
+    pairs = [(model, threshold) for ((model, structured), threshold) in summaries
+             if structured and ((model, False), threshold) in summaries]
+    if pairs:
+        header = "Model\tThreshold\tFracJsonErrorPlain\tFracJsonErrorStructured\tDeltaFracJsonError\tAvgCostPlain\tAvgCostStructured\tDeltaAvgCost\tDeltaAvgCompletionTokens"
+        print("\nStructured output deltas (structured - plain):")
+        print(header)
+        with open(deltas_path, "w") as out:
+            out.write(header + "\n")
+            for model, threshold in pairs:
+                plain = summaries[((model, False), threshold)]
+                structured = summaries[((model, True), threshold)]
+                cost_plain = plain["avg_cost"] if plain["avg_cost"] != "" else 0.0
+                cost_structured = structured["avg_cost"] if structured["avg_cost"] != "" else 0.0
+                tokens_plain = plain["avg_completion_tokens"] if plain["avg_completion_tokens"] != "" else 0.0
+                tokens_structured = structured["avg_completion_tokens"] if structured["avg_completion_tokens"] != "" else 0.0
+                line = f"{model}\t{threshold}\t{plain['frac_json_error']:.3f}\t{structured['frac_json_error']:.3f}\t{structured['frac_json_error'] - plain['frac_json_error']:+.3f}\t{cost_plain:.4f}\t{cost_structured:.4f}\t{cost_structured - cost_plain:+.4f}\t{tokens_structured - tokens_plain:+.1f}"
+                out.write(line + "\n")
+                print(line)
+        print(f"Structured output deltas written to {deltas_path}")
+
 if __name__ == "__main__":
     main()
@@ -1,16 +1,82 @@
 import sqlite3
 import json
 import os
+import csv
+import time
+import hashlib
 import argparse
-import re
+import traceback
+import multiprocessing
+from queue import Empty
+from datetime import datetime, timezone
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from result_files import threshold_from_colormap_name, threshold_from_results_column, colormap_file_name
+from load_sqlite import bulk_connection, finish_bulk_load
 
-def build_abstracts_db(jsonl_path, db_path):
-    conn = sqlite3.connect(db_path)
+# A build is a set of steps. Each step has a prepare(c) run on the writer (tables, staging), a statement
+# generator that parses its input files and yields (sql, params), and an optional finish(c) run on the writer
+# once every statement is in. A step is written in one transaction of its own, so a step that fails leaves
+# the database as it was. main() runs the generators of the steps whose inputs changed in worker processes
+# and writes their batches, one step at a time, through one writer connection; the build_* functions run one
+# step on a connection of their own. What each step was built from is recorded in build_manifest.
+# Bump when a step would build different rows from the same inputs
+BUILD_DB_VERSION = 3
+BATCH_ROWS = 5000
+QUEUE_BATCHES = 64
+
+def batch_statements(statements, size=BATCH_ROWS):
+    """Group consecutive (sql, params) with the same sql into (sql, [params, ...]) batches for executemany."""
+    sql, rows = None, []
+    for statement, params in statements:
+        if statement != sql or len(rows) >= size:
+            if rows:
+                yield sql, rows
+            sql, rows = statement, []
+        rows.append(params)
+    if rows:
+        yield sql, rows
+
+def apply_step(conn, prepare, batches, finish=None, record=None):
+    """
+    Run prepare(c), every (sql, rows) batch, finish(c) and record(c, count) in one transaction and commit it.
+    An error rolls all of it back, the tables prepare() created or dropped included, and is raised. Returns
+    the number of statements executed.
+    """
     c = conn.cursor()
+    count = 0
+    # An explicit BEGIN, as sqlite3 would otherwise run the DDL of prepare() outside the transaction
+    c.execute('BEGIN')
+    try:
+        prepare(c)
+        for sql, rows in batches:
+            c.executemany(sql, rows)
+            count += len(rows)
+        if finish:
+            finish(c)
+        if record:
+            record(c, count)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return count
+
+def write_step(db_path, prepare, statements, finish=None):
+    """Run one step on its own connection. Returns the number of statements executed."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return apply_step(conn, prepare, batch_statements(statements), finish)
+    finally:
+        conn.close()
+
+def prepare_abstracts(c):
     c.execute('''CREATE TABLE IF NOT EXISTS abstracts (
         pmid TEXT PRIMARY KEY,
         abstract TEXT
     )''')
+
+def iter_abstract_statements(jsonl_path):
     with open(jsonl_path) as f:
         for line in f:
             if line.strip():
@@ -19,19 +85,20 @@ def build_abstracts_db(jsonl_path, db_path):
                     pmid = str(obj.get('pmid'))
                     abstract = obj.get('text')
                     if pmid and abstract:
-                        c.execute('INSERT OR REPLACE INTO abstracts (pmid, abstract) VALUES (?, ?)', (pmid, abstract))
+                        yield 'INSERT OR REPLACE INTO abstracts (pmid, abstract) VALUES (?, ?)', (pmid, abstract)
                 except Exception:
-                    print(f"Error processing line: {line.strip()}", obj.keys())
-    conn.commit()
-    conn.close()
+                    print(f"Error processing line: {line.strip()}")
 
-def build_index_to_pmid(annotations_path, db_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
+def build_abstracts_db(jsonl_path, db_path):
+    write_step(db_path, prepare_abstracts, iter_abstract_statements(jsonl_path))
+
+def prepare_index_to_pmid(c):
     c.execute('''CREATE TABLE IF NOT EXISTS index_to_pmid (
         idx INTEGER PRIMARY KEY,
         pmid TEXT
     )''')
+
+def iter_index_to_pmid_statements(annotations_path):
     with open(annotations_path) as f:
         for idx, line in enumerate(f):
             if line.strip():
@@ -39,11 +106,12 @@ def build_index_to_pmid(annotations_path, db_path):
                     obj = json.loads(line)
                     pmid = str(obj.get('pmid'))
                     if pmid:
-                        c.execute('INSERT OR REPLACE INTO index_to_pmid (idx, pmid) VALUES (?, ?)', (idx, pmid))
+                        yield 'INSERT OR REPLACE INTO index_to_pmid (idx, pmid) VALUES (?, ?)', (idx, pmid)
                 except Exception:
                     print(f"Error processing line: {line.strip()}")
-    conn.commit()
-    conn.close()
+
+def build_index_to_pmid(annotations_path, db_path):
+    write_step(db_path, prepare_index_to_pmid, iter_index_to_pmid_statements(annotations_path))
 
 def get_available_thresholds(run_dir):
     import sys
@@ -52,9 +120,8 @@ def get_available_thresholds(run_dir):
     parsed_inputs_dir = os.path.join(run_dir, 'parsed_inputs')
     if os.path.exists(parsed_inputs_dir):
         for fname in os.listdir(parsed_inputs_dir):
-            m = re.match(r'bodies_(\d+)_colormap\.jsonl', fname)
-            if m:
-                t = int(m.group(1))
+            t = threshold_from_colormap_name(fname)
+            if t is not None:
                 print(f"Found threshold {t} in parsed_inputs: {fname}")
                 thresholds.add(t)
     if not thresholds:
@@ -63,10 +130,7 @@ def get_available_thresholds(run_dir):
     print(f"Final thresholds found: {sorted(thresholds)}")
     return sorted(thresholds)
 
-def build_entities_and_sequence_tables(db_path, data_dir, thresholds):
-    import glob
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
+def prepare_entities(c, thresholds):
     # Create entities_by_index table with entity column and dynamic threshold columns
     cols = ', '.join([f'entities_{t} TEXT' for t in thresholds])
     c.execute(f'''CREATE TABLE IF NOT EXISTS entities_by_index (
@@ -74,9 +138,22 @@ def build_entities_and_sequence_tables(db_path, data_dir, thresholds):
         entity TEXT,
         {cols}
     )''')
+    # Thresholds added since the table was created get their columns
+    existing = {row[1] for row in c.execute('PRAGMA table_info(entities_by_index)')}
+    for t in thresholds:
+        if f'entities_{t}' not in existing:
+            c.execute(f'ALTER TABLE entities_by_index ADD COLUMN entities_{t} TEXT')
+    # Create index_sequence table with both next and previous indices
+    c.execute('''CREATE TABLE IF NOT EXISTS index_sequence (
+        idx INTEGER PRIMARY KEY,
+        next_idx INTEGER,
+        prev_idx INTEGER
+    )''')
+
+def iter_entity_statements(data_dir, thresholds):
     entities_dict = {}
     for threshold in thresholds:
-        filename = os.path.join(data_dir, f"bodies_{threshold}_colormap.jsonl")
+        filename = os.path.join(data_dir, colormap_file_name(threshold))
         if not os.path.exists(filename):
             continue
         with open(filename) as f:
@@ -99,97 +176,433 @@ def build_entities_and_sequence_tables(db_path, data_dir, thresholds):
                             display_labels.append(label)
                     entities_dict[idx][f'entities_{threshold}'] = json.dumps(display_labels)
     # Insert into entities_by_index
+    placeholders = ', '.join(['?'] * (2 + len(thresholds)))
+    insert_sql = f'INSERT OR REPLACE INTO entities_by_index (idx, entity, {", ".join([f"entities_{t}" for t in thresholds])}) VALUES ({placeholders})'
     for idx, ents in entities_dict.items():
-        values = [idx, ents.get('entity')] + [ents.get(f'entities_{t}') for t in thresholds]
-        placeholders = ', '.join(['?'] * (2 + len(thresholds)))
-        c.execute(f'INSERT OR REPLACE INTO entities_by_index (idx, entity, {", ".join([f"entities_{t}" for t in thresholds])}) VALUES ({placeholders})', values)
-    # Create index_sequence table with both next and previous indices
-    c.execute('''CREATE TABLE IF NOT EXISTS index_sequence (
-        idx INTEGER PRIMARY KEY,
-        next_idx INTEGER,
-        prev_idx INTEGER
-    )''')
+        yield insert_sql, tuple([idx, ents.get('entity')] + [ents.get(f'entities_{t}') for t in thresholds])
     sorted_indices = sorted(entities_dict.keys())
     for i, idx in enumerate(sorted_indices):
         next_idx = sorted_indices[i+1] if i+1 < len(sorted_indices) else None
         prev_idx = sorted_indices[i-1] if i-1 >= 0 else None
-        c.execute('INSERT OR REPLACE INTO index_sequence (idx, next_idx, prev_idx) VALUES (?, ?, ?)', (idx, next_idx, prev_idx))
-    conn.commit()
-    conn.close()
+        yield 'INSERT OR REPLACE INTO index_sequence (idx, next_idx, prev_idx) VALUES (?, ?, ?)', (idx, next_idx, prev_idx)
 
-def build_results_table(db_path, data_dir, thresholds):
-    import csv
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    # Create results table with TEXT columns for color code lists, dynamic thresholds
-    cols = []
-    for t in thresholds:
-        for rtype in ['exact', 'superclass', 'subclass', 'related', 'none']:
-            cols.append(f'{rtype}_matches_{t} TEXT')
-    cols_str = ', '.join(cols)
-    c.execute(f'''CREATE TABLE IF NOT EXISTS results (
+def build_entities_and_sequence_tables(db_path, data_dir, thresholds):
+    write_step(db_path, partial(prepare_entities, thresholds=thresholds), iter_entity_statements(data_dir, thresholds))
+
+def iter_candidate_rows(colormap_path, threshold):
+    """
+    (idx, threshold, position, color, label, taxon, identifier) per candidate of a colormap, in prompt order.
+    Only the first line of an index is read; later lines for it are skipped whole.
+    """
+    seen = set()
+    with open(colormap_path) as f:
+        for line in f:
+            if line.strip():
+                obj = json.loads(line)
+                idx = obj.get('index')
+                if idx is None or idx in seen:
+                    continue
+                seen.add(idx)
+                taxons = obj.get('taxons', {})
+                identifiers = obj.get('identifiers', {})
+                for position, (color, label) in enumerate(obj.get('labels', {}).items()):
+                    yield (idx, threshold, position, color, label, taxons.get(color) or None, identifiers.get(color))
+
+def prepare_candidates(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS candidates (
         idx INTEGER,
-        model TEXT,
-        {cols_str},
-        PRIMARY KEY (idx, model)
-    )''')
-    agg_path = os.path.join(data_dir, 'results_all.tsv')
-    if not os.path.exists(agg_path):
-        print(f"No aggregated summary found at {agg_path}")
-        conn.close()
-        return
-    with open(agg_path) as f:
+        threshold INTEGER,
+        position INTEGER,
+        color TEXT,
+        label TEXT,
+        taxon TEXT,
+        identifier TEXT,
+        PRIMARY KEY (idx, threshold, position)
+    ) WITHOUT ROWID''')
+
+def iter_candidate_statements(data_dir, thresholds):
+    """The rows of a threshold are replaced by those of its colormap; the first line of an index wins."""
+    for threshold in thresholds:
+        filename = os.path.join(data_dir, colormap_file_name(threshold))
+        if not os.path.exists(filename):
+            continue
+        yield 'DELETE FROM candidates WHERE threshold = ?', (int(threshold),)
+        for row in iter_candidate_rows(filename, int(threshold)):
+            yield 'INSERT INTO candidates VALUES (?, ?, ?, ?, ?, ?, ?)', row
+
+def build_candidates_table(db_path, data_dir, thresholds):
+    """
+    Load the candidates of every bodies_{t}_colormap.jsonl into the candidates table, keyed by (idx, threshold,
+    position), so the browser serves an index's candidates with one primary-key range instead of scanning the
+    colormaps.
+    """
+    count = write_step(db_path, prepare_candidates, iter_candidate_statements(data_dir, thresholds))
+    print(f"Loaded {count} candidate rows.")
+
+MATCH_TYPES = ['exact', 'superclass', 'subclass', 'related', 'none']
+
+def iter_match_rows(agg_path):
+    """(idx, model, threshold, exact, subclass, superclass, related, none) per results_all.tsv row."""
+    with open(agg_path, newline='') as f:
         reader = csv.DictReader(f, delimiter='\t')
         for row in reader:
             try:
                 idx = int(row['index'])
+                threshold = int(row['threshold'])
             except Exception:
                 print(f"Skipping screwy row")
                 continue
-            model = row['model']
-            threshold = int(row['threshold'])
-            tstr = str(threshold)
-            update_dict = {
-                f'exact_matches_{tstr}': row['exact_matches'],
-                f'subclass_matches_{tstr}': row['subclass_matches'],
-                f'superclass_matches_{tstr}': row['superclass_matches'],
-                f'related_matches_{tstr}': row['related_matches'],
-                f'none_matches_{tstr}': row['none_matches'],
-            }
-            set_clause = ', '.join([f'{k}=?' for k in update_dict.keys()])
-            values = list(update_dict.values())
-            c.execute('SELECT 1 FROM results WHERE idx=? AND model=?', (idx, model))
-            exists = c.fetchone()
-            if exists:
-                c.execute(f'UPDATE results SET {set_clause} WHERE idx=? AND model=?', values + [idx, model])
-            else:
-                insert_cols = ['idx', 'model'] + list(update_dict.keys())
-                insert_vals = [idx, model] + values
-                # Fill in empty lists for other thresholds
-                for t in thresholds:
-                    if str(t) == tstr:
-                        continue
-                    for rtype in ['exact', 'superclass', 'subclass', 'related', 'none']:
-                        col = f'{rtype}_matches_{t}'
-                        insert_cols.append(col)
-                        insert_vals.append('')
-                c.execute(f'INSERT OR REPLACE INTO results ({', '.join(insert_cols)}) VALUES ({', '.join(['?']*len(insert_cols))})', insert_vals)
-    conn.commit()
-    conn.close()
+            yield (idx, row['model'], threshold, row['exact_matches'], row['subclass_matches'],
+                   row['superclass_matches'], row['related_matches'], row['none_matches'])
+
+# Model results are stored long: result_outputs has one row per evaluated (idx, model, threshold) output and
+# result_matches one row per color code the output returned, by relation type, with its position in the
+# output's list so that order and repeated codes survive. The WITHOUT ROWID primary key of result_matches
+# covers the browser's per-index lookup and idx_result_matches_threshold covers queries across models at one
+# threshold. result_thresholds lists the thresholds built, including any without
+# output. A new threshold is only new rows; the results view, which pivots the matches back into the former
+# wide {type}_matches_{t} columns (comma-joined codes, '' for an output without matches, NULL for no
+# output), is recreated on every build.
+RESULT_TABLES = [
+    '''CREATE TABLE IF NOT EXISTS result_outputs (
+        idx INTEGER,
+        model TEXT,
+        threshold INTEGER,
+        PRIMARY KEY (idx, model, threshold)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS result_matches (
+        idx INTEGER,
+        threshold INTEGER,
+        relation_type TEXT,
+        model TEXT,
+        position INTEGER,
+        color_code TEXT,
+        PRIMARY KEY (idx, threshold, relation_type, model, position)
+    ) WITHOUT ROWID''',
+    '''CREATE INDEX IF NOT EXISTS idx_result_matches_threshold
+        ON result_matches (threshold, relation_type, model, idx, color_code)''',
+    '''CREATE TABLE IF NOT EXISTS result_thresholds (
+        threshold INTEGER PRIMARY KEY
+    )''',
+]
+
+def create_staged_matches(c):
+    c.execute('''CREATE TEMP TABLE staged_matches (
+        idx INTEGER,
+        model TEXT,
+        threshold INTEGER,
+        exact_matches TEXT,
+        subclass_matches TEXT,
+        superclass_matches TEXT,
+        related_matches TEXT,
+        none_matches TEXT,
+        PRIMARY KEY (idx, model, threshold)
+    )''')
+
+def stage_wide_results(c):
+    """
+    Stage the rows of a results table from before result_matches (one {type}_matches_{t} column per match
+    type and threshold) and drop it, so merge_staged_matches() converts it. Returns its thresholds.
+    """
+    columns = [row[1] for row in c.execute('PRAGMA table_info(results)')]
+    thresholds = sorted(t for t in map(threshold_from_results_column, columns) if t is not None)
+    for t in thresholds:
+        wide = [f'{rtype}_matches_{t}' for rtype in MATCH_TYPES]
+        values = ', '.join(f"COALESCE({col}, '')" for col in wide)
+        c.execute(f'''INSERT OR REPLACE INTO staged_matches (idx, model, threshold, {', '.join(f'{rtype}_matches' for rtype in MATCH_TYPES)})
+            SELECT idx, model, {int(t)}, {values} FROM results
+            WHERE {' OR '.join(f'{col} IS NOT NULL' for col in wide)}''')
+    c.execute('DROP TABLE results')
+    staged = c.execute('SELECT COUNT(*) FROM staged_matches').fetchone()[0]
+    print(f"Converting wide results table ({staged} outputs) to result_matches.")
+    return thresholds
+
+def merge_staged_matches(c):
+    """
+    Replace the outputs in staged_matches, and all their matches, with the staged ones. The comma-joined
+    code lists are split in SQL by a recursive CTE. Returns the number of outputs merged.
+    """
+    c.execute('''DELETE FROM result_matches WHERE (idx, model, threshold) IN
+        (SELECT idx, model, threshold FROM staged_matches)''')
+    c.execute('INSERT OR REPLACE INTO result_outputs (idx, model, threshold) SELECT idx, model, threshold FROM staged_matches')
+    merged = c.rowcount
+    lists = ' UNION ALL '.join(f"SELECT idx, model, threshold, '{rtype}' AS relation_type, {rtype}_matches || ',' AS codes FROM staged_matches"
+                               for rtype in MATCH_TYPES)
+    c.execute(f'''WITH RECURSIVE codes (idx, model, threshold, relation_type, position, color_code, rest) AS (
+            SELECT idx, model, threshold, relation_type, -1, '', codes FROM ({lists})
+            UNION ALL
+            SELECT idx, model, threshold, relation_type, position + 1, TRIM(SUBSTR(rest, 1, INSTR(rest, ',') - 1)), SUBSTR(rest, INSTR(rest, ',') + 1)
+            FROM codes WHERE rest != ''
+        )
+        INSERT INTO result_matches (idx, threshold, relation_type, model, position, color_code)
+        SELECT idx, threshold, relation_type, model, position, color_code FROM codes WHERE color_code != ''
+    ''')
+    return merged
+
+def create_results_view(c):
+    """
+    (Re)create the results view with {type}_matches_{t} columns for every threshold in result_thresholds. The
+    codes of a column are concatenated from a subquery ordered by position, so the view gives back the lists
+    as they were loaded.
+    """
+    thresholds = [row[0] for row in c.execute('SELECT threshold FROM result_thresholds ORDER BY threshold')]
+    pivot = ''.join(f''',
+        CASE WHEN MAX(o.threshold = {t}) THEN COALESCE(
+            (SELECT GROUP_CONCAT(color_code, ',') FROM (SELECT m.color_code FROM result_matches m
+             WHERE m.idx = o.idx AND m.threshold = {t} AND m.relation_type = '{rtype}' AND m.model = o.model
+             ORDER BY m.position)), '') END
+            AS {rtype}_matches_{t}''' for t in thresholds for rtype in MATCH_TYPES)
+    c.execute('DROP VIEW IF EXISTS results')
+    c.execute(f'''CREATE VIEW results AS
+        SELECT o.idx AS idx, o.model AS model{pivot}
+        FROM result_outputs o GROUP BY o.idx, o.model''')
+
+def add_match_positions(c):
+    """
+    Rebuild a result_matches table from before its position column. Its original order is gone, so the
+    codes of an output are numbered in code order; the next merge of their output restores it.
+    """
+    # The view is recreated by finish_results()
+    c.execute('DROP VIEW IF EXISTS results')
+    c.execute('ALTER TABLE result_matches RENAME TO result_matches_unordered')
+    c.execute('DROP INDEX IF EXISTS idx_result_matches_threshold')
+    c.execute(RESULT_TABLES[1])
+    c.execute('''INSERT INTO result_matches (idx, threshold, relation_type, model, position, color_code)
+        SELECT idx, threshold, relation_type, model,
+               ROW_NUMBER() OVER (PARTITION BY idx, threshold, relation_type, model ORDER BY color_code) - 1, color_code
+        FROM result_matches_unordered''')
+    c.execute('DROP TABLE result_matches_unordered')
+
+def prepare_results(c, thresholds):
+    create_staged_matches(c)
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'results'").fetchone():
+        thresholds = sorted(set(thresholds) | set(stage_wide_results(c)))
+    columns = {row[1] for row in c.execute('PRAGMA table_info(result_matches)')}
+    if columns and 'position' not in columns:
+        add_match_positions(c)
+    for sql in RESULT_TABLES:
+        c.execute(sql)
+    c.executemany('INSERT OR IGNORE INTO result_thresholds (threshold) VALUES (?)', [(int(t),) for t in thresholds])
+
+def iter_result_statements(agg_path):
+    if not os.path.exists(agg_path):
+        print(f"No aggregated summary found at {agg_path}")
+        return
+    # Later rows for the same (idx, model, threshold) replace earlier ones
+    for row in iter_match_rows(agg_path):
+        yield 'INSERT OR REPLACE INTO staged_matches VALUES (?, ?, ?, ?, ?, ?, ?, ?)', row
+
+def finish_results(c):
+    merged = merge_staged_matches(c)
+    c.execute('INSERT OR IGNORE INTO result_thresholds (threshold) SELECT DISTINCT threshold FROM staged_matches')
+    c.execute('DROP TABLE staged_matches')
+    create_results_view(c)
+    print(f"Merged {merged} outputs into result_matches.")
+
+def build_results_table(db_path, data_dir, thresholds):
+    """
+    Merge results_all.tsv into result_outputs and result_matches. The TSV is staged into a temporary table
+    (the last row of an (idx, model, threshold) output wins) and each staged output replaces the stored one,
+    matches included; outputs of other thresholds or models are kept. A results table from an earlier
+    build_db.py is converted first.
+    """
+    write_step(db_path, partial(prepare_results, thresholds=thresholds),
+               iter_result_statements(os.path.join(data_dir, 'results_all.tsv')), finish_results)
+
+def plan_steps(run_dir, jsonl_path, annotations_path, thresholds):
+    """
+    step -> dict of its input files, the parameters it was built with, prepare(c), the statement generator
+    and its arguments (run in a worker, so both must pickle) and finish(c) or None. Steps are independent.
+    """
+    parsed_inputs = os.path.join(run_dir, 'parsed_inputs')
+    colormaps = [os.path.join(parsed_inputs, colormap_file_name(t)) for t in thresholds]
+    colormaps = [path for path in colormaps if os.path.exists(path)]
+    agg_path = os.path.join(run_dir, 'results_all.tsv')
+    return {
+        'abstracts': dict(inputs=[jsonl_path], params={}, prepare=prepare_abstracts,
+                          parse=iter_abstract_statements, args=(jsonl_path,), finish=None),
+        'index_to_pmid': dict(inputs=[annotations_path], params={}, prepare=prepare_index_to_pmid,
+                              parse=iter_index_to_pmid_statements, args=(annotations_path,), finish=None),
+        'entities': dict(inputs=colormaps, params={'thresholds': thresholds}, prepare=partial(prepare_entities, thresholds=thresholds),
+                         parse=iter_entity_statements, args=(parsed_inputs, thresholds), finish=None),
+        'candidates': dict(inputs=colormaps, params={'thresholds': thresholds}, prepare=prepare_candidates,
+                           parse=iter_candidate_statements, args=(parsed_inputs, thresholds), finish=None),
+        'results': dict(inputs=[agg_path], params={'thresholds': thresholds}, prepare=partial(prepare_results, thresholds=thresholds),
+                        parse=iter_result_statements, args=(agg_path,), finish=finish_results),
+    }
+
+MANIFEST_SQL = '''CREATE TABLE IF NOT EXISTS build_manifest (
+    step TEXT PRIMARY KEY,
+    inputs TEXT,
+    params TEXT,
+    statements INTEGER,
+    seconds REAL,
+    built_at TEXT
+)'''
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def input_stamps(paths, recorded, workers=1):
+    """
+    [{path, size, mtime_ns, sha256}] for paths (sha256 None for a missing file). A file whose size and mtime
+    match its recorded stamp keeps the recorded hash; the others are hashed, in parallel when workers > 1.
+    """
+    stamps = {}
+    to_hash = []
+    for path in dict.fromkeys(paths):
+        if not os.path.exists(path):
+            stamps[path] = {'path': path, 'size': None, 'mtime_ns': None, 'sha256': None}
+            continue
+        st = os.stat(path)
+        stamp = {'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': None}
+        old = recorded.get(path)
+        if old and old['size'] == stamp['size'] and old['mtime_ns'] == stamp['mtime_ns']:
+            stamp['sha256'] = old['sha256']
+        else:
+            to_hash.append(path)
+        stamps[path] = stamp
+    if workers > 1 and len(to_hash) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(to_hash))) as pool:
+            hashes = list(pool.map(file_sha256, to_hash))
+    else:
+        hashes = [file_sha256(path) for path in to_hash]
+    for path, sha256 in zip(to_hash, hashes):
+        stamps[path]['sha256'] = sha256
+    return stamps
+
+def parse_worker(step, parse, args, queue):
+    """Worker process: send the statements of one step to the writer in batches, then 'done' or 'error'."""
+    try:
+        for sql, rows in batch_statements(parse(*args)):
+            queue.put(('rows', step, sql, rows))
+        queue.put(('done', step, None, None))
+    except Exception:
+        queue.put(('error', step, None, traceback.format_exc()))
+
+def queued_batches(queue, process):
+    """The batches a parse_worker sends until 'done'. Raises if it reports an error or dies without finishing."""
+    while True:
+        try:
+            kind, _, sql, payload = queue.get(timeout=1)
+        except Empty:
+            # A worker killed before it could report (e.g. out of memory) never sends 'done'
+            if process.exitcode not in (None, 0):
+                raise RuntimeError(f"worker exited with code {process.exitcode}")
+            continue
+        if kind == 'done':
+            return
+        if kind == 'error':
+            raise RuntimeError(payload)
+        yield sql, payload
+
+def run_build(db_path, steps, workers=1, force=False):
+    """
+    Build the steps whose inputs or parameters changed since the build recorded in build_manifest (all of
+    them with force). Their statement generators run in up to workers processes, each sending its batches
+    through a queue of its own, and this process writes the steps one at a time on one connection. Each step
+    (prepare, rows, finish and its build_manifest row) is one transaction: a step is recorded only if it
+    committed, and a step that fails is rolled back whole. Returns step -> 'skipped', 'built' or 'failed'.
+    """
+    conn, journal_mode = bulk_connection(db_path)
+    c = conn.cursor()
+    status = {}
+    try:
+        c.execute(MANIFEST_SQL)
+        manifest = {step: (json.loads(inputs), json.loads(params)) for step, inputs, params in
+                    c.execute('SELECT step, inputs, params FROM build_manifest')}
+        recorded = {stamp['path']: stamp for inputs, _ in manifest.values() for stamp in inputs}
+        stamps = input_stamps([path for spec in steps.values() for path in spec['inputs']], recorded, workers)
+        pending = {}
+        for step, spec in steps.items():
+            inputs = [stamps[path] for path in spec['inputs']]
+            params = dict(spec['params'], version=BUILD_DB_VERSION)
+            old = manifest.get(step)
+            if not force and old and old[1] == params and \
+                    [(s['path'], s['sha256']) for s in old[0]] == [(s['path'], s['sha256']) for s in inputs]:
+                print(f"Skipping {step}: inputs unchanged since the last build.")
+                status[step] = 'skipped'
+                continue
+            pending[step] = {'inputs': inputs, 'params': params, 'start': None}
+
+        def write(step, batches):
+            """Write one step; its manifest row goes in with its rows."""
+            info = pending[step]
+
+            def record(c, count):
+                info['count'] = count
+                info['seconds'] = time.perf_counter() - info['start']
+                c.execute('INSERT OR REPLACE INTO build_manifest VALUES (?, ?, ?, ?, ?, ?)',
+                          (step, json.dumps(info['inputs']), json.dumps(info['params']), count, info['seconds'],
+                           datetime.now(timezone.utc).isoformat(timespec='seconds')))
+
+            spec = steps[step]
+            apply_step(conn, spec['prepare'], batches, spec['finish'], record)
+            status[step] = 'built'
+            print(f"Built {step}: {info['count']} statements in {info['seconds']:.2f}s.")
+
+        def fail(step, message):
+            status[step] = 'failed'
+            print(f"Error building {step}:\n{message}")
+
+        if workers > 1 and len(pending) > 1:
+            ctx = multiprocessing.get_context()
+            waiting = list(pending)
+            running = {}
+            while waiting or running:
+                while waiting and len(running) < workers:
+                    step = waiting.pop(0)
+                    spec = steps[step]
+                    queue = ctx.Queue(maxsize=QUEUE_BATCHES)
+                    pending[step]['start'] = time.perf_counter()
+                    process = ctx.Process(target=parse_worker, args=(step, spec['parse'], spec['args'], queue), daemon=True)
+                    process.start()
+                    running[step] = (process, queue)
+                # The oldest step is written while the others parse ahead into their own bounded queues
+                step, (process, queue) = next(iter(running.items()))
+                try:
+                    write(step, queued_batches(queue, process))
+                except Exception as e:
+                    fail(step, e)
+                    if process.is_alive():
+                        process.terminate()
+                process.join()
+                del running[step]
+        else:
+            for step in pending:
+                spec = steps[step]
+                pending[step]['start'] = time.perf_counter()
+                try:
+                    write(step, batch_statements(spec['parse'](*spec['args'])))
+                except Exception:
+                    fail(step, traceback.format_exc())
+        if pending:
+            c.execute('ANALYZE')
+    finally:
+        finish_bulk_load(conn, journal_mode)
+    return status
 
 def main():
+    import sys
     parser = argparse.ArgumentParser()
     parser.add_argument('--run', help='Run directory name')
+    parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 5), help='Worker processes parsing inputs (default: one per step, up to the CPU count)')
+    parser.add_argument('--force', action='store_true', help='Rebuild every step, even if its inputs are unchanged')
     args = parser.parse_args()
     run_dir = os.path.join('data', args.run)
     db_path = os.path.join(run_dir, 'results.db')
     jsonl_path = os.path.join('input_data', 'corpus_pubtator_normalized_8-4-2025.jsonl')
     annotations_path = os.path.join('input_data', 'annotations-7-30-25.jsonl')
     thresholds = get_available_thresholds(run_dir)
-    build_abstracts_db(jsonl_path, db_path)
-    build_index_to_pmid(annotations_path, db_path)
-    build_entities_and_sequence_tables(db_path, os.path.join(run_dir, 'parsed_inputs'), thresholds)
-    build_results_table(db_path, run_dir, thresholds)
+    start = time.perf_counter()
+    status = run_build(db_path, plan_steps(run_dir, jsonl_path, annotations_path, thresholds), args.workers, args.force)
+    print(f"Built {db_path} in {time.perf_counter() - start:.2f}s")
+    if 'failed' in status.values():
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,178 @@
+import os
+import glob
+import pickle
+import argparse
+import pandas as pd
+from metrics import EVALUATION_COLUMNS, load_evaluation_frame, model_threshold_metrics, group_sort_key
+from evaluate_outputs import EVALUATION_CACHE_DIR
+
+# Cross-run comparison of evaluation results. Runs are read on first use; each run's evaluation frame is
+# cached in memory for the session and on disk in <run>/.evaluation_cache/evaluation_frame.pkl, keyed by
+# the size and mtime of its evaluation_summary_all.jsonl, so repeated queries (e.g. from a notebook with
+# `from compare_runs import RunComparison`) do not re-parse unchanged summaries.
+SUMMARY_NAME = 'evaluation_summary_all.jsonl'
+FRAME_CACHE_NAME = 'evaluation_frame.pkl'
+
+# model_threshold_metrics() column -> aggregated TSV column name
+DELTA_METRICS = {
+    "frac_single_exact": "FracSingleExact",
+    "frac_json_error": "FracJsonError",
+    "avg_num_exact": "AvgNumExact",
+    "avg_frac_missing": "AvgFracMissing",
+    "avg_frac_mismatched": "AvgFracMismatched",
+    "avg_duration": "AvgDuration",
+    "avg_cost": "AvgCost",
+    "avg_completion_tokens": "AvgCompletionTokens",
+}
+
+_FRAMES = {}
+_METRICS = {}
+
+
+def run_sort_key(run):
+    suffix = run.partition('_')[2]
+    return (0, int(suffix), "") if suffix.isdigit() else (1, 0, run)
+
+
+def discover_runs(data_dir='data'):
+    """Names of the run_* directories under data_dir that have an evaluation summary, run_2 before run_10."""
+    runs = [os.path.basename(os.path.dirname(p)) for p in glob.glob(os.path.join(data_dir, 'run_*', SUMMARY_NAME))]
+    return sorted(runs, key=run_sort_key)
+
+
+def summary_stamp(run_dir):
+    st = os.stat(os.path.join(run_dir, SUMMARY_NAME))
+    return (st.st_size, st.st_mtime_ns)
+
+
+def load_run_frame(run_dir):
+    """The evaluation frame of one run, from the in-memory or on-disk cache when the summary is unchanged."""
+    key = os.path.abspath(run_dir)
+    stamp = summary_stamp(run_dir)
+    cached = _FRAMES.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    cache_path = os.path.join(run_dir, EVALUATION_CACHE_DIR, FRAME_CACHE_NAME)
+    df = None
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                saved = pickle.load(f)
+            if saved["stamp"] == stamp and saved["columns"] == EVALUATION_COLUMNS:
+                df = saved["frame"]
+        except Exception as e:
+            print(f"Warning: ignoring unreadable frame cache {cache_path}: {e}")
+    if df is None:
+        df = load_evaluation_frame(os.path.join(run_dir, SUMMARY_NAME))
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({"stamp": stamp, "columns": EVALUATION_COLUMNS, "frame": df}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    _FRAMES[key] = (stamp, df)
+    _METRICS.pop(key, None)
+    return df
+
+
+def load_run_metrics(run_dir):
+    """model_threshold_metrics() of one run, recomputed only when its summary changes."""
+    key = os.path.abspath(run_dir)
+    df = load_run_frame(run_dir)
+    cached = _METRICS.get(key)
+    if cached is None or cached[0] is not df:
+        cached = (df, model_threshold_metrics(df))
+        _METRICS[key] = cached
+    return cached[1]
+
+
+class RunComparison:
+    """
+    Evaluation results of several runs under data_dir (all run_* directories with a summary by default).
+    Nothing is read until a frame, metrics or deltas are asked for.
+    """
+
+    def __init__(self, runs=None, data_dir='data'):
+        self.data_dir = data_dir
+        self.runs = list(runs) if runs else discover_runs(data_dir)
+
+    def run_dir(self, run):
+        return os.path.join(self.data_dir, run)
+
+    def frame(self, runs=None):
+        """The evaluated rows of the given runs (default: all) in one frame, with a categorical "run" column."""
+        runs = list(runs) if runs else self.runs
+        df = pd.concat([load_run_frame(self.run_dir(run)).assign(run=run) for run in runs], ignore_index=True)
+        df["run"] = pd.Categorical(df["run"], categories=runs)
+        return df
+
+    def metrics(self, runs=None):
+        """Per (run, model, structured, threshold) metrics, as in analyze.py."""
+        runs = list(runs) if runs else self.runs
+        frames = [load_run_metrics(self.run_dir(run)).assign(run=run) for run in runs]
+        metrics = pd.concat(frames, ignore_index=True)
+        return metrics[["run"] + [c for c in metrics.columns if c != "run"]]
+
+    def deltas(self, base=None):
+        """
+        Each other run's metrics minus those of base (default: the first run), for the (model, structured,
+        threshold) groups evaluated in both.
+        """
+        base = base or self.runs[0]
+        keys = ["model", "structured", "threshold"]
+        base_metrics = load_run_metrics(self.run_dir(base))[keys + ["completed"] + list(DELTA_METRICS)]
+        rows = []
+        for run in self.runs:
+            if run == base:
+                continue
+            merged = load_run_metrics(self.run_dir(run)).merge(base_metrics, on=keys, suffixes=("", "_base"))
+            delta = merged[keys].assign(run=run, base=base, completed=merged["completed"], completed_base=merged["completed_base"])
+            for metric in DELTA_METRICS:
+                delta[metric] = merged[metric]
+                delta[f"delta_{metric}"] = merged[metric] - merged[f"{metric}_base"]
+            rows.append(delta)
+        if not rows:
+            return pd.DataFrame(columns=["run", "base"] + keys)
+        deltas = pd.concat(rows, ignore_index=True)
+        return deltas[["run", "base"] + keys + [c for c in deltas.columns if c not in ["run", "base"] + keys]]
+
+
+def deltas_table(deltas):
+    """deltas() with the column names of the aggregated TSVs."""
+    columns = {"run": "Run", "base": "BaseRun", "model": "Model", "structured": "Structured", "threshold": "Threshold",
+               "completed": "Completed", "completed_base": "BaseCompleted"}
+    for metric, name in DELTA_METRICS.items():
+        columns[metric] = name
+        columns[f"delta_{metric}"] = f"Delta{name}"
+    ordered = deltas.iloc[sorted(range(len(deltas)), key=lambda i: (run_sort_key(deltas.at[i, "run"]),) + group_sort_key(
+        deltas.at[i, "model"], deltas.at[i, "structured"], deltas.at[i, "threshold"]))]
+    return ordered.rename(columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare evaluation metrics across runs.")
+    parser.add_argument('--runs', nargs='+', help='Run directory names (default: every data/run_* with an evaluation summary)')
+    parser.add_argument('--base', help='Run the others are compared against (default: the first run)')
+    parser.add_argument('--out', default=os.path.join('data', 'run_comparison.tsv'), help='Output TSV (default: data/run_comparison.tsv)')
+    args = parser.parse_args()
+
+    comparison = RunComparison(args.runs)
+    if len(comparison.runs) < 2:
+        print(f"Need at least two runs with {SUMMARY_NAME} to compare, found: {comparison.runs}")
+        return
+    base = args.base or comparison.runs[0]
+    if base not in comparison.runs:
+        comparison.runs.insert(0, base)
+    missing = [run for run in comparison.runs if not os.path.exists(os.path.join(comparison.run_dir(run), SUMMARY_NAME))]
+    if missing:
+        print(f"Error: no {SUMMARY_NAME} for runs: {', '.join(missing)}")
+        return
+
+    table = deltas_table(comparison.deltas(base))
+    table.to_csv(args.out, sep="\t", index=False, float_format="%.4f")
+    shown = ["Run", "Model", "Structured", "Threshold", "Completed", "DeltaFracSingleExact", "DeltaFracJsonError", "DeltaAvgCost"]
+    print(f"Deltas against {base} (run - {base}):")
+    print(table[shown].to_string(index=False, float_format=lambda v: f"{v:+.3f}"))
+    print(f"Run comparison written to {args.out}")
+
+if __name__ == "__main__":
+    main()
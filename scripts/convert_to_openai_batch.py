@@ -2,11 +2,45 @@ import sys
 import json
 import argparse
 import os
+from response_schema import openai_response_format
+from result_files import STRUCTURED_MARKER
 
 MODELS = [
     "o1-mini", "o3-mini", "o4-mini", "o3", "o1",
     "gpt-4o-mini", "gpt-4o", "gpt-4.1-nano", "gpt-4.1-mini", "gpt-4.1"
 ]
+# Reasoning models accept reasoning_effort; o1-mini supports neither reasoning_effort nor response_format.
+REASONING_MODEL_PREFIXES = ("o1", "o3", "o4", "gpt-5")
+LEGACY_MODELS = {"o1-mini"}
+
+def load_model_params(value):
+    """
+    Parse --model-params, given either as a JSON string or a path to a JSON file:
+    { model: { body_param: value, ... } }
+    """
+    if value is None:
+        return {}
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+def build_body_params(model, structured, reasoning_effort, max_completion_tokens, model_params):
+    """Extra chat-completions body parameters for one model; per-model params win over the global flags."""
+    params = {}
+    if structured and model not in LEGACY_MODELS:
+        params["response_format"] = openai_response_format()
+    if reasoning_effort and model.startswith(REASONING_MODEL_PREFIXES) and model not in LEGACY_MODELS:
+        params["reasoning_effort"] = reasoning_effort
+    if max_completion_tokens is not None:
+        params["max_completion_tokens"] = max_completion_tokens
+    params.update(model_params.get(model, {}))
+    return params
+
+def batch_file_name(model, base, structured=False):
+    if structured:
+        return f"openai_batch_{model}_{STRUCTURED_MARKER}_{base}"
+    return f"openai_batch_{model}_{base}"
 
 def main():
     parser = argparse.ArgumentParser(description="Convert prompts file to OpenAI batch format for multiple models.")
@@ -14,6 +48,10 @@ def main():
     parser.add_argument("--run", default="run_1", help="Run directory name (default: run_1)")
     parser.add_argument("--limit", type=int, default=None, help="Maximum number of prompts to include in each batch file")
     parser.add_argument("--models", type=str, default=None, help="Comma-separated list of models to use (default: all)")
+    parser.add_argument("--structured", action="store_true", help="Attach a strict json_schema response_format built from response_schema.Response")
+    parser.add_argument("--reasoning-effort", choices=["minimal", "low", "medium", "high"], default=None, help="reasoning_effort for reasoning models")
+    parser.add_argument("--max-completion-tokens", type=int, default=None, help="max_completion_tokens for every model")
+    parser.add_argument("--model-params", default=None, help="JSON string or file mapping model -> extra body parameters")
     args = parser.parse_args()
 
     if args.threshold is None:
@@ -32,10 +70,20 @@ def main():
     else:
         models = MODELS
 
+    model_params = load_model_params(args.model_params)
+    body_params = {
+        model: build_body_params(model, args.structured, args.reasoning_effort, args.max_completion_tokens, model_params)
+        for model in models
+    }
+    for model in models:
+        if args.structured and model in LEGACY_MODELS:
+            print(f"Warning: {model} does not support response_format; writing an unstructured batch.")
+
     # Prepare output file handles for each model
     outfiles = {}
     for model in models:
-        out_path = os.path.join(batch_dir, f"openai_batch_{model}_{base}")
+        structured = "response_format" in body_params[model]
+        out_path = os.path.join(batch_dir, batch_file_name(model, base, structured))
         outfiles[model] = open(out_path, "w")
 
     count = 0
@@ -59,7 +107,8 @@ def main():
                         "model": model,
                         "messages": [
                             {"role": "user", "content": prompt}
-                        ]
+                        ],
+                        **body_params[model]
                     }
                 }
                 outfiles[model].write(json.dumps(batch_obj) + "\n")
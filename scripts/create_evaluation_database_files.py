@@ -3,11 +3,21 @@ import argparse
 import os
 import csv
 
-def build_abstracts_tsv(jsonl_path, output_dir):
-    out_path = os.path.join(output_dir, 'abstracts.tsv')
-    with open(jsonl_path) as f, open(out_path, 'w', newline='') as out_f:
+# Source files of the evaluation database. The iter_*_rows generators below parse them once and are shared
+# by the TSV writers here and by load_evaluation_db.py, which streams the same rows straight into a database.
+INPUT_JSONL = 'input_data/corpus_pubtator_normalized_8-4-2025.jsonl'
+ENTITY_MAP_PATH = 'input_data/expanded_annotations_entity_map.json'
+EXPANDED_ANN_PATH = 'input_data/expanded_annotations.jsonl'
+
+def write_tsv(out_path, header, rows):
+    with open(out_path, 'w', newline='') as out_f:
         writer = csv.writer(out_f, delimiter='\t')
-        writer.writerow(['pmid', 'abstract'])
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def iter_abstract_rows(jsonl_path):
+    """(pmid, abstract) for every corpus document with text."""
+    with open(jsonl_path) as f:
         for line in f:
             if line.strip():
                 try:
@@ -15,66 +25,64 @@ def build_abstracts_tsv(jsonl_path, output_dir):
                     pmid = str(obj.get('pmid'))
                     abstract = obj.get('text')
                     if pmid and abstract:
-                        writer.writerow([pmid, abstract])
+                        yield (pmid, abstract)
                 except Exception:
                     print(f"Error processing line: {line.strip()}")
-    print(f"Wrote abstracts.tsv")
 
-def build_entities_tsv(entity_map_path, expanded_ann_path, output_dir):
-    out_path = os.path.join(output_dir, 'entities.tsv')
+def iter_entity_rows(entity_map_path, expanded_ann_path):
+    """(identifier, label, description, type, taxon) per identifier, MedMentions annotations first."""
     seen = set()
-    with open(out_path, 'w', newline='') as out_f:
-        writer = csv.writer(out_f, delimiter='\t')
-        writer.writerow(['identifier', 'label', 'description', 'type', 'taxon'])
-        # First source: entity_map_path (JSON)
-        with open(entity_map_path) as f:
-            obj = json.load(f)
-            for entity_list in obj.values():
-                for ann in entity_list:
-                    med = ann.get('medmentions')
-                    if med:
-                        identifier = med.get('identifier')
-                        if identifier and identifier not in seen:
-                            seen.add(identifier)
-                            label = med.get('label')
-                            description = med.get('description')
-                            biolink_types = med.get('biolink_types')
-                            type_val = biolink_types[0] if biolink_types and len(biolink_types) > 0 else None
-                            taxon = med.get('taxon') if 'taxon' in med else None
-                            writer.writerow([identifier, label, description, type_val, taxon])
-        # Second source: expanded_annotations.jsonl (JSONL)
-        with open(expanded_ann_path) as f:
-            for line in f:
-                if line.strip():
-                    try:
-                        obj = json.loads(line)
-                        for identifier, val in obj.items():
-                            if identifier not in seen:
-                                seen.add(identifier)
-                                label = val.get('name')
-                                description = val.get('description')
-                                type_val = val.get('category')
-                                taxon = val.get('taxa') if 'taxa' in val else None
-                                writer.writerow([identifier, label, description, type_val, taxon])
-                    except Exception as e:
-                        print(f"Error processing line in expanded_annotations.jsonl: {e}")
-    print(f"Wrote entities.tsv")
+    # First source: entity_map_path (JSON)
+    with open(entity_map_path) as f:
+        obj = json.load(f)
+        for entity_list in obj.values():
+            for ann in entity_list:
+                med = ann.get('medmentions')
+                if med:
+                    identifier = med.get('identifier')
+                    if identifier and identifier not in seen:
+                        seen.add(identifier)
+                        label = med.get('label')
+                        description = med.get('description')
+                        biolink_types = med.get('biolink_types')
+                        type_val = biolink_types[0] if biolink_types and len(biolink_types) > 0 else None
+                        taxon = med.get('taxon') if 'taxon' in med else None
+                        yield (identifier, label, description, type_val, taxon)
+    # Second source: expanded_annotations.jsonl (JSONL)
+    with open(expanded_ann_path) as f:
+        for line in f:
+            if line.strip():
+                try:
+                    obj = json.loads(line)
+                    rows = []
+                    for identifier, val in obj.items():
+                        if identifier not in seen:
+                            label = val.get('name')
+                            description = val.get('description')
+                            type_val = val.get('category')
+                            taxon = val.get('taxa') if 'taxa' in val else None
+                            rows.append((identifier, label, description, type_val, taxon))
+                except Exception as e:
+                    print(f"Error processing line in expanded_annotations.jsonl: {e}")
+                    continue
+                # Only identifiers of lines that parsed count as seen, so a later line can still supply them
+                yield from rows
+                seen.update(row[0] for row in rows)
 
-def build_recognized_entities_tsv(annotation_list_path, output_dir):
-    out_path = os.path.join(output_dir, 'recognized_entities.tsv')
-    with open(annotation_list_path) as f, open(out_path, 'w', newline='') as out_f:
-        writer = csv.writer(out_f, delimiter='\t')
-        writer.writerow(['id', 'pmid', 'expanded_text', 'original_text'])
+def iter_recognized_entity_rows(annotation_list_path):
+    """(id, pmid, expanded_text, original_text) per annotation_list.jsonl entry."""
+    with open(annotation_list_path) as f:
         for line in f:
             if line.strip():
                 obj = json.loads(line)
-                writer.writerow([obj['id'], str(obj['pmid']), obj['expanded_text'], obj['original_text']])
-    print(f"Wrote recognized_entities.tsv")
+                yield (obj['id'], str(obj['pmid']), obj['expanded_text'], obj['original_text'])
 
-def build_results_tsv(annotation_list_path, entity_map_path, colormap_path, results_tsv_path, output_dir):
-    out_path = os.path.join(output_dir, 'results.tsv')
-    import collections
-    import csv
+def iter_result_rows(annotation_list_path, entity_map_path, colormap_path, results_tsv_path):
+    """
+    (idx, model, identifier): the MedMentions identifier of every annotated prompt, then the identifier each
+    model's exact match maps to in the colormap (None when there is no usable exact match). The first row of
+    each (idx, model) wins.
+    """
     # Build (pmid, original_text) -> id map
     pmid_orig_to_id = {}
     with open(annotation_list_path) as f:
@@ -83,9 +91,7 @@ def build_results_tsv(annotation_list_path, entity_map_path, colormap_path, resu
                 obj = json.loads(line)
                 key = (str(obj['pmid']), obj['original_text'])
                 pmid_orig_to_id[key] = obj['id']
-    # Prepare to write results
     seen = set()
-    rows = []
     # Insert medmentions results
     with open(entity_map_path) as f:
         obj = json.load(f)
@@ -102,7 +108,7 @@ def build_results_tsv(annotation_list_path, entity_map_path, colormap_path, resu
                         row_key = (idx, 'medmentions')
                         if row_key not in seen:
                             seen.add(row_key)
-                            rows.append([idx, 'medmentions', identifier])
+                            yield (idx, 'medmentions', identifier)
     # Insert model results
     # Load colormap: index -> {color_code: identifier}
     colormap = {}
@@ -113,7 +119,7 @@ def build_results_tsv(annotation_list_path, entity_map_path, colormap_path, resu
                 idx = obj["index"]
                 identifiers = obj.get("identifiers", {})
                 colormap[idx] = identifiers
-    with open(results_tsv_path) as f:
+    with open(results_tsv_path, newline='') as f:
         reader = csv.DictReader(f, delimiter='\t')
         for row in reader:
             idx = int(row["index"])
@@ -125,13 +131,38 @@ def build_results_tsv(annotation_list_path, entity_map_path, colormap_path, resu
             row_key = (idx, model)
             if row_key not in seen:
                 seen.add(row_key)
-                rows.append([idx, model, identifier])
-    # Write to TSV
-    with open(out_path, 'w', newline='') as out_f:
-        writer = csv.writer(out_f, delimiter='\t')
-        writer.writerow(['idx', 'model', 'identifier'])
-        for row in rows:
-            writer.writerow(row)
+                yield (idx, model, identifier)
+
+def source_rows(output_dir):
+    """(table, row generator) for every evaluation database table of a run, in load order."""
+    annotation_list_path = os.path.join(output_dir, 'parsed_inputs', 'annotation_list.jsonl')
+    colormap_path = os.path.join(output_dir, 'parsed_inputs', 'bodies_10_colormap.jsonl')
+    results_tsv_path = os.path.join(output_dir, 'results_all.tsv')
+    return [
+        ('abstracts', iter_abstract_rows(INPUT_JSONL)),
+        ('entities', iter_entity_rows(ENTITY_MAP_PATH, EXPANDED_ANN_PATH)),
+        ('recognized_entities', iter_recognized_entity_rows(annotation_list_path)),
+        ('results', iter_result_rows(annotation_list_path, ENTITY_MAP_PATH, colormap_path, results_tsv_path)),
+        ('assessment', iter([])),
+    ]
+
+def build_abstracts_tsv(jsonl_path, output_dir):
+    write_tsv(os.path.join(output_dir, 'abstracts.tsv'), ['pmid', 'abstract'], iter_abstract_rows(jsonl_path))
+    print(f"Wrote abstracts.tsv")
+
+def build_entities_tsv(entity_map_path, expanded_ann_path, output_dir):
+    write_tsv(os.path.join(output_dir, 'entities.tsv'), ['identifier', 'label', 'description', 'type', 'taxon'],
+              iter_entity_rows(entity_map_path, expanded_ann_path))
+    print(f"Wrote entities.tsv")
+
+def build_recognized_entities_tsv(annotation_list_path, output_dir):
+    write_tsv(os.path.join(output_dir, 'recognized_entities.tsv'), ['id', 'pmid', 'expanded_text', 'original_text'],
+              iter_recognized_entity_rows(annotation_list_path))
+    print(f"Wrote recognized_entities.tsv")
+
+def build_results_tsv(annotation_list_path, entity_map_path, colormap_path, results_tsv_path, output_dir):
+    write_tsv(os.path.join(output_dir, 'results.tsv'), ['idx', 'model', 'identifier'],
+              iter_result_rows(annotation_list_path, entity_map_path, colormap_path, results_tsv_path))
     print(f"Wrote results.tsv")
 
 def build_assessment_tsv(output_dir):
@@ -147,9 +178,9 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--run', required=True, help='Run name (output will be placed in data/{run})')
     args = parser.parse_args()
-    input_jsonl = 'input_data/corpus_pubtator_normalized_8-4-2025.jsonl'
-    entity_map_path = 'input_data/expanded_annotations_entity_map.json'
-    expanded_ann_path = 'input_data/expanded_annotations.jsonl'
+    input_jsonl = INPUT_JSONL
+    entity_map_path = ENTITY_MAP_PATH
+    expanded_ann_path = EXPANDED_ANN_PATH
     output_dir = os.path.join('data', args.run)
     os.makedirs(output_dir, exist_ok=True)
     annotation_list_path = os.path.join(output_dir, 'parsed_inputs', 'annotation_list.jsonl')
@@ -3,8 +3,13 @@ import json
 import os
 import re
 import glob
+import heapq
+import tempfile
 from pydantic import ValidationError
 from response_schema import Response
+# parse_pricing and find_price_info stay importable from here for existing callers
+from pricing import PRICING_PATH, parse_pricing, find_price_info, resolver_for
+from result_files import parse_ollama_output_name, parse_openai_results_name, threshold_from_colormap_name, colormap_file_name, index_from_custom_id
 
 def load_jsonl(path):
     with open(path) as f:
@@ -17,36 +22,139 @@ def load_jsonl_with_index(path):
             if not line.strip():
                 continue
             obj = json.loads(line)
-            # For OpenAI results, use custom_id as index if present
+            # For OpenAI results, use custom_id as index if present (e.g., "0_gpt-4.1-mini")
             if "custom_id" in obj and "index" not in obj:
-                # Try to extract integer index from custom_id (e.g., "0_gpt-4.1-mini")
-                m = re.match(r"(\d+)_", str(obj["custom_id"]))
-                if m:
-                    obj["index"] = int(m.group(1))
+                idx = index_from_custom_id(obj["custom_id"])
+                if idx is not None:
+                    obj["index"] = idx
             results.append(obj)
     return results
 
 def build_index_map(entries):
     return {entry["index"]: entry for entry in entries if "index" in entry}
 
-def evaluate_ollama_outputs(colormap_path, output_path, model_name, threshold):
-    color_maps = load_jsonl(colormap_path)
-    outputs = load_jsonl_with_index(output_path)
-    # Infer and load response_output file
-    response_output_path = os.path.join(os.path.dirname(output_path), 'response_output'.join(os.path.basename(output_path).split('message_output')))
+# Files larger than this many lines are external-sorted through temporary chunk files
+SORT_CHUNK_SIZE = 50000
+
+def iter_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def index_sort_key(idx):
+    """Total order over indices that may be ints, unparseable strings or missing."""
+    if isinstance(idx, int):
+        return (0, idx)
+    if idx is None:
+        return (2, "")
+    return (1, str(idx))
+
+def sort_key_index(key):
+    """Inverse of index_sort_key, so an index parsed for sorting does not need to be parsed again."""
+    return None if key[0] == 2 else key[1]
+
+def is_sorted_by(path, key_fn):
+    previous = None
+    for obj in iter_jsonl(path):
+        key = index_sort_key(key_fn(obj))
+        if previous is not None and key < previous:
+            return False
+        previous = key
+    return True
+
+def iter_sorted_by_index(path, key_fn, chunk_size=SORT_CHUNK_SIZE):
+    """
+    Yield (sort_key, obj) for every line of a JSONL file in index order with bounded memory.
+    Already-sorted files are streamed as-is; otherwise sorted runs of chunk_size lines are spilled
+    to temporary files and merged. Equal keys keep file order.
+    """
+    if is_sorted_by(path, key_fn):
+        for obj in iter_jsonl(path):
+            yield index_sort_key(key_fn(obj)), obj
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        chunk_paths = []
+        chunk = []
+        for seq, obj in enumerate(iter_jsonl(path)):
+            chunk.append((index_sort_key(key_fn(obj)), seq, obj))
+            if len(chunk) >= chunk_size:
+                chunk_paths.append(_spill_sorted_chunk(chunk, tmp_dir, len(chunk_paths)))
+                chunk = []
+        if not chunk_paths:
+            for key, _, obj in sorted(chunk, key=lambda x: (x[0], x[1])):
+                yield key, obj
+            return
+        if chunk:
+            chunk_paths.append(_spill_sorted_chunk(chunk, tmp_dir, len(chunk_paths)))
+        readers = [_read_sorted_chunk(chunk_path) for chunk_path in chunk_paths]
+        for key, _, obj in heapq.merge(*readers, key=lambda x: (x[0], x[1])):
+            yield key, obj
+
+def _spill_sorted_chunk(chunk, tmp_dir, n):
+    chunk_path = os.path.join(tmp_dir, f"chunk_{n}.jsonl")
+    with open(chunk_path, "w") as f:
+        for key, seq, obj in sorted(chunk, key=lambda x: (x[0], x[1])):
+            f.write(json.dumps([key, seq, obj]) + "\n")
+    return chunk_path
+
+def _read_sorted_chunk(chunk_path):
+    with open(chunk_path) as f:
+        for line in f:
+            key, seq, obj = json.loads(line)
+            yield tuple(key), seq, obj
+
+def _last_per_key(keyed):
+    """Collapse runs of equal keys to their last element, matching build_index_map's last-wins dicts."""
+    pending = None
+    for key, obj in keyed:
+        if pending is not None and pending[0] != key:
+            yield pending
+        pending = (key, obj)
+    if pending is not None:
+        yield pending
+
+def merge_join_by_index(primary, *others, dedup_primary=False):
+    """
+    Join index-sorted (key, obj) streams. Yields (obj, [match_or_empty_dict, ...]) for every primary
+    object; the other streams are consumed in lockstep so only one entry per stream is held.
+    """
+    if dedup_primary:
+        primary = _last_per_key(primary)
+    cursors = []
+    for other in others:
+        it = _last_per_key(other)
+        cursors.append([it, next(it, None)])
+    for key, obj in primary:
+        matches = []
+        for cursor in cursors:
+            while cursor[1] is not None and cursor[1][0] < key:
+                cursor[1] = next(cursor[0], None)
+            matches.append(cursor[1][1] if cursor[1] is not None and cursor[1][0] == key else {})
+        yield obj, matches
+
+def iter_indexed(path):
+    """(sort_key, obj) for entries that carry an index, in index order, as build_index_map would keep them."""
+    return ((key, obj) for key, obj in iter_sorted_by_index(path, lambda obj: obj.get("index")) if "index" in obj)
+
+def ollama_response_output_path(output_path):
+    return os.path.join(os.path.dirname(output_path), 'response_output'.join(os.path.basename(output_path).split('message_output')))
+
+def iter_ollama_rows(colormap_path, output_path, model_name, threshold):
+    """Stream evaluated rows for one Ollama message_output file, joined to its response_output and colormap by index."""
+    response_output_path = ollama_response_output_path(output_path)
     if not os.path.exists(response_output_path):
         raise FileNotFoundError(f"Ollama response output file not found: {response_output_path}")
-    response_outputs = load_jsonl(response_output_path)
-    response_by_index = build_index_map(response_outputs)
-    color_map_by_index = build_index_map(color_maps)
-    output_by_index = build_index_map(outputs)
-    rows = []
-    for idx, output in output_by_index.items():
-        color_map = color_map_by_index.get(idx, {})
-        response = response_by_index.get(idx, {})
+    outputs = iter_indexed(output_path)
+    color_maps = iter_indexed(colormap_path)
+    responses = iter_indexed(response_output_path)
+    for output, (color_map, response) in merge_join_by_index(outputs, color_maps, responses, dedup_primary=True):
+        idx = output["index"]
         row, _ = parse_candidates_and_build_row(idx, color_map, output, response, model_name, threshold)
-        rows.append(row)
-    return rows
+        yield row
+
+def evaluate_ollama_outputs(colormap_path, output_path, model_name, threshold):
+    return list(iter_ollama_rows(colormap_path, output_path, model_name, threshold))
 
 def parse_candidates_and_build_row(idx, color_map, output, response, model_name, threshold, extra_fields=None):
     """
@@ -118,97 +226,77 @@ def parse_candidates_and_build_row(idx, color_map, output, response, model_name,
         row.update(extra_fields)
     return row, candidates
 
-def parse_pricing(pricing_path):
-    pricing = {}
-    with open(pricing_path) as f:
-        header = f.readline().strip().split('\t') if '\t' in f.readline() else f.readline().strip().split()
-        for line in f:
-            if not line.strip() or line.startswith('Model'):
-                continue
-            parts = line.strip().split()
-            if len(parts) < 2:
-                continue
-            model = parts[0]
-            input_price = float(parts[1].replace('$', '')) if len(parts) > 1 else 0.0
-            cached_input_price = float(parts[2].replace('$', '')) if len(parts) > 2 and parts[2] != '-' else 0.0
-            output_price = float(parts[3].replace('$', '')) if len(parts) > 3 and parts[3] != '-' else 0.0
-            pricing[model] = {
-                'input': input_price,
-                'cached_input': cached_input_price,
-                'output': output_price
-            }
-    return pricing
-
-def evaluate_openai_outputs(colormap_path, openai_results_path, model_name, threshold, pricing):
-    color_maps = load_jsonl(colormap_path)
-    color_map_by_index = build_index_map(color_maps)
-    rows = []
-    with open(openai_results_path) as f:
-        for line in f:
-            if not line.strip():
-                continue
-            result = json.loads(line)
-            # Extract integer index from custom_id (e.g., "170_gpt-4.1" -> 170)
-            idx = result.get("custom_id")
-            idx_int = None
-            if idx is not None:
-                m = re.match(r"(\d+)_", str(idx))
-                if m:
-                    idx_int = int(m.group(1))
-                else:
-                    try:
-                        idx_int = int(idx)
-                    except Exception:
-                        idx_int = idx  # fallback to string if not parseable
-            else:
-                idx_int = None
-            color_map = color_map_by_index.get(idx_int, {})
-            response_obj = result.get("response", {})
-            model_name_final = None
-            body = response_obj.get("body") if response_obj else None
-            usage = body.get("usage") if body else None
-            prompt_tokens = usage.get("prompt_tokens", 0) if usage else 0
-            cached_tokens = usage.get("prompt_tokens_details", {}).get("cached_tokens", 0) if usage and usage.get("prompt_tokens_details") else 0
-            completion_tokens = usage.get("completion_tokens", 0) if usage else 0
-            # Set model_name_final for pricing lookup
-            if body and isinstance(body, dict):
-                model_name_final = body.get("model", model_name)
-            else:
-                model_name_final = model_name
-            # Pricing lookup: robust model name matching
-            price_info = find_price_info(model_name_final, pricing)
-            input_price = price_info.get('input', 0.0)
-            cached_input_price = price_info.get('cached_input', 0.0)
-            output_price = price_info.get('output', 0.0)
-            # Calculate cost (per 1M tokens)
-            total_cost = ((prompt_tokens-cached_tokens)*input_price + cached_tokens*cached_input_price + completion_tokens*output_price) / 1_000_000.0
-            # Parse content JSON from OpenAI message
-            content = None
-            if body and isinstance(body, dict):
-                choices = body.get("choices", [])
-                if choices and "message" in choices[0]:
-                    content = choices[0]["message"].get("content")
-            # Strip markdown code block if present
-            if content and content.strip().startswith('```'):
-                match = re.search(r'```(?:json)?\s*(.*?)```', content, re.DOTALL)
-                if match:
-                    content = match.group(1).strip()
-            # Parse content as JSON for candidates
+def openai_result_index(result):
+    """Extract the integer index from a batch result's custom_id (e.g., "170_gpt-4.1" -> 170)."""
+    idx = result.get("custom_id")
+    if idx is None:
+        return None
+    idx_int = index_from_custom_id(idx)
+    if idx_int is not None:
+        return idx_int
+    try:
+        return int(idx)
+    except Exception:
+        return idx  # fallback to string if not parseable
+
+def build_openai_row(result, idx_int, color_map, model_name, threshold, pricing, structured=False):
+    response_obj = result.get("response", {})
+    model_name_final = None
+    body = response_obj.get("body") if response_obj else None
+    usage = body.get("usage") if body else None
+    prompt_tokens = usage.get("prompt_tokens", 0) if usage else 0
+    cached_tokens = usage.get("prompt_tokens_details", {}).get("cached_tokens", 0) if usage and usage.get("prompt_tokens_details") else 0
+    completion_tokens = usage.get("completion_tokens", 0) if usage else 0
+    # Set model_name_final for pricing lookup
+    if body and isinstance(body, dict):
+        model_name_final = body.get("model", model_name)
+    else:
+        model_name_final = model_name
+    # Realtime (--realtime) results are billed at standard prices, batch results at batch prices
+    tier = "standard" if result.get("realtime") else "batch"
+    total_cost = resolver_for(pricing).cost(model_name_final, prompt_tokens, cached_tokens, completion_tokens, tier)
+    # Parse content JSON from OpenAI message
+    content = None
+    if body and isinstance(body, dict):
+        choices = body.get("choices", [])
+        if choices and "message" in choices[0]:
+            content = choices[0]["message"].get("content")
+    # Strip markdown code block if present
+    if content and content.strip().startswith('```'):
+        match = re.search(r'```(?:json)?\s*(.*?)```', content, re.DOTALL)
+        if match:
+            content = match.group(1).strip()
+    # Parse content as JSON for candidates
+    candidates = []
+    if content:
+        try:
+            content_json = json.loads(content)
+            candidates = content_json.get("candidates", [])
+        except Exception:
             candidates = []
-            if content:
-                try:
-                    content_json = json.loads(content)
-                    candidates = content_json.get("candidates", [])
-                except Exception:
-                    candidates = []
-            output = result.copy()
-            # Attach parsed candidates for downstream use
-            output["_parsed_candidates"] = candidates
-            response = None  # Not used for OpenAI
-            extra_fields = {"Cost (USD)": total_cost}
-            row, _ = parse_candidates_and_build_row(idx_int, color_map, output, response, model_name_final, threshold, extra_fields=extra_fields)
-            rows.append(row)
-    return rows
+    output = result.copy()
+    # Attach parsed candidates for downstream use
+    output["_parsed_candidates"] = candidates
+    response = None  # Not used for OpenAI
+    extra_fields = {
+        "Cost (USD)": total_cost,
+        "Prompt Tokens": prompt_tokens,
+        "Completion Tokens": completion_tokens,
+        "Structured Output": structured
+    }
+    row, _ = parse_candidates_and_build_row(idx_int, color_map, output, response, model_name_final, threshold, extra_fields=extra_fields)
+    return row
+
+def iter_openai_rows(colormap_path, openai_results_path, model_name, threshold, pricing, structured=False):
+    """Stream evaluated rows for one OpenAI batch results file, joined to the colormap by custom_id index."""
+    results = iter_sorted_by_index(openai_results_path, openai_result_index)
+    color_maps = iter_indexed(colormap_path)
+    keyed_results = ((key, (key, result)) for key, result in results)
+    for (key, result), (color_map,) in merge_join_by_index(keyed_results, color_maps):
+        yield build_openai_row(result, sort_key_index(key), color_map, model_name, threshold, pricing, structured)
+
+def evaluate_openai_outputs(colormap_path, openai_results_path, model_name, threshold, pricing, structured=False):
+    return list(iter_openai_rows(colormap_path, openai_results_path, model_name, threshold, pricing, structured))
 
 def find_ollama_results(data_dir):
     return glob.glob(os.path.join(data_dir, 'ollama_results', '*_message_output.jsonl'))
@@ -246,8 +334,10 @@ def infer_colormap_file():
 def get_llm_content(output):
     """Extracts the LLM response content string from an output dict, handling OpenAI and Ollama formats."""
     content = None
-    if "response" in output and "body" in output["response"]:
-        body = output["response"]["body"]
+    # Failed batch lines carry "response": null
+    response = output.get("response") or {}
+    if "body" in response:
+        body = response["body"]
         if isinstance(body, dict):
             choices = body.get("choices", [])
             if choices and "message" in choices[0]:
@@ -262,117 +352,304 @@ def get_llm_content(output):
         content = output.get("content")
     return content
 
-def find_price_info(model_name_final, pricing):
-    if model_name_final in pricing:
-        return pricing[model_name_final]
-    # Try to match by prefix (e.g., gpt-4o-mini in gpt-4o-mini-2024-07-18)
-    for k in pricing:
-        if model_name_final.startswith(k):
-            return pricing[k]
-    # Try to match by removing date/version suffixes
-    base = re.split(r'[-_][0-9]{4,}', model_name_final)[0]
-    if base in pricing:
-        return pricing[base]
-    # Try substring match
-    for k in pricing:
-        if k in model_name_final:
-            return pricing[k]
-    print(f"Warning: No pricing found for model {model_name_final}")
-    return {'input': 0.0, 'cached_input': 0.0, 'output': 0.0}
+MATCH_TYPES_HEADER = ['model', 'threshold', 'index', 'exact_matches', 'subclass_matches', 'superclass_matches', 'related_matches', 'none_matches']
+
+def match_types_row(row):
+    """One results_all.tsv row: color codes grouped by relation type for a single evaluated output."""
+    match_types = {'exact': [], 'subclass': [], 'superclass': [], 'related': [], 'none': []}
+    # Try to get candidates from 'candidates', '_parsed_candidates', or skip if not present
+    candidates = row.get('candidates')
+    if candidates is None:
+        candidates = row.get('_parsed_candidates', [])
+    for c in candidates:
+        rel = c.get('relation_type', 'none')
+        code = c.get('color_code')
+        if code is not None:
+            match_types.setdefault(rel, []).append(code)
+    return [
+        row.get('model name'),
+        row.get('threshold'),
+        row.get('index'),
+        ','.join(match_types['exact']),
+        ','.join(match_types['subclass']),
+        ','.join(match_types['superclass']),
+        ','.join(match_types['related']),
+        ','.join(match_types['none'])
+    ]
 
 def aggregate_match_types_across_models(model_results, output_path):
     """
     model_results: list of dicts with keys: model name, threshold, index, candidates (list of dicts with color_code, relation_type)
     Writes a CSV with columns: model, threshold, index, exact_matches, subclass_matches, superclass_matches, related_matches, none_matches
     """
-    import csv
     with open(output_path, 'w', newline='') as f:
         writer = csv.writer(f, delimiter='\t')
-        writer.writerow([
-            'model', 'threshold', 'index', 'exact_matches', 'subclass_matches', 'superclass_matches', 'related_matches', 'none_matches'
-        ])
+        writer.writerow(MATCH_TYPES_HEADER)
         for row in model_results:
-            match_types = {'exact': [], 'subclass': [], 'superclass': [], 'related': [], 'none': []}
-            # Try to get candidates from 'candidates', '_parsed_candidates', or skip if not present
-            candidates = row.get('candidates')
-            if candidates is None:
-                candidates = row.get('_parsed_candidates', [])
-            for c in candidates:
-                rel = c.get('relation_type', 'none')
-                code = c.get('color_code')
-                if code is not None:
-                    match_types.setdefault(rel, []).append(code)
-            index_val = row.get('index')
-            writer.writerow([
-                row.get('model name'),
-                row.get('threshold'),
-                index_val,
-                ','.join(match_types['exact']),
-                ','.join(match_types['subclass']),
-                ','.join(match_types['superclass']),
-                ','.join(match_types['related']),
-                ','.join(match_types['none'])
-            ])
+            writer.writerow(match_types_row(row))
+
+class SummaryWriter:
+    """
+    Writes evaluation_summary_all.jsonl and results_all.tsv one row at a time, so memory use does not
+    grow with the number of result files. The files are only created once the first row arrives.
+    """
+
+    def __init__(self, run_dir):
+        self.jsonl_path = os.path.join(run_dir, "evaluation_summary_all.jsonl")
+        self.tsv_path = os.path.join(run_dir, "results_all.tsv")
+        self.jsonl_file = None
+        self.tsv_file = None
+        self.tsv_writer = None
+        self.count = 0
+
+    def write(self, row):
+        if self.jsonl_file is None:
+            self.jsonl_file = open(self.jsonl_path, "w")
+            self.tsv_file = open(self.tsv_path, "w", newline='')
+            self.tsv_writer = csv.writer(self.tsv_file, delimiter='\t')
+            self.tsv_writer.writerow(MATCH_TYPES_HEADER)
+        self.jsonl_file.write(json.dumps(row) + "\n")
+        self.tsv_writer.writerow(match_types_row(row))
+        self.count += 1
+
+    def close(self):
+        if self.jsonl_file is not None:
+            self.jsonl_file.close()
+            self.tsv_file.close()
+
+def write_rows(rows, writer):
+    """Drain a row generator into writer; returns how many rows it produced."""
+    n = 0
+    for row in rows:
+        writer.write(row)
+        n += 1
+    return n
+
+def find_evaluation_jobs(run_dir, thresholds, parsed_inputs_dir):
+    """
+    One job per result file, in a fixed order (threshold, Ollama before OpenAI, file name) so that
+    the merged output does not depend on how the files were scheduled.
+    """
+    jobs = []
+    ollama_dir = os.path.join(run_dir, 'ollama_results')
+    ollama_files = []
+    if os.path.isdir(ollama_dir):
+        ollama_files = [(fname, parse_ollama_output_name(fname)) for fname in sorted(os.listdir(ollama_dir))]
+    for threshold in thresholds:
+        colormap_path = os.path.join(parsed_inputs_dir, colormap_file_name(threshold))
+        for fname, parsed in ollama_files:
+            if parsed and parsed.threshold == threshold:
+                jobs.append({
+                    "kind": "Ollama", "fname": fname, "path": os.path.join(ollama_dir, fname),
+                    "colormap_path": colormap_path, "model": parsed.model,
+                    "threshold": threshold, "structured": False
+                })
+        openai_dir = os.path.join(run_dir, f'open_ai_results_{threshold}')
+        if os.path.isdir(openai_dir):
+            for fname in sorted(os.listdir(openai_dir)):
+                if fname.endswith('.jsonl'):
+                    parsed = parse_openai_results_name(fname)
+                    jobs.append({
+                        "kind": "OpenAI", "fname": fname, "path": os.path.join(openai_dir, fname),
+                        "colormap_path": colormap_path, "model": parsed.model if parsed else 'unknown',
+                        "threshold": threshold, "structured": parsed.structured if parsed else False
+                    })
+    return jobs
+
+def iter_job_rows(job, pricing):
+    if job["kind"] == "Ollama":
+        return iter_ollama_rows(job["colormap_path"], job["path"], job["model"], job["threshold"])
+    return iter_openai_rows(job["colormap_path"], job["path"], job["model"], job["threshold"], pricing, structured=job["structured"])
+
+def evaluate_job_to_shard(job, pricing, shard_path):
+    """
+    Evaluate one result file into a JSONL shard. Runs in a worker process.
+    Returns:
+        dict: rows, seconds, and error (None on success)
+    """
+    import time
+    start = time.perf_counter()
+    n = 0
+    try:
+        with open(shard_path, "w") as f:
+            for row in iter_job_rows(job, pricing):
+                f.write(json.dumps(row) + "\n")
+                n += 1
+        error = None
+    except Exception as e:
+        error = str(e)
+        if os.path.exists(shard_path):
+            os.remove(shard_path)
+    return {"rows": n, "seconds": time.perf_counter() - start, "error": error}
+
+# Bump when row-building logic changes so cached per-file rows are recomputed
+EVALUATOR_VERSION = 3
+EVALUATION_CACHE_DIR = '.evaluation_cache'
+
+def file_sha256(path):
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def file_fingerprint(path, known_stats):
+    """
+    (path, size, sha256) for a file. The hash is reused from known_stats when size and mtime are
+    unchanged, so unchanged files are never re-read; known_stats is updated in place.
+    """
+    st = os.stat(path)
+    known = known_stats.get(path)
+    if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+        sha = known[2]
+    else:
+        sha = file_sha256(path)
+        known_stats[path] = [st.st_size, st.st_mtime_ns, sha]
+    return [path, st.st_size, sha]
+
+def job_cache_key(job, pricing, known_stats):
+    """Everything a job's rows depend on: its result file, the colormap (and Ollama response output), pricing and the evaluator version."""
+    inputs = [job["path"], job["colormap_path"]]
+    if job["kind"] == "Ollama":
+        inputs.append(ollama_response_output_path(job["path"]))
+    files = [file_fingerprint(path, known_stats) if os.path.exists(path) else [path, None, None] for path in inputs]
+    return {
+        "version": EVALUATOR_VERSION,
+        "files": files,
+        "pricing": json.dumps(pricing, sort_keys=True) if job["kind"] == "OpenAI" else None,
+        "structured": job["structured"]
+    }
+
+def load_cache_manifest(cache_dir):
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path) as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable evaluation cache manifest {manifest_path}: {e}")
+    return {"entries": {}, "file_stats": {}}
+
+def save_cache_manifest(cache_dir, manifest):
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def cache_shard_name(job):
+    return f"{job['kind'].lower()}__{job['fname']}"
+
+def write_timing_report(timings, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(['kind', 'file', 'model', 'threshold', 'rows', 'seconds', 'rows_per_second', 'cached', 'error'])
+        for job, result in timings:
+            rate = result["rows"] / result["seconds"] if result["seconds"] > 0 else 0.0
+            writer.writerow([job["kind"], job["fname"], job["model"], job["threshold"], result["rows"],
+                             f"{result['seconds']:.3f}", f"{rate:.1f}", result.get("cached", False), result["error"] or ""])
 
 def main():
+    import time
     import argparse
+    from concurrent.futures import ProcessPoolExecutor
     parser = argparse.ArgumentParser(description="Aggregate and evaluate all Ollama and OpenAI results.")
     parser.add_argument('--run', required=True, help='Run directory name (required)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes evaluating result files in parallel (default: 1)')
+    parser.add_argument('--no-cache', action='store_true', help='Re-evaluate every result file instead of reusing unchanged ones from the evaluation cache')
+    parser.add_argument('--parquet', action='store_true', help='Also write a Parquet dataset partitioned by model and threshold (requires pyarrow)')
     args = parser.parse_args()
     run_dir = os.path.join('data', args.run)
 
     # Find all thresholds by looking for colormap files
     parsed_inputs_dir = os.path.join(run_dir, 'parsed_inputs')
-    colormap_files = [f for f in os.listdir(parsed_inputs_dir) if f.endswith('_colormap.jsonl')]
-    thresholds = sorted(set(f.split('_')[1] for f in colormap_files if f.startswith('bodies_')))
+    thresholds = [str(t) for t in sorted({threshold_from_colormap_name(f) for f in os.listdir(parsed_inputs_dir)} - {None})]
 
     # Pricing info (optional, only for OpenAI)
-    pricing_path = os.path.join(os.path.dirname(__file__), '../input_data/pricing.txt')
-    pricing = parse_pricing(pricing_path) if os.path.exists(pricing_path) else {}
+    pricing = parse_pricing(PRICING_PATH) if os.path.exists(PRICING_PATH) else {}
 
-    all_rows = []
-    for threshold in thresholds:
-        colormap_path = os.path.join(parsed_inputs_dir, f'bodies_{threshold}_colormap.jsonl')
-        # Evaluate Ollama results
-        ollama_dir = os.path.join(run_dir, 'ollama_results')
-        if os.path.isdir(ollama_dir):
-            for fname in os.listdir(ollama_dir):
-                if fname.endswith(f'bodies_{threshold}_message_output.jsonl'):
-                    model = fname.split('__')[0]
-                    output_path = os.path.join(ollama_dir, fname)
-                    try:
-                        rows = evaluate_ollama_outputs(colormap_path, output_path, model, threshold)
-                        all_rows.extend(rows)
-                        print(f"Evaluated Ollama: {fname} ({len(rows)} rows)")
-                    except Exception as e:
-                        print(f"Error evaluating Ollama {fname}: {e}")
-        # Evaluate OpenAI results
-        openai_dir = os.path.join(run_dir, f'open_ai_results_{threshold}')
-        if os.path.isdir(openai_dir):
-            for fname in os.listdir(openai_dir):
-                if fname.endswith('.jsonl'):
-                    # Model name is between 'openai_results_' and '_bodies'
-                    m = re.match(r'openai_results_(.+?)_bodies_.*\\.jsonl', fname)
-                    model = m.group(1) if m else 'unknown'
-                    openai_results_path = os.path.join(openai_dir, fname)
-                    try:
-                        rows = evaluate_openai_outputs(colormap_path, openai_results_path, model, threshold, pricing)
-                        all_rows.extend(rows)
-                        print(f"Evaluated OpenAI: {fname} ({len(rows)} rows)")
-                    except Exception as e:
-                        print(f"Error evaluating OpenAI {fname}: {e}")
-    print(f"Evaluated {len(all_rows)} outputs in total.")
-    # Write all_rows to JSONL
-    if all_rows:
-        jsonl_path = os.path.join(run_dir, "evaluation_summary_all.jsonl")
-        with open(jsonl_path, "w") as f:
-            for row in all_rows:
-                f.write(json.dumps(row) + "\n")
-        print(f"Wrote JSONL results to {jsonl_path}")
-        # Write results_all.tsv for build_db.py compatibility
-        results_all_tsv_path = os.path.join(run_dir, "results_all.tsv")
-        aggregate_match_types_across_models(all_rows, results_all_tsv_path)
-        print(f"Wrote TSV results to {results_all_tsv_path}")
+    parquet_writer = None
+    if args.parquet:
+        from evaluation_parquet import ParquetSummaryWriter
+        parquet_writer = ParquetSummaryWriter(run_dir)
+
+    jobs = find_evaluation_jobs(run_dir, thresholds, parsed_inputs_dir)
+    start = time.perf_counter()
+
+    # Per-file rows are kept as JSONL shards in the cache dir; only new or changed files are evaluated
+    cache_dir = os.path.join(run_dir, EVALUATION_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = load_cache_manifest(cache_dir)
+    if args.no_cache:
+        manifest["entries"] = {}
+    known_stats = manifest.get("file_stats", {})
+    shard_paths = [os.path.join(cache_dir, cache_shard_name(job)) for job in jobs]
+    keys = [job_cache_key(job, pricing, known_stats) for job in jobs]
+    results = [None] * len(jobs)
+    pending = []
+    for i, job in enumerate(jobs):
+        entry = manifest["entries"].get(job["path"])
+        if entry and entry["key"] == keys[i] and os.path.exists(shard_paths[i]):
+            results[i] = {"rows": entry["rows"], "seconds": 0.0, "error": None, "cached": True}
+        else:
+            pending.append(i)
+    print(f"{len(jobs) - len(pending)} of {len(jobs)} result files unchanged since the last evaluation; evaluating {len(pending)}.")
+    if args.workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            evaluated = list(executor.map(evaluate_job_to_shard, [jobs[i] for i in pending],
+                                          [pricing] * len(pending), [shard_paths[i] for i in pending]))
+    else:
+        evaluated = [evaluate_job_to_shard(jobs[i], pricing, shard_paths[i]) for i in pending]
+    for i, result in zip(pending, evaluated):
+        results[i] = result
+        if result["error"]:
+            manifest["entries"].pop(jobs[i]["path"], None)
+        else:
+            manifest["entries"][jobs[i]["path"]] = {"key": keys[i], "shard": cache_shard_name(jobs[i]), "rows": result["rows"]}
+    # Forget result files that no longer exist
+    current = {job["path"] for job in jobs}
+    for path in [p for p in manifest["entries"] if p not in current]:
+        stale_shard = os.path.join(cache_dir, manifest["entries"].pop(path)["shard"])
+        if os.path.exists(stale_shard):
+            os.remove(stale_shard)
+    manifest["file_stats"] = known_stats
+    save_cache_manifest(cache_dir, manifest)
+
+    timings = []
+    writer = SummaryWriter(run_dir)
+    try:
+        # Merge shards in job order so the output is the same for any number of workers
+        for job, result, shard_path in zip(jobs, results, shard_paths):
+            timings.append((job, result))
+            if result["error"]:
+                print(f"Error evaluating {job['kind']} {job['fname']}: {result['error']}")
+                continue
+            # One pass over the shard feeds both outputs
+            parquet_parts = parquet_writer.open_file(job["model"], job["threshold"]) if parquet_writer else None
+            try:
+                for row in iter_jsonl(shard_path):
+                    writer.write(row)
+                    if parquet_parts:
+                        parquet_parts.write(row)
+            finally:
+                if parquet_parts:
+                    parquet_parts.close()
+            status = "cached" if result.get("cached") else f"{result['seconds']:.2f}s"
+            print(f"Evaluated {job['kind']}: {job['fname']} ({result['rows']} rows, {status})")
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {writer.count} outputs in total from {len(jobs)} files ({len(pending)} re-evaluated) in {elapsed:.2f}s using {args.workers} worker(s).")
+    if timings:
+        timing_path = os.path.join(run_dir, "evaluation_timing.tsv")
+        write_timing_report(timings, timing_path)
+        slowest = max(timings, key=lambda t: t[1]["seconds"])
+        print(f"Slowest file: {slowest[0]['fname']} ({slowest[1]['seconds']:.2f}s). Per-file timings written to {timing_path}")
+    if writer.count:
+        print(f"Wrote JSONL results to {writer.jsonl_path}")
+        print(f"Wrote TSV results to {writer.tsv_path}")
+    if parquet_writer and parquet_writer.parts:
+        print(f"Wrote Parquet dataset to {parquet_writer.out_dir}")
 
 if __name__ == "__main__":
     main()
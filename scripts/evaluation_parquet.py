@@ -0,0 +1,219 @@
+import os
+import json
+import shutil
+from urllib.parse import quote
+
+# Columnar copy of evaluation_summary_all.jsonl, written by evaluate_outputs.py --parquet:
+#   evaluation_summary_parquet/summary/model=<model>/threshold=<t>/part-<n>.parquet
+#   evaluation_summary_parquet/candidates/model=<model>/threshold=<t>/part-<n>.parquet
+# Both tables are hive-partitioned by model and threshold; candidates join to summary rows on
+# (model, threshold, index, Structured Output). pyarrow is only needed when this output is requested.
+PARQUET_DIR = 'evaluation_summary_parquet'
+# Records buffered per part file before they are written out as one row group
+ROW_GROUP_ROWS = 10000
+
+SUMMARY_COLUMNS = [
+    ("index", "int64"),
+    ("entity", "string"),
+    ("Number of missing codes", "int32"),
+    ("Number of mismatched codes", "int32"),
+    ("Number of exact matches", "int32"),
+    ("exact candidates", "string"),
+    ("Valid JSON", "bool_"),
+    ("Colormap Length", "int32"),
+    ("Candidate List Length", "int32"),
+    ("Duration (s)", "float64"),
+    ("Cost (USD)", "float64"),
+    ("Prompt Tokens", "int64"),
+    ("Completion Tokens", "int64"),
+    ("Structured Output", "bool_"),
+]
+
+CANDIDATE_COLUMNS = [
+    ("index", "int64"),
+    ("Structured Output", "bool_"),
+    ("position", "int32"),
+    ("candidate", "string"),
+    ("color_code", "string"),
+    ("vocabulary_class", "string"),
+    ("relation_type", "string"),
+    ("evaluation", "string"),
+]
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def as_int(value):
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def as_str(value):
+    return None if value is None else str(value)
+
+
+def split_row(row):
+    """Flatten one evaluation row into a summary record and its candidate records."""
+    structured = bool(row.get("Structured Output", False))
+    summary = {name: row.get(name) for name, _ in SUMMARY_COLUMNS}
+    summary["index"] = as_int(row.get("index"))
+    summary["Structured Output"] = structured
+    candidates = []
+    for position, c in enumerate(row.get("candidates") or []):
+        if not isinstance(c, dict):
+            continue
+        candidates.append({
+            "index": summary["index"],
+            "Structured Output": structured,
+            "position": position,
+            "candidate": as_str(c.get("candidate")),
+            "color_code": as_str(c.get("color_code")),
+            "vocabulary_class": as_str(c.get("vocabulary_class")),
+            "relation_type": as_str(c.get("relation_type")),
+            "evaluation": as_str(c.get("evaluation")),
+        })
+    return summary, candidates
+
+
+def arrow_schema(pa, columns):
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+
+
+def to_table(pa, records, columns):
+    schema = arrow_schema(pa, columns)
+    arrays = []
+    for name, type_name in columns:
+        values = [r.get(name) for r in records]
+        if type_name.startswith("int"):
+            values = [as_int(v) for v in values]
+        elif type_name == "float64":
+            values = [float(v) if isinstance(v, (int, float)) else None for v in values]
+        arrays.append(pa.array(values, type=schema.field(name).type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def partition_dir(base, model, threshold):
+    return os.path.join(base, f"model={quote(str(model), safe='')}", f"threshold={threshold}")
+
+
+class PartWriter:
+    """One part file, written a row group of ROW_GROUP_ROWS records at a time."""
+
+    def __init__(self, pa, path, columns):
+        self.pa = pa
+        self.columns = columns
+        self.writer = pa.parquet.ParquetWriter(path, arrow_schema(pa, columns))
+        self.records = []
+
+    def add(self, records):
+        self.records.extend(records)
+        if len(self.records) >= ROW_GROUP_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.records:
+            self.writer.write_table(to_table(self.pa, self.records, self.columns))
+            self.records = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class ResultFileParts:
+    """
+    The part files of one result file: a summary and a candidates part per model name found in its rows
+    (falling back to the model of the file).
+    """
+
+    def __init__(self, dataset, model, threshold):
+        self.dataset = dataset
+        self.model = model
+        self.threshold = threshold
+        self.parts = {}
+
+    def write(self, row):
+        summary, candidates = split_row(row)
+        row_model = row.get("model name") or self.model
+        if row_model not in self.parts:
+            self.parts[row_model] = self.dataset.open_parts(row_model, self.threshold)
+        summary_part, candidates_part = self.parts[row_model]
+        summary_part.add([summary])
+        candidates_part.add(candidates)
+
+    def close(self):
+        for parts in self.parts.values():
+            for part in parts:
+                part.close()
+
+
+class ParquetSummaryWriter:
+    """
+    Writes each evaluated result file as one part file per table. Rows are streamed in and written a row
+    group at a time, so memory use does not grow with the size of a result file. The dataset directory is
+    replaced on every run.
+    """
+
+    def __init__(self, run_dir):
+        self.pa = import_pyarrow()
+        self.out_dir = os.path.join(run_dir, PARQUET_DIR)
+        if os.path.isdir(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        self.parts = 0
+
+    def open_parts(self, model, threshold):
+        """(summary, candidates) PartWriters for a new part of the model and threshold partition."""
+        name = f"part-{self.parts}.parquet"
+        self.parts += 1
+        writers = []
+        for table_name, columns in (("summary", SUMMARY_COLUMNS), ("candidates", CANDIDATE_COLUMNS)):
+            out = partition_dir(os.path.join(self.out_dir, table_name), model, threshold)
+            os.makedirs(out, exist_ok=True)
+            writers.append(PartWriter(self.pa, os.path.join(out, name), columns))
+        return tuple(writers)
+
+    def open_file(self, model, threshold):
+        """Parts for one result file; write() its rows, then close()."""
+        return ResultFileParts(self, model, threshold)
+
+    def write_file(self, model, threshold, rows):
+        """Write the rows (any iterable) of one result file; rows are partitioned by their own "model name", falling back to model."""
+        parts = self.open_file(model, threshold)
+        try:
+            for row in rows:
+                parts.write(row)
+        finally:
+            parts.close()
+
+
+def read_evaluation_dataset(run_dir, table="summary", columns=None, filter_expr=None):
+    """
+    Read the summary or candidates table as a pyarrow Table, loading only the requested columns.
+    filter_expr is a pyarrow.dataset expression, e.g. ds.field("model") == "gpt-4.1", pushed down to the
+    partition directories and row groups.
+    """
+    import_pyarrow()
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(os.path.join(run_dir, PARQUET_DIR, table), format="parquet", partitioning="hive")
+    return dataset.to_table(columns=columns, filter=filter_expr)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Print row counts of a run's Parquet evaluation dataset.")
+    parser.add_argument('--run', required=True, help='Run directory name (required)')
+    args = parser.parse_args()
+    table = read_evaluation_dataset(os.path.join('data', args.run), columns=["model", "threshold", "index"])
+    counts = {}
+    for model, threshold in zip(table.column("model").to_pylist(), table.column("threshold").to_pylist()):
+        counts[(model, threshold)] = counts.get((model, threshold), 0) + 1
+    print(json.dumps({f"{m}@{t}": n for (m, t), n in sorted(counts.items())}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
 import json
 import os
-import requests
 import ollama
 import re
+import time
+import queue
 import datetime
 import argparse
+import contextlib
+import concurrent.futures
+from ollama import Client
+from schwartz_hearst import detect_abbreviations
+from abbreviation_store import AbbreviationStore, DEFAULT_STORE_PATH
 
 def load_prompt_template(template_path):
     with open(template_path, 'r', encoding='utf-8') as f:
@@ -17,13 +23,30 @@ def load_corpus_jsonl(corpus_path):
                 obj = json.loads(line)
                 yield obj['pmid'], obj['text']
 
-def call_ollama(prompt, model="gpt-oss", format=None):
+class ClientPool:
+    """Fixed set of Ollama clients shared by worker threads; each request borrows one."""
+
+    def __init__(self, host=None, size=1):
+        self.clients = queue.Queue()
+        for _ in range(size):
+            self.clients.put(Client(host=host) if host else Client())
+
+    @contextlib.contextmanager
+    def client(self):
+        client = self.clients.get()
+        try:
+            yield client
+        finally:
+            self.clients.put(client)
+
+def call_ollama(prompt, model="gpt-oss", format=None, client=None):
     # This matches the approach in run_ollama.py
+    chat = client.chat if client is not None else ollama.chat
     if format:
-        response = ollama.chat(format=format, model=model, messages=[{"role": "user", "content": prompt}])
+        response = chat(format=format, model=model, messages=[{"role": "user", "content": prompt}])
         message_content = response['message']['content']
     else:
-        response = ollama.chat(model=model, messages=[{"role": "user", "content": prompt}])
+        response = chat(model=model, messages=[{"role": "user", "content": prompt}])
         message_content = response['message']['content']
         match = re.search(r'```json\s*(.*?)```', message_content, re.DOTALL)
         if match:
@@ -44,47 +67,113 @@ def get_processed_pmids(output_path):
                         continue
     return processed_pmids
 
+def count_corpus(corpus_path):
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip())
+
+def extract_abbreviations(pmid, text, prompt_template, pool, model="gpt-oss", retries=2):
+    """
+    Ask the LLM for the abbreviations defined in one abstract, retrying when the reply is not valid JSON.
+    Returns:
+        tuple: (row, total_llm_seconds)
+    """
+    prompt = f"{prompt_template}\n{text}"
+    total_duration = 0.0
+    for attempt in range(retries + 1):
+        with pool.client() as client:
+            response_json, duration = call_ollama(prompt, model=model, client=client)
+        total_duration += duration
+        try:
+            abbreviation_map = json.loads(response_json)
+            break
+        except Exception as e:
+            if attempt < retries:
+                print(f"Retrying PMID {pmid} after JSON parse error ({attempt + 1}/{retries}): {e}")
+                continue
+            print(f"Error parsing abbreviation JSON for PMID {pmid}: {e}\nRaw response: {response_json}")
+            abbreviation_map = []
+    row = {
+        "pmid": pmid,
+        "abbreviation_map": abbreviation_map,
+        "source": "llm"
+    }
+    return row, total_duration
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--run', default='run_1', help='Run directory name (default: run_1)')
+    parser.add_argument('--host', default=None, help='Ollama host URL (default: ollama client default)')
+    parser.add_argument('--model', default='gpt-oss', help='Ollama model name (default: gpt-oss)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Maximum in-flight requests (default: 1)')
+    parser.add_argument('--retries', type=int, default=2, help='Retries when the reply is not valid JSON (default: 2)')
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f'Abbreviation index kept in step with the results file (default: {DEFAULT_STORE_PATH})')
+    parser.add_argument('--no-prepass', action='store_true', help='Send every abstract to the LLM instead of resolving simple "long form (SF)" cases locally')
     args = parser.parse_args()
-    run_dir = os.path.join('data', args.run)
     template_path = os.path.join('input_data', "abbreviation_prompt_template")
     corpus_path = os.path.join('input_data', "corpus_pubtator_normalized_8-4-2025.jsonl")
     output_path = os.path.join('input_data', "abbreviation_llm_results.jsonl")
     prompt_template = load_prompt_template(template_path)
     processed_pmids = get_processed_pmids(output_path)
     already_done = len(processed_pmids)
-    # Always use append mode
-    with open(output_path, "a", encoding="utf-8") as out_f:
-        total = 4392
-        sum_duration = 0.0
-        num_this_run = 0
-        for idx, (pmid, text) in enumerate(load_corpus_jsonl(corpus_path), 1):
-            if pmid in processed_pmids:
-                continue
-            prompt = f"{prompt_template}\n{text}"
-            response_json, duration = call_ollama(prompt)
-            sum_duration += duration
-            num_this_run += 1
-            already_done += 1
-            avg_duration = sum_duration / num_this_run
-            remaining = total - already_done
-            est_remaining = avg_duration * remaining
-            est_td = datetime.timedelta(seconds=est_remaining)
-            est_str = str(est_td).split('.')[0]
-            try:
-                abbreviation_map = json.loads(response_json)
-            except Exception as e:
-                print(f"Error parsing abbreviation JSON for PMID {pmid}: {e}\nRaw response: {response_json}")
-                abbreviation_map = []
-            row = {
-                "pmid": pmid,
-                "abbreviation_map": abbreviation_map
-            }
-            out_f.write(json.dumps(row) + "\n")
-            out_f.flush()
-            print(f"Processed {already_done} of {total}. Took {duration:.2f} seconds. Avg: {avg_duration:.2f} s. Est. remaining: {est_str}")
+    total = count_corpus(corpus_path)
+    pool = ClientPool(args.host, args.concurrency)
+    store = AbbreviationStore(args.store)
+    caught_up = store.sync(output_path)
+    if caught_up:
+        print(f"Indexed {caught_up} existing rows into {args.store}")
+    pending = ((pmid, text) for pmid, text in load_corpus_jsonl(corpus_path) if pmid not in processed_pmids)
+    try:
+        # Always use append mode; rows land in completion order since resume is keyed by PMID
+        with open(output_path, "a", encoding="utf-8") as out_f, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            start = time.time()
+            sum_duration = 0.0
+            num_this_run = 0
+            num_llm = 0
+            in_flight = set()
+            exhausted = False
+
+            def record(row, duration):
+                nonlocal sum_duration, num_this_run, num_llm, already_done
+                out_f.write(json.dumps(row) + "\n")
+                out_f.flush()
+                store.record(row, output_path, out_f.tell())
+                num_this_run += 1
+                already_done += 1
+                if row["source"] != "llm":
+                    return
+                sum_duration += duration
+                num_llm += 1
+                avg_duration = sum_duration / num_llm
+                # Wall-clock throughput reflects the concurrency actually achieved; only LLM rows cost time
+                wall_per_item = (time.time() - start) / num_llm
+                remaining = (total - already_done) * num_llm / num_this_run
+                est_td = datetime.timedelta(seconds=wall_per_item * remaining)
+                est_str = str(est_td).split('.')[0]
+                print(f"Processed {already_done} of {total} ({num_this_run - num_llm} by regex). Took {duration:.2f} seconds. Avg: {avg_duration:.2f} s. Est. remaining: {est_str}")
+
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < args.concurrency:
+                    item = next(pending, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    pmid, text = item
+                    if not args.no_prepass:
+                        definitions, needs_llm = detect_abbreviations(text)
+                        if not needs_llm:
+                            record({"pmid": pmid, "abbreviation_map": definitions, "source": "regex"}, 0.0)
+                            continue
+                    in_flight.add(executor.submit(extract_abbreviations, pmid, text, prompt_template, pool, args.model, args.retries))
+                if not in_flight:
+                    break
+                done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    row, duration = future.result()
+                    record(row, duration)
+            print(f"Finished: {num_this_run} abstracts this run, {num_llm} sent to the LLM, {num_this_run - num_llm} resolved by regex.")
+    finally:
+        store.close()
 
 if __name__ == "__main__":
     main()
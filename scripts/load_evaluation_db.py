@@ -0,0 +1,56 @@
+import os
+import time
+import argparse
+from create_evaluation_database_files import source_rows
+from load_sqlite import SQLiteBulkWriter
+
+# Loads the evaluation database straight from the source JSONL and result files, without writing the
+# intermediate TSVs: each row generator of create_evaluation_database_files.py is consumed once by a bulk
+# writer, SQLiteBulkWriter (executemany) or PostgresBulkWriter (COPY from the generator into staging).
+
+def load_sources(writer, sources):
+    """
+    Write every (table, rows) of sources with writer, then build its indexes. If a source fails, the writer is
+    aborted, which rolls back what it can and restores the indexes. Returns seconds per step.
+    """
+    try:
+        for table, rows in sources:
+            writer.write_table(table, rows)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the evaluation database directly from the source files of a run.")
+    parser.add_argument('--run', required=True, help='Run name (results are read from data/{run})')
+    parser.add_argument('--backend', choices=['sqlite', 'postgres'], default='sqlite', help='Database to load (default: sqlite)')
+    parser.add_argument('--db', help='SQLite database path (default: data/{run}/evaluation.db)')
+    parser.add_argument('--host', help='PostgreSQL host')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--dbname', help='PostgreSQL database name')
+    parser.add_argument('--user', help='PostgreSQL user')
+    parser.add_argument('--password', help='PostgreSQL password')
+    args = parser.parse_args()
+    run_dir = os.path.join('data', args.run)
+
+    start = time.perf_counter()
+    if args.backend == 'sqlite':
+        db_path = args.db if args.db else os.path.join(run_dir, 'evaluation.db')
+        load_sources(SQLiteBulkWriter(db_path), source_rows(run_dir))
+        print(f"Database created at {db_path} in {time.perf_counter() - start:.2f}s")
+    else:
+        missing = [name for name in ('host', 'dbname', 'user', 'password') if getattr(args, name) is None]
+        if missing:
+            print(f"Error: --backend postgres needs {', '.join('--' + name for name in missing)}")
+            return
+        from load_postgres import get_connection, PostgresBulkWriter
+        conn = get_connection(args)
+        try:
+            load_sources(PostgresBulkWriter(conn), source_rows(run_dir))
+        finally:
+            conn.close()
+        print(f"Database loaded at {args.dbname} in {time.perf_counter() - start:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 import psycopg2
-import csv
 import os
+import io
+import csv
+import time
 import argparse
 
 def get_connection(args):
@@ -12,119 +14,304 @@ def get_connection(args):
         password=args.password
     )
 
-def load_abstracts(conn, tsv_path):
-    with conn.cursor() as c:
-        c.execute('''CREATE TABLE IF NOT EXISTS abstracts (
+# Each table is loaded by streaming its TSV through COPY FROM STDIN into an unlogged staging table, then
+# merged into the target with one INSERT ... SELECT ... ON CONFLICT. When a key appears more than once in a
+# TSV the last row wins, as with the previous row-by-row upserts. Secondary indexes are dropped before the
+# merge and built afterwards, or rebuilt by PostgresBulkWriter.abort() when a load fails.
+# table -> (CREATE statement, columns as (name, SQL type), conflict key, columns whose empty values are stored as NULL)
+TABLES = {
+    'abstracts': (
+        '''CREATE TABLE IF NOT EXISTS abstracts (
             pmid TEXT PRIMARY KEY,
             abstract TEXT
-        )''')
-        count = 0
-        with open(tsv_path) as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-                c.execute('INSERT INTO abstracts (pmid, abstract) VALUES (%s, %s) ON CONFLICT (pmid) DO UPDATE SET abstract=EXCLUDED.abstract',
-                          (row['pmid'], row['abstract']))
-                count += 1
-    conn.commit()
-    print(f"Loaded {count} rows into abstracts table.")
-
-def load_entities(conn, tsv_path):
-    with conn.cursor() as c:
-        c.execute('''CREATE TABLE IF NOT EXISTS entities (
+        )''',
+        [('pmid', 'TEXT'), ('abstract', 'TEXT')], ['pmid'], ()),
+    'entities': (
+        '''CREATE TABLE IF NOT EXISTS entities (
             identifier TEXT PRIMARY KEY,
             label TEXT,
             description TEXT,
             type TEXT,
             taxon TEXT
-        )''')
-        count = 0
-        with open(tsv_path) as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-                c.execute('INSERT INTO entities (identifier, label, description, type, taxon) VALUES (%s, %s, %s, %s, %s) ON CONFLICT (identifier) DO UPDATE SET label=EXCLUDED.label, description=EXCLUDED.description, type=EXCLUDED.type, taxon=EXCLUDED.taxon',
-                          (row['identifier'], row['label'], row['description'], row['type'], row['taxon']))
-                count += 1
-    conn.commit()
-    print(f"Loaded {count} rows into entities table.")
-
-def load_recognized_entities(conn, tsv_path):
-    with conn.cursor() as c:
-        c.execute('''CREATE TABLE IF NOT EXISTS recognized_entities (
+        )''',
+        [('identifier', 'TEXT'), ('label', 'TEXT'), ('description', 'TEXT'), ('type', 'TEXT'), ('taxon', 'TEXT')], ['identifier'], ()),
+    'recognized_entities': (
+        '''CREATE TABLE IF NOT EXISTS recognized_entities (
             id INTEGER PRIMARY KEY,
             pmid TEXT,
             expanded_text TEXT,
             original_text TEXT
-        )''')
-        count = 0
-        with open(tsv_path) as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-                c.execute('INSERT INTO recognized_entities (id, pmid, expanded_text, original_text) VALUES (%s, %s, %s, %s) ON CONFLICT (id) DO UPDATE SET pmid=EXCLUDED.pmid, expanded_text=EXCLUDED.expanded_text, original_text=EXCLUDED.original_text',
-                          (row['id'], row['pmid'], row['expanded_text'], row['original_text']))
-                count += 1
-    conn.commit()
-    print(f"Loaded {count} rows into recognized_entities table.")
-
-def load_results(conn, tsv_path):
-    with conn.cursor() as c:
-        c.execute('''CREATE TABLE IF NOT EXISTS results (
+        )''',
+        [('id', 'INTEGER'), ('pmid', 'TEXT'), ('expanded_text', 'TEXT'), ('original_text', 'TEXT')], ['id'], ()),
+    'results': (
+        '''CREATE TABLE IF NOT EXISTS results (
             idx INTEGER,
             model TEXT,
             identifier TEXT,
             PRIMARY KEY (idx, model)
-        )''')
-        count = 0
-        with open(tsv_path) as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-                identifier = row['identifier'] if row['identifier'] != '' else None
-                c.execute('INSERT INTO results (idx, model, identifier) VALUES (%s, %s, %s) ON CONFLICT (idx, model) DO UPDATE SET identifier=EXCLUDED.identifier',
-                          (row['idx'], row['model'], identifier))
-                count += 1
-    conn.commit()
-    print(f"Loaded {count} rows into results table.")
-
-def load_assessment(conn, tsv_path):
-    with conn.cursor() as c:
-        c.execute('''CREATE TABLE IF NOT EXISTS assessment (
+        )''',
+        [('idx', 'INTEGER'), ('model', 'TEXT'), ('identifier', 'TEXT')], ['idx', 'model'], ('identifier',)),
+    'assessment': (
+        '''CREATE TABLE IF NOT EXISTS assessment (
             idx INTEGER,
             identifier TEXT,
             assessor TEXT,
             assessment TEXT,
             UNIQUE(idx, identifier, assessor)
-        )''')
-        count = 0
-        with open(tsv_path) as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            for row in reader:
-                c.execute('INSERT INTO assessment (idx, identifier, assessor, assessment) VALUES (%s, %s, %s, %s) ON CONFLICT (idx, identifier, assessor) DO UPDATE SET assessment=EXCLUDED.assessment',
-                          (row['idx'], row['identifier'], row['assessor'], row['assessment']))
-                count += 1
+        )''',
+        [('idx', 'INTEGER'), ('identifier', 'TEXT'), ('assessor', 'TEXT'), ('assessment', 'TEXT')], ['idx', 'identifier', 'assessor'], ()),
+}
+TSV_FILES = {table: f'{table}.tsv' for table in TABLES}
+
+SECONDARY_INDEXES = {
+    # The evaluation app filters results by model and assessments by assessor
+    'idx_results_model': ('results', 'CREATE INDEX IF NOT EXISTS idx_results_model ON results (model, identifier)'),
+    'idx_assessment_assessor': ('assessment', 'CREATE INDEX IF NOT EXISTS idx_assessment_assessor ON assessment (assessor, idx, identifier)'),
+    'idx_recognized_entities_pmid': ('recognized_entities', 'CREATE INDEX IF NOT EXISTS idx_recognized_entities_pmid ON recognized_entities (pmid)'),
+}
+
+PROGRESS_BYTES = 64 * 1024 * 1024
+
+
+class CopyProgress:
+    """Binary file wrapper handed to COPY that prints how much of the TSV has been streamed."""
+
+    def __init__(self, f, label, total):
+        self.f = f
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.next_report = PROGRESS_BYTES
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.done += len(data)
+        if self.done >= self.next_report:
+            print(f"  {self.label}: {self.done / 1e6:.0f} / {self.total / 1e6:.0f} MB copied")
+            self.next_report += PROGRESS_BYTES
+        return data
+
+
+class CopyRowStream:
+    """
+    Binary file-like object over row tuples, encoding them as tab-delimited CSV (the format copy_to_staging()
+    reads) only as COPY asks for more data, so a row generator is streamed without being materialized.
+    """
+
+    def __init__(self, rows, batch_size=1000):
+        self.rows = iter(rows)
+        self.batch_size = batch_size
+        self.buffer = b''
+        self.exhausted = False
+        self.count = 0
+
+    def read(self, size=-1):
+        while not self.exhausted and (size < 0 or len(self.buffer) < size):
+            text = io.StringIO()
+            writer = csv.writer(text, delimiter='\t', lineterminator='\n')
+            batch = 0
+            for row in self.rows:
+                writer.writerow(row)
+                batch += 1
+                if batch == self.batch_size:
+                    break
+            self.count += batch
+            self.exhausted = batch < self.batch_size
+            self.buffer += text.getvalue().encode('utf-8')
+        if size < 0:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def staging_table(table):
+    return f'bagel_staging_{table}'
+
+
+def copy_stream_to_staging(c, table, stream, header=True):
+    """COPY a tab-delimited CSV stream (as written by csv.writer) into a fresh unlogged staging table."""
+    _, columns, _, _ = TABLES[table]
+    staging = staging_table(table)
+    names = ', '.join(name for name, _ in columns)
+    c.execute(f'DROP TABLE IF EXISTS {staging}')
+    c.execute(f"CREATE UNLOGGED TABLE {staging} (ord BIGSERIAL, {', '.join(f'{name} TEXT' for name, _ in columns)})")
+    # Columns are matched by position, so the header names do not matter (assessment.tsv calls assessor 'user').
+    # FORCE_NOT_NULL keeps empty fields (and None values of streamed rows) as '' so NULLs are only introduced by the merge.
+    c.copy_expert(f"COPY {staging} ({names}) FROM STDIN WITH (FORMAT csv, DELIMITER E'\\t', HEADER {str(header).lower()}, FORCE_NOT_NULL ({names}))",
+                  stream)
+    c.execute(f'SELECT COUNT(*) FROM {staging}')
+    return c.fetchone()[0]
+
+
+def copy_to_staging(c, table, tsv_path):
+    """COPY the TSV into a fresh unlogged staging table."""
+    with open(tsv_path, 'rb') as f:
+        return copy_stream_to_staging(c, table, CopyProgress(f, table, os.path.getsize(tsv_path)))
+
+
+def merge_staging(c, table, conflict='update'):
+    """
+    Upsert the staging rows into table, keeping the last row of each key. On a key that is already present,
+    conflict='update' overwrites the row, 'changed' overwrites it only if a value differs, and 'ignore'
+    keeps it. Returns the number of rows written.
+    """
+    _, columns, key, null_if_empty = TABLES[table]
+    staging = staging_table(table)
+    names = [name for name, _ in columns]
+    values = []
+    for name, sql_type in columns:
+        value = f"NULLIF({name}, '')" if name in null_if_empty else name
+        if sql_type != 'TEXT':
+            value = f'{value}::{sql_type}'
+        values.append(value if value == name else f'{value} AS {name}')
+    values_columns = [name for name in names if name not in key]
+    action = 'NOTHING'
+    if values_columns and conflict != 'ignore':
+        action = 'UPDATE SET ' + ', '.join(f'{name}=EXCLUDED.{name}' for name in values_columns)
+        if conflict == 'changed':
+            action += f" WHERE ({', '.join(f'{table}.{name}' for name in values_columns)}) IS DISTINCT FROM ({', '.join(f'EXCLUDED.{name}' for name in values_columns)})"
+    c.execute(f"""
+        INSERT INTO {table} ({', '.join(names)})
+        SELECT DISTINCT ON ({', '.join(key)}) {', '.join(names)}
+        FROM (SELECT ord, {', '.join(values)} FROM {staging}) s
+        ORDER BY {', '.join(key)}, ord DESC
+        ON CONFLICT ({', '.join(key)}) DO {action}
+    """)
+    merged = c.rowcount
+    c.execute(f'DROP TABLE {staging}')
+    return merged
+
+
+def load_table(conn, table, tsv_path, rows=None):
+    """
+    COPY and merge one TSV, or the row tuples of rows when given, in its own transaction.
+    Returns (rows copied, rows merged, copy seconds, merge seconds).
+    """
+    create_sql = TABLES[table][0]
+    with conn.cursor() as c:
+        c.execute(create_sql)
+        start = time.perf_counter()
+        if rows is None:
+            copied = copy_to_staging(c, table, tsv_path)
+        else:
+            copied = copy_stream_to_staging(c, table, CopyRowStream(rows), header=False)
+        copy_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        merged = merge_staging(c, table)
+        merge_seconds = time.perf_counter() - start
     conn.commit()
-    print(f"Loaded {count} rows into assessment table.")
+    return copied, merged, copy_seconds, merge_seconds
+
+
+def load_abstracts(conn, tsv_path):
+    return load_table(conn, 'abstracts', tsv_path)
+
+def load_entities(conn, tsv_path):
+    return load_table(conn, 'entities', tsv_path)
+
+def load_recognized_entities(conn, tsv_path):
+    return load_table(conn, 'recognized_entities', tsv_path)
+
+def load_results(conn, tsv_path):
+    return load_table(conn, 'results', tsv_path)
+
+def load_assessment(conn, tsv_path):
+    return load_table(conn, 'assessment', tsv_path)
+
+
+def create_secondary_indexes(c):
+    """Create the SECONDARY_INDEXES whose table exists."""
+    c.execute("SELECT tablename FROM pg_tables WHERE schemaname = ANY (current_schemas(false))")
+    existing = {row[0] for row in c.fetchall()}
+    for name, (table, sql) in SECONDARY_INDEXES.items():
+        if table in existing:
+            c.execute(sql)
+
+
+class PostgresBulkWriter:
+    """
+    Bulk writer for one Postgres connection: each table is COPYed into staging and merged in its own
+    transaction, with the secondary indexes built and the tables analyzed on close(). The indexes are dropped
+    in the first table's transaction, and abort() rolls back the table being written and builds them again,
+    so a failed load never leaves the tables without them. SQLiteBulkWriter in load_sqlite.py has the same
+    write_table/write_tsv/close/abort interface.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.timings = {}
+        conn.set_client_encoding('UTF8')
+        with conn.cursor() as c:
+            for name in SECONDARY_INDEXES:
+                c.execute(f'DROP INDEX IF EXISTS {name}')
+
+    def write_table(self, table, rows, tsv_path=None):
+        """Create table if needed and upsert rows, tuples in TABLES column order. Returns the merged row count."""
+        copied, merged, copy_seconds, merge_seconds = load_table(self.conn, table, tsv_path, rows)
+        self.timings[table] = copy_seconds + merge_seconds
+        print(f"Loaded {table}: copied {copied} rows in {copy_seconds:.2f}s, merged {merged} rows in {merge_seconds:.2f}s.")
+        return merged
+
+    def write_tsv(self, table, tsv_path):
+        return self.write_table(table, None, tsv_path)
+
+    def close(self):
+        """Build the secondary indexes and analyze the written tables. Returns seconds per step."""
+        start = time.perf_counter()
+        try:
+            with self.conn.cursor() as c:
+                create_secondary_indexes(c)
+                for table in self.timings:
+                    c.execute(f'ANALYZE {table}')
+        except Exception:
+            self.abort()
+            raise
+        self.conn.commit()
+        self.timings['indexes'] = time.perf_counter() - start
+        print(f"Built indexes in {self.timings['indexes']:.2f}s.")
+        return self.timings
 
-def update_results(conn, tsv_path):
+    def abort(self):
+        """
+        Roll back the table being written and build the secondary indexes again. Tables already written
+        stay committed.
+        """
+        self.conn.rollback()
+        with self.conn.cursor() as c:
+            create_secondary_indexes(c)
+        self.conn.commit()
+
+
+def load_all(conn, input_dir, tables=TABLES):
+    """Load the TSVs of input_dir, then build the secondary indexes. Returns seconds per step."""
+    writer = PostgresBulkWriter(conn)
+    try:
+        for table in tables:
+            writer.write_tsv(table, os.path.join(input_dir, TSV_FILES[table]))
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+def update_results(conn, tsv_path, delta=False):
+    """
+    Merge results.tsv into the results table with one upsert from a COPY staging table. Only (idx, model) keys
+    not yet in the table are added, unless delta is set, in which case rows whose identifier changed are
+    updated as well. Returns (new rows, changed rows).
+    """
+    conn.set_client_encoding('UTF8')
     with conn.cursor() as c:
-        c.execute('''CREATE TABLE IF NOT EXISTS results (
-            idx INTEGER,
-            model TEXT,
-            identifier TEXT,
-            PRIMARY KEY (idx, model)
-        )''')
-        c.execute('SELECT idx, model FROM results')
-        existing = set(c.fetchall())
-        with open(tsv_path) as f:
-            reader = csv.DictReader(f, delimiter='\t')
-            new_rows = 0
-            for row in reader:
-                key = (int(row['idx']), row['model'])
-                if key not in existing:
-                    identifier = row['identifier'] if row['identifier'] != '' else None
-                    c.execute('INSERT INTO results (idx, model, identifier) VALUES (%s, %s, %s)',
-                              (row['idx'], row['model'], identifier))
-                    new_rows += 1
+        c.execute(TABLES['results'][0])
+        copy_to_staging(c, 'results', tsv_path)
+        c.execute(f'''SELECT COUNT(DISTINCT (s.idx::INTEGER, s.model)) FROM {staging_table('results')} s
+            WHERE NOT EXISTS (SELECT 1 FROM results r WHERE r.idx = s.idx::INTEGER AND r.model = s.model)''')
+        new_rows = c.fetchone()[0]
+        written = merge_staging(c, 'results', 'changed' if delta else 'ignore')
     conn.commit()
-    print(f"Inserted {new_rows} new rows into results table.")
+    print(f"Inserted {new_rows} new rows into results table" + (f", updated {written - new_rows} changed identifiers." if delta else "."))
+    return new_rows, written - new_rows
 
 def main():
     parser = argparse.ArgumentParser()
@@ -135,18 +322,15 @@ def main():
     parser.add_argument('--user', required=True)
     parser.add_argument('--password', required=True)
     parser.add_argument('--update_results', action='store_true', help='Only update results table with new rows from results.tsv')
+    parser.add_argument('--delta', action='store_true', help='With --update_results, also update rows whose identifier changed')
     args = parser.parse_args()
     input_dir = os.path.join('data', args.run)
     conn = get_connection(args)
     if args.update_results:
-        update_results(conn, os.path.join(input_dir, 'results.tsv'))
+        update_results(conn, os.path.join(input_dir, 'results.tsv'), args.delta)
         print(f"Results table updated in {args.dbname}")
     else:
-        load_abstracts(conn, os.path.join(input_dir, 'abstracts.tsv'))
-        load_entities(conn, os.path.join(input_dir, 'entities.tsv'))
-        load_recognized_entities(conn, os.path.join(input_dir, 'recognized_entities.tsv'))
-        load_results(conn, os.path.join(input_dir, 'results.tsv'))
-        load_assessment(conn, os.path.join(input_dir, 'assessment.tsv'))
+        load_all(conn, input_dir)
         print(f"Database loaded at {args.dbname}")
     conn.close()
 
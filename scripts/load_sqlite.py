@@ -1,134 +1,294 @@
 import sqlite3
 import csv
 import os
+import time
 import argparse
+import tempfile
 
-def load_abstracts(db_path, tsv_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS abstracts (
-        pmid TEXT PRIMARY KEY,
-        abstract TEXT
-    )''')
-    with open(tsv_path) as f:
-        reader = csv.DictReader(f, delimiter='\t')
+# Every table is bulk loaded with executemany over a streaming TSV row generator, inside one transaction
+# on a connection opened by bulk_connection(). Secondary indexes are dropped before and built after the
+# data is in, so inserts only maintain the primary keys; the drop is part of the same transaction, so a
+# load that fails partway is rolled back with its indexes still in place.
+SECONDARY_INDEXES = {
+    # The evaluation app filters results by model and assessments by assessor
+    'idx_results_model': 'CREATE INDEX IF NOT EXISTS idx_results_model ON results (model, identifier)',
+    'idx_assessment_assessor': 'CREATE INDEX IF NOT EXISTS idx_assessment_assessor ON assessment (assessor, idx, identifier)',
+    'idx_recognized_entities_pmid': 'CREATE INDEX IF NOT EXISTS idx_recognized_entities_pmid ON recognized_entities (pmid)',
+}
+
+# create_evaluation_database_files.py writes the assessor column of assessment.tsv as 'user'
+TSV_COLUMN_ALIASES = {'assessor': 'user'}
+
+def column_position(header, column):
+    if column not in header and TSV_COLUMN_ALIASES.get(column) in header:
+        column = TSV_COLUMN_ALIASES[column]
+    return header.index(column)
+
+def iter_tsv_rows(tsv_path, columns, null_if_empty=()):
+    """Yield one tuple of the given columns per TSV row; empty values of null_if_empty columns become None."""
+    with open(tsv_path, newline='') as f:
+        reader = csv.reader(f, delimiter='\t')
+        header = next(reader, [])
+        positions = [column_position(header, c) for c in columns]
+        nullable = [i for i, c in enumerate(columns) if c in null_if_empty]
         for row in reader:
-            c.execute('INSERT OR REPLACE INTO abstracts (pmid, abstract) VALUES (?, ?)', (row['pmid'], row['abstract']))
+            values = tuple(row[p] for p in positions)
+            if nullable and any(values[i] == '' for i in nullable):
+                values = tuple(None if i in nullable and v == '' else v for i, v in enumerate(values))
+            yield values
+
+def iter_tsv_like_rows(rows, columns, null_if_empty=()):
+    """Rows as iter_tsv_rows() would read them back from a TSV: None is '' unless the column is null_if_empty."""
+    nullable = [c in null_if_empty for c in columns]
+    for row in rows:
+        yield tuple((None if n else '') if v is None or v == '' else v for v, n in zip(row, nullable))
+
+def bulk_connection(db_path):
+    """
+    A connection tuned for loading: WAL journal and synchronous=OFF, so the load is one sequential write with
+    no fsync per commit. Call finish_bulk_load() when done to commit and restore the previous journal mode.
+    """
+    conn = sqlite3.connect(db_path)
+    journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute('PRAGMA cache_size=-65536')
+    return conn, journal_mode
+
+def finish_bulk_load(conn, journal_mode):
     conn.commit()
+    close_bulk_connection(conn, journal_mode)
+
+def abort_bulk_load(conn, journal_mode):
+    """Roll back everything since the last commit, then restore the journal mode and close, as finish_bulk_load() does."""
+    conn.rollback()
+    close_bulk_connection(conn, journal_mode)
+
+def close_bulk_connection(conn, journal_mode):
+    conn.execute('PRAGMA synchronous=FULL')
+    conn.execute(f'PRAGMA journal_mode={journal_mode}')
     conn.close()
 
-def load_entities(db_path, tsv_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS entities (
+def drop_secondary_indexes(conn):
+    for name in SECONDARY_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+def create_secondary_indexes(conn):
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    for name, sql in SECONDARY_INDEXES.items():
+        if sql.split(' ON ')[1].split()[0] in tables:
+            conn.execute(sql)
+    conn.execute('ANALYZE')
+
+# table -> (CREATE statement, INSERT statement, TSV columns, columns whose empty values are stored as NULL)
+TABLES = {
+    'abstracts': (
+        '''CREATE TABLE IF NOT EXISTS abstracts (
+        pmid TEXT PRIMARY KEY,
+        abstract TEXT
+    )''',
+        'INSERT OR REPLACE INTO abstracts (pmid, abstract) VALUES (?, ?)',
+        ['pmid', 'abstract'], ()),
+    'entities': (
+        '''CREATE TABLE IF NOT EXISTS entities (
         identifier TEXT PRIMARY KEY,
         label TEXT,
         description TEXT,
         type TEXT,
         taxon TEXT
-    )''')
-    with open(tsv_path) as f:
-        reader = csv.DictReader(f, delimiter='\t')
-        for row in reader:
-            c.execute('INSERT OR REPLACE INTO entities (identifier, label, description, type, taxon) VALUES (?, ?, ?, ?, ?)',
-                      (row['identifier'], row['label'], row['description'], row['type'], row['taxon']))
-    conn.commit()
-    conn.close()
-
-def load_recognized_entities(db_path, tsv_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS recognized_entities (
+    )''',
+        'INSERT OR REPLACE INTO entities (identifier, label, description, type, taxon) VALUES (?, ?, ?, ?, ?)',
+        ['identifier', 'label', 'description', 'type', 'taxon'], ()),
+    'recognized_entities': (
+        '''CREATE TABLE IF NOT EXISTS recognized_entities (
         id INTEGER PRIMARY KEY,
         pmid TEXT,
         expanded_text TEXT,
         original_text TEXT
-    )''')
-    with open(tsv_path) as f:
-        reader = csv.DictReader(f, delimiter='\t')
-        for row in reader:
-            c.execute('INSERT OR REPLACE INTO recognized_entities (id, pmid, expanded_text, original_text) VALUES (?, ?, ?, ?)',
-                      (row['id'], row['pmid'], row['expanded_text'], row['original_text']))
-    conn.commit()
-    conn.close()
-
-def load_results(db_path, tsv_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS results (
+    )''',
+        'INSERT OR REPLACE INTO recognized_entities (id, pmid, expanded_text, original_text) VALUES (?, ?, ?, ?)',
+        ['id', 'pmid', 'expanded_text', 'original_text'], ()),
+    'results': (
+        '''CREATE TABLE IF NOT EXISTS results (
         idx INTEGER,
         model TEXT,
         identifier TEXT,
         PRIMARY KEY (idx, model)
-    )''')
-    with open(tsv_path) as f:
-        reader = csv.DictReader(f, delimiter='\t')
-        for row in reader:
-            identifier = row['identifier'] if row['identifier'] != '' else None
-            c.execute('INSERT OR REPLACE INTO results (idx, model, identifier) VALUES (?, ?, ?)',
-                      (row['idx'], row['model'], identifier))
-    conn.commit()
-    conn.close()
-
-def load_assessment(db_path, tsv_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS assessment (
+    )''',
+        'INSERT OR REPLACE INTO results (idx, model, identifier) VALUES (?, ?, ?)',
+        ['idx', 'model', 'identifier'], ('identifier',)),
+    'assessment': (
+        '''CREATE TABLE IF NOT EXISTS assessment (
         idx INTEGER,
         identifier TEXT,
         assessor TEXT,
         assessment TEXT,
         UNIQUE(idx, identifier, assessor)
-    )''')
-    with open(tsv_path) as f:
-        reader = csv.DictReader(f, delimiter='\t')
-        for row in reader:
-            c.execute('INSERT OR REPLACE INTO assessment (idx, identifier, assessor, assessment) VALUES (?, ?, ?, ?)',
-                      (row['idx'], row['identifier'], row['assessor'], row['assessment']))
-    conn.commit()
-    conn.close()
+    )''',
+        'INSERT OR REPLACE INTO assessment (idx, identifier, assessor, assessment) VALUES (?, ?, ?, ?)',
+        ['idx', 'identifier', 'assessor', 'assessment'], ()),
+}
+TSV_FILES = {table: f'{table}.tsv' for table in TABLES}
+
+def load_table(conn, table, tsv_path):
+    """Create table if needed and insert every row of tsv_path with one executemany. Returns the row count."""
+    create_sql, insert_sql, columns, null_if_empty = TABLES[table]
+    conn.execute(create_sql)
+    return conn.executemany(insert_sql, iter_tsv_rows(tsv_path, columns, null_if_empty)).rowcount
+
+def load_abstracts(conn, tsv_path):
+    return load_table(conn, 'abstracts', tsv_path)
 
-def update_results(db_path, tsv_path):
+def load_entities(conn, tsv_path):
+    return load_table(conn, 'entities', tsv_path)
+
+def load_recognized_entities(conn, tsv_path):
+    return load_table(conn, 'recognized_entities', tsv_path)
+
+def load_results(conn, tsv_path):
+    return load_table(conn, 'results', tsv_path)
+
+def load_assessment(conn, tsv_path):
+    return load_table(conn, 'assessment', tsv_path)
+
+class SQLiteBulkWriter:
+    """
+    Bulk writer for one SQLite database: each table is written with one executemany on a bulk_connection(),
+    all in one transaction, with the secondary indexes built on close(). abort() rolls the whole load back,
+    dropped indexes included. PostgresBulkWriter in load_postgres.py has the same write_table/write_tsv/close/abort
+    interface.
+    """
+
+    def __init__(self, db_path):
+        self.conn, self.journal_mode = bulk_connection(db_path)
+        self.timings = {}
+        # sqlite3 only opens a transaction implicitly before DML, so without this the DROP INDEXes would commit at once
+        self.conn.execute('BEGIN')
+        drop_secondary_indexes(self.conn)
+
+    def write_table(self, table, rows, from_tsv=False):
+        """
+        Create table if needed and insert rows, tuples in TABLES column order, stored as if they had gone
+        through a TSV unless from_tsv says they already have. Returns the row count.
+        """
+        create_sql, insert_sql, columns, null_if_empty = TABLES[table]
+        if not from_tsv:
+            rows = iter_tsv_like_rows(rows, columns, null_if_empty)
+        start = time.perf_counter()
+        self.conn.execute(create_sql)
+        count = self.conn.executemany(insert_sql, rows).rowcount
+        self.timings[table] = time.perf_counter() - start
+        print(f"Loaded {count} rows into {table} table in {self.timings[table]:.2f}s.")
+        return count
+
+    def write_tsv(self, table, tsv_path):
+        _, _, columns, null_if_empty = TABLES[table]
+        return self.write_table(table, iter_tsv_rows(tsv_path, columns, null_if_empty), from_tsv=True)
+
+    def close(self):
+        """Build the secondary indexes and commit. Returns seconds per step."""
+        try:
+            start = time.perf_counter()
+            create_secondary_indexes(self.conn)
+            self.timings['indexes'] = time.perf_counter() - start
+        except Exception:
+            self.abort()
+            raise
+        finish_bulk_load(self.conn, self.journal_mode)
+        return self.timings
+
+    def abort(self):
+        """Roll back every table written so far and restore the dropped indexes."""
+        abort_bulk_load(self.conn, self.journal_mode)
+
+def load_all(db_path, input_dir, tables=TABLES):
+    """Load the TSVs of input_dir in one transaction, then build the secondary indexes. Returns seconds per step."""
+    writer = SQLiteBulkWriter(db_path)
+    try:
+        for table in tables:
+            writer.write_tsv(table, os.path.join(input_dir, TSV_FILES[table]))
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+def load_row_by_row(db_path, table, tsv_path):
+    """The previous loading path, one execute per row on a default connection; kept for --benchmark."""
+    create_sql, insert_sql, columns, null_if_empty = TABLES[table]
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS results (
-        idx INTEGER,
-        model TEXT,
-        identifier TEXT,
-        PRIMARY KEY (idx, model)
-    )''')
-    # Fetch all existing (idx, model) pairs
-    c.execute('SELECT idx, model FROM results')
-    existing = set(c.fetchall())
+    c.execute(create_sql)
+    count = 0
     with open(tsv_path) as f:
         reader = csv.DictReader(f, delimiter='\t')
-        new_rows = 0
         for row in reader:
-            key = (int(row['idx']), row['model'])
-            if key not in existing:
-                c.execute('INSERT INTO results (idx, model, identifier) VALUES (?, ?, ?)',
-                          (row['idx'], row['model'], row['identifier']))
-                new_rows += 1
+            c.execute(insert_sql, tuple(None if col in null_if_empty and row[col] == '' else row[col] for col in columns))
+            count += 1
     conn.commit()
     conn.close()
-    print(f"Inserted {new_rows} new rows into results table.")
+    return count
+
+def benchmark(input_dir, tables=('entities', 'abstracts')):
+    """Time the row-by-row and bulk paths on full TSVs, each into a fresh temporary database."""
+    print("Table\tRows\tRowByRow (s)\tBulk (s)\tSpeedup")
+    for table in tables:
+        tsv_path = os.path.join(input_dir, TSV_FILES[table])
+        if not os.path.exists(tsv_path):
+            print(f"Skipping {table}: {tsv_path} does not exist.")
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            rows = load_row_by_row(os.path.join(tmp, 'row_by_row.db'), table, tsv_path)
+            row_by_row = time.perf_counter() - start
+            start = time.perf_counter()
+            load_all(os.path.join(tmp, 'bulk.db'), input_dir, [table])
+            bulk = time.perf_counter() - start
+        print(f"{table}\t{rows}\t{row_by_row:.2f}\t{bulk:.2f}\t{row_by_row / bulk:.1f}x")
+
+def update_results(db_path, tsv_path, delta=False):
+    """
+    Merge results.tsv into the results table with one upsert from a staging table. Only (idx, model) keys not
+    yet in the table are added, unless delta is set, in which case rows whose identifier changed are updated
+    as well. Returns (new rows, changed rows).
+    """
+    create_sql, _, columns, null_if_empty = TABLES['results']
+    conn, journal_mode = bulk_connection(db_path)
+    try:
+        conn.execute(create_sql)
+        conn.execute('CREATE TEMP TABLE staged_results (idx INTEGER, model TEXT, identifier TEXT, PRIMARY KEY (idx, model))')
+        conn.executemany('INSERT OR REPLACE INTO staged_results (idx, model, identifier) VALUES (?, ?, ?)',
+                         iter_tsv_rows(tsv_path, columns, null_if_empty))
+        new_rows = conn.execute('''SELECT COUNT(*) FROM staged_results s
+            WHERE NOT EXISTS (SELECT 1 FROM results r WHERE r.idx = s.idx AND r.model = s.model)''').fetchone()[0]
+        on_conflict = 'DO UPDATE SET identifier = excluded.identifier WHERE results.identifier IS NOT excluded.identifier' if delta else 'DO NOTHING'
+        # WHERE true keeps SQLite from parsing ON CONFLICT as part of the SELECT
+        changed = conn.execute(f'''INSERT INTO results (idx, model, identifier)
+            SELECT idx, model, identifier FROM staged_results WHERE true
+            ON CONFLICT (idx, model) {on_conflict}''').rowcount
+        conn.execute('DROP TABLE staged_results')
+    except Exception:
+        abort_bulk_load(conn, journal_mode)
+        raise
+    finish_bulk_load(conn, journal_mode)
+    print(f"Inserted {new_rows} new rows into results table" + (f", updated {changed - new_rows} changed identifiers." if delta else "."))
+    return new_rows, changed - new_rows
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--run', required=True, help='Run name (input will be read from data/{run})')
     parser.add_argument('--update_results', action='store_true', help='Only update results table with new rows from results.tsv')
+    parser.add_argument('--delta', action='store_true', help='With --update_results, also update rows whose identifier changed')
+    parser.add_argument('--benchmark', action='store_true', help='Compare row-by-row and bulk load times on entities.tsv and abstracts.tsv (the run database is not touched)')
     args = parser.parse_args()
     input_dir = os.path.join('data', args.run)
     db_path = os.path.join(input_dir, 'evaluation.db')
-    if args.update_results:
-        update_results(db_path, os.path.join(input_dir, 'results.tsv'))
+    if args.benchmark:
+        benchmark(input_dir)
+    elif args.update_results:
+        update_results(db_path, os.path.join(input_dir, 'results.tsv'), args.delta)
         print(f"Results table updated in {db_path}")
     else:
-        load_abstracts(db_path, os.path.join(input_dir, 'abstracts.tsv'))
-        load_entities(db_path, os.path.join(input_dir, 'entities.tsv'))
-        load_recognized_entities(db_path, os.path.join(input_dir, 'recognized_entities.tsv'))
-        load_results(db_path, os.path.join(input_dir, 'results.tsv'))
-        load_assessment(db_path, os.path.join(input_dir, 'assessment.tsv'))
+        load_all(db_path, input_dir)
         print(f"Database created at {db_path}")
 
 if __name__ == '__main__':
@@ -4,6 +4,7 @@ import os
 
 from pydantic import BaseModel, Field
 from typing import List
+from abbreviation_store import AbbreviationStore, DEFAULT_STORE_PATH
 
 colors = ['alizarin', 'amaranth', 'amber', 'amethyst', 'apricot', 'aqua', 'aquamarine', 'asparagus', 'auburn', 'azure', 'beige', 'bistre', 'black', 'blue', 'blue-green', 'blue-violet', 'bondi-blue', 'brass', 'bronze', 'brown', 'buff', 'burgundy', 'camouflage-green', 'caput-mortuum', 'cardinal', 'carmine', 'carrot-orange', 'celadon', 'cerise', 'cerulean', 'champagne', 'charcoal', 'chartreuse', 'cherry-blossom-pink', 'chestnut', 'chocolate', 'cinnabar', 'cinnamon', 'cobalt', 'copper', 'coral', 'corn', 'cornflower', 'cream', 'crimson', 'cyan', 'dandelion', 'denim', 'ecru', 'emerald', 'eggplant', 'falu-red', 'fern-green', 'firebrick', 'flax', 'forest-green', 'french-rose', 'fuchsia', 'gamboge', 'gold', 'goldenrod', 'green', 'grey', 'han-purple', 'harlequin', 'heliotrope', 'hollywood-cerise', 'indigo', 'ivory', 'jade', 'kelly-green', 'khaki', 'lavender', 'lawn-green', 'lemon', 'lemon-chiffon', 'lilac', 'lime', 'lime-green', 'linen', 'magenta', 'magnolia', 'malachite', 'maroon', 'mauve', 'midnight-blue', 'mint-green', 'misty-rose', 'moss-green', 'mustard', 'myrtle', 'navajo-white', 'navy-blue', 'ochre', 'office-green', 'olive', 'olivine', 'orange', 'orchid', 'papaya-whip', 'peach', 'pear', 'periwinkle', 'persimmon', 'pine-green', 'pink', 'platinum', 'plum', 'powder-blue', 'puce', 'prussian-blue', 'psychedelic-purple', 'pumpkin', 'purple', 'quartz-grey', 'raw-umber', 'razzmatazz', 'red', 'robin-egg-blue', 'rose', 'royal-blue', 'royal-purple', 'ruby', 'russet', 'rust', 'safety-orange', 'saffron', 'salmon', 'sandy-brown', 'sangria', 'sapphire', 'scarlet', 'school-bus-yellow', 'sea-green', 'seashell', 'sepia', 'shamrock-green', 'shocking-pink', 'silver', 'sky-blue', 'slate-grey', 'smalt', 'spring-bud', 'spring-green', 'steel-blue', 'tan', 'tangerine', 'taupe', 'teal', 'tenné-(tawny)', 'terra-cotta', 'thistle', 'titanium-white', 'tomato', 'turquoise', 'tyrian-purple', 'ultramarine', 'van-dyke-brown', 'vermilion', 'violet', 'viridian', 'wheat', 'white', 'wisteria', 'yellow', 'zucchini']
 
@@ -38,12 +39,22 @@ class SynonymListContext(BaseModel):
             string += "\n]\n"
         return string
 
-def preprocess_annotation_map(annotation_map):
+def preprocess_annotation_map(annotation_map, abbreviation_store=None):
+    """
+    Flatten the entity map into one row per (pmid, original entity). When an AbbreviationStore is
+    given, abbreviations defined in the same abstract are expanded from it, taking precedence over
+    the externally produced expansion.
+    """
     unique = {}
-    for expanded_text, entries in annotation_map.items():
+    for map_expanded_text, entries in annotation_map.items():
         for entry in entries:
             pmid = entry["pmid"]
             original_entity = entry["original_entity"]
+            expanded_text = map_expanded_text
+            if abbreviation_store is not None:
+                store_expansion = abbreviation_store.expand(pmid, original_entity)
+                if store_expansion != original_entity:
+                    expanded_text = store_expansion
             try:
                 medmentions_type = entry["medmentions"]["biolink_types"][0]
             except Exception:
@@ -172,6 +183,7 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--run', default='run_1', help='Run directory name (default: run_1)')
     parser.add_argument('--threshold', type=int, required=True, help='Threshold value (e.g., 5, 10, 20)')
+    parser.add_argument('--abbreviations', action='store_true', help='Expand abbreviations from the abbreviation index built by get_abbreviations.py')
     args = parser.parse_args()
     run_dir = os.path.join('data', args.run)
     parsed_inputs_dir = os.path.join(run_dir, 'parsed_inputs')
@@ -189,7 +201,13 @@ def main():
     entity_map_file = os.path.join('input_data', 'expanded_annotations_entity_map.json')
     with open(entity_map_file) as f:
         entity_map = json.load(f)
-    preprocessed_annotations = preprocess_annotation_map(entity_map)
+    abbreviation_store = None
+    if args.abbreviations:
+        abbreviation_store = AbbreviationStore(DEFAULT_STORE_PATH)
+        abbreviation_store.sync(os.path.join('input_data', 'abbreviation_llm_results.jsonl'))
+    preprocessed_annotations = preprocess_annotation_map(entity_map, abbreviation_store)
+    if abbreviation_store is not None:
+        abbreviation_store.close()
     # Write preprocessed_annotations to annotation_list.jsonl
     annotation_list_outfile = os.path.join(parsed_inputs_dir, 'annotation_list.jsonl')
     with open(annotation_list_outfile, 'w') as out_f:
@@ -0,0 +1,301 @@
+import json
+import numpy as np
+import pandas as pd
+
+# Vectorized metrics shared by analyze.py and the evaluation app. Everything works on DataFrames:
+#   evaluation frames: one row per evaluated output (columns of evaluation_summary_all.jsonl)
+#   results frames: the results table of results.db (idx, model, identifier), MedMentions as model 'medmentions'
+REFERENCE_MODEL = 'medmentions'
+
+EVALUATION_COLUMNS = [
+    "index", "model name", "threshold", "Structured Output", "Number of exact matches", "exact candidates",
+    "Valid JSON", "Colormap Length", "Number of missing codes", "Number of mismatched codes",
+    "Duration (s)", "Cost (USD)", "Completion Tokens"
+]
+ASSESSMENT_STATES = ['True', 'False', 'Unsure']
+MODEL_ASSESSMENT_STATES = ['True', 'False', 'Unsure', 'Null']
+
+
+def load_evaluation_frame(input_path, columns=EVALUATION_COLUMNS):
+    """
+    Read the scalar columns of evaluation_summary_all.jsonl (the per-row candidates lists are skipped)
+    and fill in the defaults the row-by-row code used for missing fields.
+    """
+    records = []
+    with open(input_path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                records.append([row.get(c) for c in columns])
+    df = pd.DataFrame.from_records(records, columns=columns)
+    df["model name"] = df["model name"].fillna("unknown")
+    df["threshold"] = df["threshold"].fillna("unknown").astype(str)
+    df["Structured Output"] = df["Structured Output"].fillna(False).astype(bool)
+    df["Valid JSON"] = df["Valid JSON"].fillna(True).astype(bool)
+    df["exact candidates"] = df["exact candidates"].fillna("")
+    for col in ("Number of exact matches", "Colormap Length", "Number of missing codes", "Number of mismatched codes"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+    for col in ("Duration (s)", "Cost (USD)", "Completion Tokens"):
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def threshold_sort_key(threshold):
+    return (0, int(threshold), "") if str(threshold).isdigit() else (1, 0, str(threshold))
+
+
+def row_metric_frame(df):
+    """Per-row values whose group means are the model/threshold metrics."""
+    colormap_length = df["Colormap Length"].to_numpy(dtype=float)
+    has_colormap = colormap_length > 0
+    frame = pd.DataFrame({
+        "model": df["model name"],
+        "structured": df["Structured Output"],
+        "threshold": df["threshold"],
+        "single_exact": (df["Number of exact matches"] == 1).to_numpy(),
+        "json_error": ~df["Valid JSON"].to_numpy(),
+        "num_exact": df["Number of exact matches"].to_numpy(dtype=float),
+        "frac_missing": np.divide(df["Number of missing codes"].to_numpy(dtype=float), colormap_length,
+                                  out=np.zeros(len(df)), where=has_colormap),
+        "frac_mismatched": np.divide(df["Number of mismatched codes"].to_numpy(dtype=float), colormap_length,
+                                     out=np.zeros(len(df)), where=has_colormap),
+        "duration": df["Duration (s)"],
+        "cost": df["Cost (USD)"],
+        "completion_tokens": df["Completion Tokens"],
+    })
+    return frame
+
+
+def model_threshold_metrics(df):
+    """
+    Per (model, structured, threshold) completion, exact-match, JSON-error, missing/mismatched code rates,
+    and mean duration/cost/completion tokens over the rows that report them (NaN when none do).
+    """
+    frame = row_metric_frame(df)
+    summary = frame.groupby(["model", "structured", "threshold"], sort=False).agg(
+        completed=("single_exact", "size"),
+        frac_single_exact=("single_exact", "mean"),
+        frac_json_error=("json_error", "mean"),
+        avg_num_exact=("num_exact", "mean"),
+        avg_frac_missing=("frac_missing", "mean"),
+        avg_frac_mismatched=("frac_mismatched", "mean"),
+        avg_duration=("duration", "mean"),
+        avg_cost=("cost", "mean"),
+        avg_completion_tokens=("completion_tokens", "mean"),
+    ).reset_index()
+    return sort_by_group_key(summary)
+
+
+def count_prompts(bodies_file):
+    """Number of prompts (non-blank lines) in a bodies_{t}.jsonl file."""
+    with open(bodies_file, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def corpus_extrapolation(summary, prompt_counts, concurrency=1, hosts=1):
+    """
+    Scale the per-prompt means of model_threshold_metrics() to a full run over prompt_counts[threshold]
+    prompts, with concurrency requests in flight on each of hosts servers and every request taking the
+    measured mean duration. Adds corpus_prompts, prompts_per_hour, total_duration_days (wall clock) and
+    total_cost; they are NaN where the threshold has no prompt count or the mean is missing.
+    """
+    out = summary.copy()
+    parallel = concurrency * hosts
+    prompts = pd.to_numeric(out["threshold"].astype(str).map(prompt_counts), errors="coerce")
+    duration = out["avg_duration"].where(out["avg_duration"] > 0)
+    out["corpus_prompts"] = prompts
+    out["prompts_per_hour"] = 3600.0 * parallel / duration
+    out["total_duration_days"] = prompts * duration / parallel / 86400.0
+    out["total_cost"] = prompts * out["avg_cost"]
+    return out
+
+
+def group_sort_key(model, structured, threshold):
+    return (model, bool(structured), threshold_sort_key(threshold))
+
+
+def sort_by_group_key(summary):
+    order = sorted(range(len(summary)), key=lambda i: group_sort_key(summary.at[i, "model"], summary.at[i, "structured"], summary.at[i, "threshold"]))
+    return summary.iloc[order].reset_index(drop=True)
+
+
+# Aggregated TSV column -> per-row value column of row_metric_frame() it is the mean of
+BOOTSTRAP_METRICS = {"FracSingleExact": "single_exact", "FracJsonError": "json_error", "AvgNumExact": "num_exact"}
+# Above this many distinct values, bootstrap by resampling index arrays instead of multinomial counts
+MAX_MULTINOMIAL_VALUES = 64
+
+
+def bootstrap_means(values, n_boot, rng, max_block=2_000_000):
+    """
+    n_boot bootstrap replicates of the mean of values. When values take few distinct levels (exact-match
+    flags and counts), the number of draws of each level is sampled from a multinomial, which is the same
+    distribution as resampling indices but costs O(n_boot * levels). Otherwise index arrays are resampled
+    in blocks of at most max_block elements.
+    """
+    n = len(values)
+    levels, inverse = np.unique(values, return_inverse=True)
+    if len(levels) <= MAX_MULTINOMIAL_VALUES:
+        counts = rng.multinomial(n, np.bincount(inverse) / n, size=n_boot)
+        return counts @ levels / n
+    means = np.empty(n_boot)
+    block = max(1, max_block // n)
+    for start in range(0, n_boot, block):
+        stop = min(n_boot, start + block)
+        means[start:stop] = values[rng.integers(0, n, size=(stop - start, n))].mean(axis=1)
+    return means
+
+
+def bootstrap_group(task):
+    """Percentile intervals for one group. Runs in a worker process when bootstrap_intervals() has workers > 1."""
+    key, columns, n_boot, confidence, seed = task
+    rng = np.random.default_rng(seed)
+    tail = (1 - confidence) / 2
+    intervals = {}
+    for name, values in columns.items():
+        low, high = np.quantile(bootstrap_means(values, n_boot, rng), [tail, 1 - tail])
+        intervals[f"{name}Low"] = low
+        intervals[f"{name}High"] = high
+    return key, intervals
+
+
+def bootstrap_intervals(df, n_boot=2000, confidence=0.95, seed=0, workers=1):
+    """
+    Bootstrap confidence intervals for the BOOTSTRAP_METRICS of every (model, structured, threshold) group.
+    Each group gets its own seed spawned from seed in group order, so results do not depend on workers.
+    """
+    frame = row_metric_frame(df)
+    groups = sorted(frame.groupby(["model", "structured", "threshold"], sort=False), key=lambda g: group_sort_key(*g[0]))
+    seeds = np.random.SeedSequence(seed).spawn(len(groups))
+    tasks = [(key, {name: group[col].to_numpy(dtype=float) for name, col in BOOTSTRAP_METRICS.items()}, n_boot, confidence, group_seed)
+             for (key, group), group_seed in zip(groups, seeds)]
+    if workers > 1 and len(tasks) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(bootstrap_group, tasks))
+    else:
+        results = [bootstrap_group(task) for task in tasks]
+    rows = [{"model": model, "structured": structured, "threshold": threshold, **intervals}
+            for (model, structured, threshold), intervals in results]
+    return pd.DataFrame(rows)
+
+
+def pairwise_agreement(df):
+    """
+    For every threshold and pair of models (structured runs counted as their own model), the fraction of
+    shared indices where both chose the same set of exact candidates.
+    """
+    labels = df["model name"].where(~df["Structured Output"], df["model name"] + " [structured]")
+    exact_sets = df["exact candidates"].map(lambda s: "|".join(sorted(s.split("|"))) if s else "")
+    frame = pd.DataFrame({"threshold": df["threshold"], "index": df["index"], "model": labels, "exact": exact_sets})
+    rows = []
+    for threshold, group in frame.groupby("threshold", sort=False):
+        wide = group.pivot_table(index="index", columns="model", values="exact", aggfunc="last")
+        models = sorted(wide.columns)
+        values = wide[models].to_numpy(dtype=object)
+        present = ~pd.isna(values)
+        for i in range(len(models)):
+            for j in range(i + 1, len(models)):
+                shared = present[:, i] & present[:, j]
+                n_shared = int(shared.sum())
+                agree = int((values[shared, i] == values[shared, j]).sum())
+                rows.append({"threshold": threshold, "model_a": models[i], "model_b": models[j],
+                             "shared": n_shared, "agreement": agree / n_shared if n_shared else np.nan})
+    result = pd.DataFrame(rows, columns=["threshold", "model_a", "model_b", "shared", "agreement"])
+    if result.empty:
+        return result
+    order = sorted(range(len(result)), key=lambda i: (threshold_sort_key(result.at[i, "threshold"]), result.at[i, "model_a"], result.at[i, "model_b"]))
+    return result.iloc[order].reset_index(drop=True)
+
+
+def agreement_by_model(results, reference=REFERENCE_MODEL):
+    """
+    Pair every non-null reference identifier with each model's identifiers at the same idx and count
+    matches, disagreements and NULL model identifiers. Indices a model has no row for are skipped.
+    Returns a frame indexed by model with match, disagree, null and total columns.
+    """
+    ref = results.loc[(results["model"] == reference) & results["identifier"].notna(), ["idx", "identifier"]]
+    others = results.loc[results["model"] != reference, ["idx", "model", "identifier"]]
+    pairs = ref.merge(others, on="idx", suffixes=("_ref", "_model"))
+    is_null = pairs["identifier_model"].isna()
+    is_match = ~is_null & (pairs["identifier_model"] == pairs["identifier_ref"])
+    counts = pd.DataFrame({
+        "model": pairs["model"],
+        "match": is_match.astype(int),
+        "disagree": (~is_null & ~is_match).astype(int),
+        "null": is_null.astype(int),
+    }).groupby("model").sum()
+    counts["total"] = counts["match"] + counts["disagree"] + counts["null"]
+    return counts
+
+
+def agreement_summary(counts, model):
+    """The {'match', 'disagree', 'null', 'total'} dict for one model of agreement_by_model()."""
+    if model not in counts.index:
+        return {'match': 0, 'disagree': 0, 'null': 0, 'total': 0}
+    return {k: int(v) for k, v in counts.loc[model, ['match', 'disagree', 'null', 'total']].items()}
+
+
+def per_index_identifiers(results, model, reference=REFERENCE_MODEL):
+    """
+    One row per idx that has a reference or model result, with the first non-null identifier each side
+    reported (None when it has no row or only NULL identifiers).
+    """
+    def first_identifier(name):
+        rows = results.loc[results["model"] == name, ["idx", "identifier"]].sort_values(["idx", "identifier"])
+        return rows.groupby("idx")["identifier"].first()
+    ref_ids = first_identifier(reference)
+    model_ids = first_identifier(model)
+    idx = results.loc[results["model"].isin([reference, model]), "idx"].drop_duplicates().sort_values()
+    frame = pd.DataFrame({"idx": idx.to_numpy()})
+    frame["reference_id"] = frame["idx"].map(ref_ids)
+    frame["model_id"] = frame["idx"].map(model_ids)
+    return frame
+
+
+def presence_confusion(per_index):
+    """Reference present/null by model agrees/disagrees/is_null counts over per_index_identifiers() rows."""
+    ref_null = per_index["reference_id"].isna()
+    model_null = per_index["model_id"].isna()
+    agrees = ~ref_null & ~model_null & (per_index["model_id"] == per_index["reference_id"])
+    col = np.where(model_null, 'is_null', np.where(agrees, 'agrees', 'disagrees'))
+    row = np.where(ref_null, 'medmentions_null', 'medmentions_present')
+    return fill_matrix(['medmentions_present', 'medmentions_null'], ['agrees', 'disagrees', 'is_null'], row, col)
+
+
+def fill_matrix(row_states, col_states, rows, cols):
+    """Nested {row: {col: count}} dict from parallel state arrays; pairs outside the given states are dropped."""
+    counts = pd.crosstab(pd.Series(rows, dtype=object), pd.Series(cols, dtype=object)) if len(rows) else pd.DataFrame()
+    return {r: {c: int(counts.at[r, c]) if r in counts.index and c in counts.columns else 0 for c in col_states} for r in row_states}
+
+
+def assessment_state(values):
+    """Map assessment strings to 'True'/'False'/'Unsure', anything else (or missing) to 'Null'."""
+    lowered = values.astype("string").str.lower().fillna("").to_numpy(dtype=object)
+    return np.select([lowered == 'agree', lowered == 'disagree', lowered == 'unsure'], ['True', 'False', 'Unsure'], 'Null')
+
+
+def assessment_confusion(per_index, assessments):
+    """
+    Reference state (rows) by model state (columns) according to one assessor's assessments
+    (columns idx, identifier, assessment). Indices where both sides report the same identifier count as
+    True/True. Other indices are only counted when every non-null identifier on them has been assessed;
+    those without a reference identifier have no reference state and are left out.
+    """
+    ref_present = per_index["reference_id"].notna()
+    model_present = per_index["model_id"].notna()
+    same = ref_present & model_present & (per_index["reference_id"] == per_index["model_id"])
+
+    frame = per_index.loc[~same]
+    keyed = assessments[["idx", "identifier", "assessment"]]
+    frame = frame.merge(keyed.rename(columns={"identifier": "reference_id", "assessment": "reference_assessment"}),
+                        on=["idx", "reference_id"], how="left", indicator="reference_assessed")
+    frame = frame.merge(keyed.rename(columns={"identifier": "model_id", "assessment": "model_assessed_value"}),
+                        on=["idx", "model_id"], how="left", indicator="model_assessed")
+    ref_ok = frame["reference_id"].isna() | (frame["reference_assessed"] == "both")
+    model_ok = frame["model_id"].isna() | (frame["model_assessed"] == "both")
+    frame = frame.loc[ref_ok & model_ok & frame["reference_id"].notna()]
+    ref_state = assessment_state(frame["reference_assessment"])
+    model_state = np.where(frame["model_id"].isna(), 'Null', assessment_state(frame["model_assessed_value"]))
+    matrix = fill_matrix(ASSESSMENT_STATES, MODEL_ASSESSMENT_STATES, ref_state, model_state)
+    matrix['True']['True'] += int(same.sum())
+    return matrix
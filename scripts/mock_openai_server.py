@@ -0,0 +1,302 @@
+import os
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from flask import Flask, request, jsonify, Response
+from result_files import threshold_from_colormap_name, index_from_custom_id
+
+# Local stand-in for the OpenAI Files/Batches and Chat Completions APIs used by run_openai.py.
+# Point run_openai.py at it with --base-url http://localhost:8000/v1 (or OPENAI_BASE_URL).
+app = Flask(__name__)
+
+STATE = {"files": {}, "batches": {}}
+STATE_LOCK = threading.Lock()
+RELATION_TYPES = ['exact', 'superclass', 'subclass', 'related', 'none']
+
+
+def new_id(prefix):
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def load_colormaps(run_dir):
+    """
+    Returns {threshold: {index: colormap}} for every bodies_{t}_colormap.jsonl in run_dir/parsed_inputs.
+    """
+    colormaps = {}
+    parsed_inputs_dir = os.path.join(run_dir, 'parsed_inputs')
+    if not os.path.isdir(parsed_inputs_dir):
+        return colormaps
+    for fname in os.listdir(parsed_inputs_dir):
+        threshold = threshold_from_colormap_name(fname)
+        if threshold is None:
+            continue
+        by_index = {}
+        with open(os.path.join(parsed_inputs_dir, fname)) as f:
+            for line in f:
+                if line.strip():
+                    obj = json.loads(line)
+                    by_index[obj["index"]] = obj
+        colormaps[str(threshold)] = by_index
+    return colormaps
+
+
+def threshold_from_filename(filename):
+    m = re.search(r'bodies_(\d+)', filename or "")
+    return m.group(1) if m else None
+
+
+def canned_content(color_map, rng, invalid_json_rate):
+    """
+    Build a model answer in the response_schema.Response shape from a colormap entry:
+    one randomly chosen candidate is 'exact', the rest get random non-exact relations.
+    """
+    if rng.random() < invalid_json_rate:
+        return "```json\n{\"reasoning\": \"truncated\", \"candidates\": [\n```"
+    labels = color_map.get("labels", {})
+    exact_code = rng.choice(list(labels)) if labels else None
+    candidates = []
+    for color_code, label in labels.items():
+        relation_type = 'exact' if color_code == exact_code else rng.choice(RELATION_TYPES[1:])
+        candidates.append({
+            "candidate": label,
+            "color_code": color_code,
+            "vocabulary_class": color_map.get("putative_type", ""),
+            "evaluation": f"Mock evaluation of {label} for {color_map.get('entity', '')}",
+            "relation_type": relation_type
+        })
+    return json.dumps({"reasoning": "Mock response.", "candidates": candidates})
+
+
+def chat_completion(body, color_map, rng, invalid_json_rate):
+    prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+    content = canned_content(color_map, rng, invalid_json_rate)
+    return {
+        "id": new_id("chatcmpl"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "unknown"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": len(prompt) // 4 + len(content) // 4,
+            "prompt_tokens_details": {"cached_tokens": 0}
+        }
+    }
+
+
+def build_batch_output(batch, config):
+    """
+    Run every request line of the batch input file.
+    Returns:
+        tuple: (output JSONL, error JSONL); as in the Batch API, failed lines only go to the error file
+    """
+    input_file = STATE["files"][batch["input_file_id"]]
+    threshold = threshold_from_filename(input_file["filename"])
+    colormaps = config["colormaps"].get(threshold) or {}
+    rng = random.Random(f"{config['seed']}:{batch['id']}")
+    lines = []
+    error_lines = []
+    for line in input_file["content"].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        req = json.loads(line)
+        custom_id = req.get("custom_id")
+        result = {"id": new_id("batch_req"), "custom_id": custom_id, "response": None, "error": None}
+        if rng.random() < config["error_rate"]:
+            result["error"] = {"code": "server_error", "message": "Injected failure from mock server."}
+            error_lines.append(json.dumps(result))
+        else:
+            color_map = colormaps.get(index_from_custom_id(custom_id), {})
+            result["response"] = {
+                "status_code": 200,
+                "request_id": uuid.uuid4().hex,
+                "body": chat_completion(req.get("body", {}), color_map, rng, config["invalid_json_rate"])
+            }
+            lines.append(json.dumps(result))
+    return jsonl_bytes(lines), jsonl_bytes(error_lines)
+
+
+def jsonl_bytes(lines):
+    return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+
+def store_file(filename, purpose, content):
+    file_id = new_id("file")
+    STATE["files"][file_id] = {
+        "id": file_id, "filename": filename, "purpose": purpose, "content": content, "created_at": int(time.time())
+    }
+    return file_id
+
+
+def advance_batch(batch, config):
+    """Move a batch through validating -> in_progress -> completed/failed based on wall time."""
+    if batch["status"] in ("completed", "failed", "cancelled"):
+        return
+    elapsed = time.time() - batch["started"]
+    if elapsed < config["batch_duration"] * 0.1:
+        batch["status"] = "validating"
+    elif elapsed < config["batch_duration"]:
+        batch["status"] = "in_progress"
+    elif batch["inject_failure"]:
+        batch["status"] = "failed"
+        batch["failed_at"] = int(time.time())
+        batch["errors"] = {"object": "list", "data": [{"code": "mock_failure", "message": "Injected batch failure."}]}
+    else:
+        content, errors = build_batch_output(batch, config)
+        batch["output_file_id"] = store_file(f"{batch['id']}_output.jsonl", "batch_output", content)
+        if errors:
+            batch["error_file_id"] = store_file(f"{batch['id']}_error.jsonl", "batch_output", errors)
+        failed = errors.count(b"\n")
+        total = failed + content.count(b"\n")
+        batch["request_counts"] = {"total": total, "completed": total - failed, "failed": failed}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+
+# Server-side bookkeeping that the real API does not return
+PRIVATE_BATCH_KEYS = ("inject_failure", "started")
+
+
+def public_batch(batch):
+    return {k: v for k, v in batch.items() if k not in PRIVATE_BATCH_KEYS}
+
+
+def simulate_latency():
+    latency = app.config["MOCK"]["latency"]
+    if latency > 0:
+        time.sleep(latency)
+
+
+@app.route('/v1/files', methods=['POST'])
+def upload_file():
+    simulate_latency()
+    uploaded = request.files.get('file')
+    if uploaded is None:
+        return jsonify({"error": {"message": "Missing file"}}), 400
+    file_id = new_id("file")
+    content = uploaded.read()
+    entry = {
+        "id": file_id, "filename": uploaded.filename, "purpose": request.form.get("purpose", "batch"),
+        "content": content, "created_at": int(time.time())
+    }
+    with STATE_LOCK:
+        STATE["files"][file_id] = entry
+    return jsonify({"id": file_id, "object": "file", "bytes": len(content), "created_at": entry["created_at"],
+                    "filename": entry["filename"], "purpose": entry["purpose"]})
+
+
+@app.route('/v1/files/<file_id>/content', methods=['GET'])
+def file_content(file_id):
+    simulate_latency()
+    with STATE_LOCK:
+        entry = STATE["files"].get(file_id)
+    if entry is None:
+        return jsonify({"error": {"message": f"No such file: {file_id}"}}), 404
+    return Response(entry["content"], mimetype="application/jsonl")
+
+
+@app.route('/v1/batches', methods=['POST'])
+def create_batch():
+    simulate_latency()
+    config = app.config["MOCK"]
+    body = request.get_json()
+    input_file_id = body.get("input_file_id")
+    with STATE_LOCK:
+        if input_file_id not in STATE["files"]:
+            return jsonify({"error": {"message": f"No such file: {input_file_id}"}}), 400
+        batch_id = new_id("batch")
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+            "input_file_id": input_file_id, "completion_window": body.get("completion_window"),
+            "status": "validating", "output_file_id": None, "error_file_id": None,
+            "created_at": int(time.time()), "started": time.time(),
+            "inject_failure": config["rng"].random() < config["batch_failure_rate"]
+        }
+        STATE["batches"][batch_id] = batch
+        return jsonify(public_batch(batch))
+
+
+@app.route('/v1/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    simulate_latency()
+    with STATE_LOCK:
+        batch = STATE["batches"].get(batch_id)
+        if batch is None:
+            return jsonify({"error": {"message": f"No such batch: {batch_id}"}}), 404
+        advance_batch(batch, app.config["MOCK"])
+        return jsonify(public_batch(batch))
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def create_chat_completion():
+    simulate_latency()
+    config = app.config["MOCK"]
+    body = request.get_json()
+    with STATE_LOCK:
+        roll = config["rng"].random()
+        rng = random.Random(config["rng"].random())
+    if roll < config["error_rate"]:
+        return jsonify({"error": {"code": "server_error", "message": "Injected failure from mock server."}}), 500
+    if roll < config["error_rate"] + config["rate_limit_rate"]:
+        return (jsonify({"error": {"code": "rate_limit_exceeded", "message": "Injected rate limit from mock server."}}),
+                429, {"Retry-After": str(config["retry_after"])})
+    # The realtime path does not carry a custom_id, so match the prompt against every colormap entity.
+    color_map = {}
+    prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+    for by_index in config["colormaps"].values():
+        for candidate in by_index.values():
+            if candidate.get("labels") and all(label in prompt for label in candidate["labels"].values()):
+                color_map = candidate
+                break
+        if color_map:
+            break
+    return jsonify(chat_completion(body, color_map, rng, config["invalid_json_rate"]))
+
+
+def configure(run_dir, latency=0.0, batch_duration=5.0, batch_failure_rate=0.0, error_rate=0.0, invalid_json_rate=0.0, seed=0,
+              rate_limit_rate=0.0, retry_after=1):
+    app.config["MOCK"] = {
+        "colormaps": load_colormaps(run_dir),
+        "latency": latency,
+        "batch_duration": batch_duration,
+        "batch_failure_rate": batch_failure_rate,
+        "error_rate": error_rate,
+        "invalid_json_rate": invalid_json_rate,
+        "rate_limit_rate": rate_limit_rate,
+        "retry_after": retry_after,
+        "seed": seed,
+        "rng": random.Random(seed)
+    }
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI Files/Batches API.")
+    parser.add_argument('--run', default='run_1', help='Run directory name used for canned responses (default: run_1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of delay added to every request (default: 0)')
+    parser.add_argument('--batch-duration', type=float, default=5.0, help='Seconds before a submitted batch completes (default: 5)')
+    parser.add_argument('--batch-failure-rate', type=float, default=0.0, help='Fraction of batches that end as failed (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of batch lines returned as errors (default: 0)')
+    parser.add_argument('--invalid-json-rate', type=float, default=0.0, help='Fraction of responses with unparseable content (default: 0)')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of realtime requests answered with 429 (default: 0)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with injected 429s (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for canned responses and failures (default: 0)')
+    args = parser.parse_args()
+    run_dir = os.path.join('data', args.run)
+    configure(run_dir, args.latency, args.batch_duration, args.batch_failure_rate, args.error_rate, args.invalid_json_rate, args.seed,
+              args.rate_limit_rate, args.retry_after)
+    print(f"Loaded colormaps for thresholds: {sorted(app.config['MOCK']['colormaps'])}")
+    app.run(port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
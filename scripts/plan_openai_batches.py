@@ -0,0 +1,243 @@
+import os
+import csv
+import json
+import glob
+import argparse
+from collections import defaultdict
+from convert_to_openai_batch import MODELS
+from pricing import PRICING_PATH, parse_pricing, find_price_info
+from result_files import parse_openai_results_name, find_bodies_files
+
+DEFAULT_CHARS_PER_TOKEN = 4.0
+DEFAULT_OUTPUT_TOKENS = 1500
+
+
+def prompt_char_prefix_sums(bodies_file):
+    """
+    Returns a list where entry i is the total prompt characters of the first i prompts,
+    so the cost of any --limit N prefix can be read off directly.
+    """
+    sums = [0]
+    with open(bodies_file) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            prompt = json.loads(line).get("prompt")
+            if prompt is None:
+                continue
+            sums.append(sums[-1] + len(prompt))
+    return sums
+
+
+def batch_prompt_chars(batch_file):
+    total = 0
+    with open(batch_file) as f:
+        for line in f:
+            if line.strip():
+                body = json.loads(line).get("body", {})
+                total += sum(len(m.get("content", "")) for m in body.get("messages", []))
+    return total
+
+
+def collect_usage_history(run_dirs, models):
+    """
+    Scan prior OpenAI result files for token usage.
+    Returns:
+        tuple: (chars_per_token by model, avg completion tokens by (model, threshold), avg completion tokens by model)
+    """
+    prompt_chars = defaultdict(int)
+    prompt_tokens = defaultdict(int)
+    completion_by_pair = defaultdict(lambda: [0, 0])
+    completion_by_model = defaultdict(lambda: [0, 0])
+    for run_dir in run_dirs:
+        for results_file in glob.glob(os.path.join(run_dir, 'open_ai_results_*', 'openai_results_*.jsonl')):
+            threshold = int(os.path.basename(os.path.dirname(results_file)).split('_')[-1])
+            parsed = parse_openai_results_name(results_file)
+            if parsed is None or parsed.model not in models:
+                continue
+            model = parsed.model
+            file_prompt_tokens = 0
+            with open(results_file) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    response = json.loads(line).get("response") or {}
+                    usage = (response.get("body") or {}).get("usage")
+                    if not usage:
+                        continue
+                    file_prompt_tokens += usage.get("prompt_tokens", 0)
+                    completion_by_pair[(model, threshold)][0] += usage.get("completion_tokens", 0)
+                    completion_by_pair[(model, threshold)][1] += 1
+                    completion_by_model[model][0] += usage.get("completion_tokens", 0)
+                    completion_by_model[model][1] += 1
+            batch_file = os.path.join(run_dir, f'open_ai_batches_{threshold}',
+                                      os.path.basename(results_file).replace("openai_results_", "openai_batch_"))
+            if file_prompt_tokens and os.path.exists(batch_file):
+                prompt_chars[model] += batch_prompt_chars(batch_file)
+                prompt_tokens[model] += file_prompt_tokens
+    chars_per_token = {m: prompt_chars[m] / prompt_tokens[m] for m in prompt_tokens if prompt_tokens[m]}
+    avg_by_pair = {k: total / n for k, (total, n) in completion_by_pair.items() if n}
+    avg_by_model = {k: total / n for k, (total, n) in completion_by_model.items() if n}
+    return chars_per_token, avg_by_pair, avg_by_model
+
+
+def collect_quality_history(run_dirs):
+    """
+    Read FracSingleExact from prior analyze.py outputs; later runs override earlier ones.
+    Returns:
+        dict: (model, threshold) -> FracSingleExact
+    """
+    quality = {}
+    for run_dir in run_dirs:
+        path = os.path.join(run_dir, 'evaluation_summary_all_aggregated.tsv')
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            for row in csv.DictReader(f, delimiter='\t'):
+                if row.get('Structured') == 'True':
+                    continue
+                try:
+                    quality[(row['Model'], int(row['Threshold']))] = float(row['FracSingleExact'])
+                except (KeyError, ValueError):
+                    continue
+    return quality
+
+
+def mark_dominated(candidates):
+    """
+    A candidate is dominated when another one with known quality costs no more per prompt and scores
+    at least as well, strictly better on one of the two. Candidates without quality history are kept.
+    """
+    for c in candidates:
+        c["dominated_by"] = None
+        if c["quality"] is None:
+            continue
+        for other in candidates:
+            if other is c or other["quality"] is None:
+                continue
+            if (other["cost_per_prompt"] <= c["cost_per_prompt"] and other["quality"] >= c["quality"]
+                    and (other["cost_per_prompt"] < c["cost_per_prompt"] or other["quality"] > c["quality"])):
+                c["dominated_by"] = f"{other['model']}@{other['threshold']}"
+                break
+
+
+def plan_batches(candidates, budget, min_sample):
+    """
+    Greedily fund non-dominated candidates in order of known quality (unknown last, then cheapest first).
+    A candidate that no longer fits gets the largest prefix sample the remaining budget allows.
+    """
+    remaining = budget
+    order = sorted(candidates, key=lambda c: (c["quality"] is None, -(c["quality"] or 0), c["cost_per_prompt"]))
+    for c in order:
+        c["sample_size"] = 0
+        c["est_cost"] = 0.0
+        if c["dominated_by"]:
+            c["status"] = "dominated"
+            continue
+        available = len(c["char_sums"]) - 1
+        n = largest_affordable_prefix(c, remaining)
+        if n < min_sample:
+            c["status"] = "over_budget"
+            continue
+        c["sample_size"] = n
+        c["est_cost"] = estimate_cost(c, n)
+        c["status"] = "planned" if n == available else "sampled"
+        remaining -= c["est_cost"]
+    return remaining
+
+
+def largest_affordable_prefix(c, budget):
+    """Binary search for the largest --limit whose estimated cost fits the budget (cost grows with n)."""
+    lo, hi = 0, len(c["char_sums"]) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_cost(c, mid) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def estimate_tokens(c, n):
+    input_tokens = c["char_sums"][n] / c["chars_per_token"]
+    output_tokens = n * c["output_tokens"]
+    return input_tokens, output_tokens
+
+
+def estimate_cost(c, n):
+    input_tokens, output_tokens = estimate_tokens(c, n)
+    return (input_tokens * c["price"]["input"] + output_tokens * c["price"]["output"]) / 1_000_000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan which OpenAI (model, threshold, sample size) batches fit a budget.")
+    parser.add_argument('--run', default='run_1', help='Run directory name (default: run_1)')
+    parser.add_argument('--budget', type=float, required=True, help='Budget cap in USD')
+    parser.add_argument('--models', type=str, default=None, help='Comma-separated list of models to consider (default: all)')
+    parser.add_argument('--thresholds', nargs='+', type=int, default=None, help='Thresholds to consider (default: all bodies files)')
+    parser.add_argument('--history', nargs='+', default=None, help='Run directory names to take usage and quality history from (default: all data/run_*)')
+    parser.add_argument('--min-sample', type=int, default=50, help='Smallest sample worth submitting (default: 50)')
+    parser.add_argument('--default-output-tokens', type=float, default=DEFAULT_OUTPUT_TOKENS, help=f'Completion tokens per prompt when a model has no history (default: {DEFAULT_OUTPUT_TOKENS})')
+    args = parser.parse_args()
+
+    run_dir = os.path.join('data', args.run)
+    models = [m.strip() for m in args.models.split(",") if m.strip()] if args.models else MODELS
+    if args.history:
+        history_dirs = [os.path.join('data', r) for r in args.history]
+    else:
+        history_dirs = sorted(glob.glob(os.path.join('data', 'run_*')))
+    pricing = parse_pricing(PRICING_PATH)
+
+    bodies_files = find_bodies_files(run_dir, args.thresholds)
+    if not bodies_files:
+        print(f"No bodies files found in {run_dir}/parsed_inputs.")
+        return
+    chars_per_token, output_by_pair, output_by_model = collect_usage_history(history_dirs, models)
+    quality = collect_quality_history(history_dirs)
+
+    candidates = []
+    for threshold, bodies_file in bodies_files.items():
+        char_sums = prompt_char_prefix_sums(bodies_file)
+        for model in models:
+            output_tokens = output_by_pair.get((model, threshold), output_by_model.get(model, args.default_output_tokens))
+            c = {
+                "model": model,
+                "threshold": threshold,
+                "char_sums": char_sums,
+                "chars_per_token": chars_per_token.get(model, DEFAULT_CHARS_PER_TOKEN),
+                "output_tokens": output_tokens,
+                "price": find_price_info(model, pricing),
+                "quality": quality.get((model, threshold))
+            }
+            n = len(char_sums) - 1
+            c["cost_per_prompt"] = estimate_cost(c, n) / n if n else 0.0
+            candidates.append(c)
+
+    mark_dominated(candidates)
+    remaining = plan_batches(candidates, args.budget, args.min_sample)
+
+    plan_path = os.path.join(run_dir, 'openai_batch_plan.tsv')
+    header = "Model\tThreshold\tStatus\tSampleSize\tAvailablePrompts\tEstInputTokens\tEstOutputTokens\tEstCost\tCostPerPrompt\tFracSingleExact\tDominatedBy"
+    with open(plan_path, 'w') as out:
+        out.write(header + "\n")
+        print(header)
+        for c in candidates:
+            input_tokens, output_tokens = estimate_tokens(c, c["sample_size"])
+            quality_str = "" if c["quality"] is None else f"{c['quality']:.3f}"
+            line = f"{c['model']}\t{c['threshold']}\t{c['status']}\t{c['sample_size']}\t{len(c['char_sums']) - 1}\t{input_tokens:.0f}\t{output_tokens:.0f}\t{c['est_cost']:.2f}\t{c['cost_per_prompt']:.5f}\t{quality_str}\t{c['dominated_by'] or ''}"
+            out.write(line + "\n")
+            print(line)
+    print(f"Plan written to {plan_path}. Estimated spend: ${args.budget - remaining:.2f} of ${args.budget:.2f}")
+
+    # Group planned batches into convert_to_openai_batch.py invocations
+    commands = defaultdict(list)
+    for c in candidates:
+        if c["sample_size"]:
+            limit = c["sample_size"] if c["status"] == "sampled" else None
+            commands[(c["threshold"], limit)].append(c["model"])
+    for (threshold, limit), planned_models in sorted(commands.items(), key=lambda x: (x[0][0], x[0][1] or 0)):
+        limit_arg = f" --limit {limit}" if limit else ""
+        print(f"python scripts/convert_to_openai_batch.py --run {args.run} --threshold {threshold}{limit_arg} --models \"{','.join(planned_models)}\"")
+
+if __name__ == "__main__":
+    main()
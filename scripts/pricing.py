@@ -0,0 +1,102 @@
+import os
+import re
+
+PRICING_PATH = os.path.join(os.path.dirname(__file__), '../input_data/pricing.txt')
+# pricing.txt lists Batch API prices (USD per 1M tokens); synchronous requests
+# (run_openai.py --realtime) are billed at the standard rate, twice the batch price.
+TIER_MULTIPLIERS = {"batch": 1.0, "standard": 2.0}
+DATE_SUFFIX_RE = re.compile(r'[-_][0-9]{4,}')
+ZERO_PRICE = {'input': 0.0, 'cached_input': 0.0, 'output': 0.0}
+
+
+def parse_price(cell):
+    cell = cell.strip()
+    if not cell or cell == '-':
+        return None
+    return float(cell.replace('$', ''))
+
+
+def parse_pricing(pricing_path=PRICING_PATH):
+    """
+    Read pricing.txt (tab or whitespace separated: Model, Input, Cached input, Output).
+    A '-' cached input price means there is no caching discount, so cached tokens cost the input price.
+    """
+    pricing = {}
+    with open(pricing_path) as f:
+        for line in f:
+            if not line.strip() or line.startswith('Model'):
+                continue
+            parts = line.strip().split('\t') if '\t' in line else line.split()
+            if len(parts) < 2:
+                continue
+            model = parts[0].strip()
+            input_price = parse_price(parts[1]) or 0.0
+            cached_input_price = parse_price(parts[2]) if len(parts) > 2 else None
+            output_price = parse_price(parts[3]) if len(parts) > 3 else None
+            pricing[model] = {
+                'input': input_price,
+                'cached_input': input_price if cached_input_price is None else cached_input_price,
+                'output': output_price or 0.0
+            }
+    return pricing
+
+
+class PriceResolver:
+    """
+    Maps the model names found in responses (often dated, e.g. gpt-4.1-mini-2025-04-14) to a pricing.txt
+    row. Each distinct name is resolved once: exact match, then longest known prefix, then the name with
+    its date suffix removed, then the longest known name it contains. Unknown models warn once.
+    """
+
+    def __init__(self, pricing):
+        self.pricing = pricing
+        self._longest_first = sorted(pricing, key=len, reverse=True)
+        self._resolved = {}
+
+    def resolve(self, model_name):
+        """The pricing.txt model a name is billed as, or None."""
+        if model_name in self._resolved:
+            return self._resolved[model_name]
+        key = None
+        if model_name in self.pricing:
+            key = model_name
+        else:
+            key = next((k for k in self._longest_first if model_name.startswith(k)), None)
+            if key is None:
+                base = DATE_SUFFIX_RE.split(model_name)[0]
+                if base in self.pricing:
+                    key = base
+            if key is None:
+                key = next((k for k in self._longest_first if k in model_name), None)
+        if key is None:
+            print(f"Warning: No pricing found for model {model_name}")
+        self._resolved[model_name] = key
+        return key
+
+    def price(self, model_name, tier="batch"):
+        key = self.resolve(model_name)
+        if key is None:
+            return dict(ZERO_PRICE)
+        multiplier = TIER_MULTIPLIERS[tier]
+        return {k: v * multiplier for k, v in self.pricing[key].items()}
+
+    def cost(self, model_name, prompt_tokens, cached_tokens, completion_tokens, tier="batch"):
+        """Request cost in USD; prices are per 1M tokens."""
+        p = self.price(model_name, tier)
+        return ((prompt_tokens - cached_tokens) * p['input'] + cached_tokens * p['cached_input'] + completion_tokens * p['output']) / 1_000_000.0
+
+
+_RESOLVERS = {}
+
+
+def resolver_for(pricing):
+    """Shared resolver per pricing dict, so resolutions and warnings are cached across calls."""
+    cached = _RESOLVERS.get(id(pricing))
+    if cached is None or cached[0] is not pricing:
+        cached = (pricing, PriceResolver(pricing))
+        _RESOLVERS[id(pricing)] = cached
+    return cached[1]
+
+
+def find_price_info(model_name, pricing, tier="batch"):
+    return resolver_for(pricing).price(model_name, tier)
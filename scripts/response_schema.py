@@ -12,3 +12,25 @@ class Response(BaseModel):
     reasoning: str
     candidates: List[CandidateResponse]
 
+def openai_response_format(model=Response):
+    """
+    Wrap a pydantic model's JSON schema as an OpenAI structured-output `response_format`.
+    Strict mode needs every object closed with additionalProperties: false.
+    """
+    schema = model.model_json_schema()
+
+    def close_objects(node):
+        if isinstance(node, dict):
+            if node.get("type") == "object":
+                node["additionalProperties"] = False
+            for value in node.values():
+                close_objects(value)
+        elif isinstance(node, list):
+            for value in node:
+                close_objects(value)
+
+    close_objects(schema)
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": model.__name__, "schema": schema, "strict": True}
+    }
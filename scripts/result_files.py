@@ -0,0 +1,90 @@
+import os
+import re
+import glob
+from collections import namedtuple
+
+# Single place that knows how pipeline files are named:
+#   parsed_inputs/bodies_{t}.jsonl, parsed_inputs/bodies_{t}_colormap.jsonl
+#   ollama_results/{model}__bodies_{t}_message_output.jsonl (and _response_output)
+#   open_ai_results_{t}/openai_results_{model}[_structured]_bodies_{t}.jsonl
+#   open_ai_errors_{t}/openai_errors_{model}[_structured]_bodies_{t}.jsonl (failed batch lines, not evaluated)
+# and how a batch custom_id ("{index}_{model}") maps back to the prompt index.
+# The browser apps import it by putting scripts/ on sys.path.
+
+STRUCTURED_MARKER = "structured"
+
+ResultFile = namedtuple("ResultFile", ["kind", "model", "threshold", "structured"])
+
+OPENAI_RESULTS_RE = re.compile(rf'^openai_results_(?P<model>.+?)(?P<structured>_{STRUCTURED_MARKER})?_bodies_(?P<threshold>\d+)(?:_[^.]*)?\.jsonl$')
+OLLAMA_OUTPUT_RE = re.compile(r'^(?P<model>.+?)__bodies_(?P<threshold>\d+)_message_output\.jsonl$')
+BODIES_RE = re.compile(r'^bodies_(?P<threshold>\d+)\.jsonl$')
+COLORMAP_RE = re.compile(r'^bodies_(?P<threshold>\d+)_colormap\.jsonl$')
+EXACT_MATCHES_COLUMN_RE = re.compile(r'^exact_matches_(?P<threshold>\d+)$')
+
+
+def parse_openai_results_name(fname):
+    """ResultFile for an openai_results_*.jsonl name, or None."""
+    m = OPENAI_RESULTS_RE.match(os.path.basename(fname))
+    if not m:
+        return None
+    return ResultFile("OpenAI", m.group("model"), m.group("threshold"), m.group("structured") is not None)
+
+
+def openai_errors_path(results_path):
+    """Where the failed lines of an OpenAI results file are kept, outside the directory the evaluator reads."""
+    results_dir, fname = os.path.split(results_path)
+    parent, dirname = os.path.split(results_dir)
+    return os.path.join(parent, dirname.replace('open_ai_results_', 'open_ai_errors_', 1),
+                        fname.replace('openai_results_', 'openai_errors_', 1))
+
+
+def parse_ollama_output_name(fname):
+    """ResultFile for an Ollama *_message_output.jsonl name, or None. The model is the filesystem-safe name."""
+    m = OLLAMA_OUTPUT_RE.match(os.path.basename(fname))
+    if not m:
+        return None
+    return ResultFile("Ollama", m.group("model"), m.group("threshold"), False)
+
+
+def parse_result_file(fname):
+    return parse_openai_results_name(fname) or parse_ollama_output_name(fname)
+
+
+def threshold_from_bodies_name(fname):
+    m = BODIES_RE.match(os.path.basename(fname))
+    return int(m.group("threshold")) if m else None
+
+
+def find_bodies_files(run_dir, thresholds=None):
+    """{threshold: path} of the run's parsed_inputs/bodies_{t}.jsonl files, sorted by threshold."""
+    found = {}
+    for path in glob.glob(os.path.join(run_dir, 'parsed_inputs', 'bodies_*.jsonl')):
+        threshold = threshold_from_bodies_name(path)
+        if threshold is not None:
+            found[threshold] = path
+    if thresholds:
+        found = {t: p for t, p in found.items() if t in thresholds}
+    return dict(sorted(found.items()))
+
+
+def threshold_from_colormap_name(fname):
+    m = COLORMAP_RE.match(os.path.basename(fname))
+    return int(m.group("threshold")) if m else None
+
+
+def threshold_from_results_column(column):
+    """Threshold of a results-table exact_matches_{t} column, or None for other columns."""
+    m = EXACT_MATCHES_COLUMN_RE.match(column)
+    return int(m.group("threshold")) if m else None
+
+
+def colormap_file_name(threshold):
+    return f"bodies_{threshold}_colormap.jsonl"
+
+
+def index_from_custom_id(custom_id):
+    """The prompt index at the start of a custom_id ("170_gpt-4.1" -> 170), or None."""
+    head, sep, _ = str(custom_id).partition('_')
+    if sep and head.isascii() and head.isdigit():
+        return int(head)
+    return None
@@ -4,14 +4,28 @@ import time
 import json
 import argparse
 import requests
+import random
+import threading
 import mimetypes
+import datetime
+import email.utils
 import concurrent.futures
+from result_files import openai_errors_path
 
-OPENAI_API_URL = "https://api.openai.com/v1/batches"
-OPENAI_FILES_URL = "https://api.openai.com/v1/files"
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_API_URL = f"{OPENAI_BASE_URL}/batches"
+OPENAI_FILES_URL = f"{OPENAI_BASE_URL}/files"
 api_key = os.environ.get("OPENAI_LITCOIN_KEY")
 
 
+def set_base_url(base_url):
+    """Point all API calls at base_url (e.g. a local mock_openai_server.py)."""
+    global OPENAI_BASE_URL, OPENAI_API_URL, OPENAI_FILES_URL
+    OPENAI_BASE_URL = base_url.rstrip("/")
+    OPENAI_API_URL = f"{OPENAI_BASE_URL}/batches"
+    OPENAI_FILES_URL = f"{OPENAI_BASE_URL}/files"
+
+
 def upload_file(batch_file):
     if not api_key:
         print("OPENAI_API_KEY environment variable not set.")
@@ -77,37 +91,50 @@ def monitor_batch(batch_id, poll_interval=10, batch_name=None):
             return batch_info
         time.sleep(poll_interval)
 
-def download_results(batch_info, output_file):
+def download_file(file_id, output_file):
     headers = {"Authorization": f"Bearer {api_key}"}
+    result_url = f"{OPENAI_FILES_URL}/{file_id}/content"
+    response = requests.get(result_url, headers=headers)
+    if response.status_code != 200:
+        print(f"Failed to download {file_id}: {response.status_code} {response.text}")
+        return False
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    with open(output_file, "wb") as f:
+        f.write(response.content)
+    return True
+
+def download_results(batch_info, output_file):
     output_file_id = batch_info.get("output_file_id")
     if not output_file_id:
         print("No output_file_id found in batch info. Full batch_info:")
         print(json.dumps(batch_info, indent=2))
         sys.exit(1)
-    result_url = f"{OPENAI_FILES_URL}/{output_file_id}/content"
-    response = requests.get(result_url, headers=headers)
-    if response.status_code != 200:
-        print(f"Failed to download results: {response.status_code} {response.text}")
+    if not download_file(output_file_id, output_file):
         sys.exit(1)
-    with open(output_file, "wb") as f:
-        f.write(response.content)
     print(f"Results downloaded to {output_file}")
+    # Lines that failed are only in the error file; keep them apart so the evaluator reads successes only
+    error_file_id = batch_info.get("error_file_id")
+    if error_file_id:
+        errors_file = openai_errors_path(output_file)
+        if download_file(error_file_id, errors_file):
+            failed = (batch_info.get("request_counts") or {}).get("failed")
+            print(f"Failed requests{f' ({failed})' if failed is not None else ''} downloaded to {errors_file}")
 
-def process_batch_file(batch_file, output_dir):
+def process_batch_file(batch_file, output_dir, poll_interval=10):
     batch_id = submit_batch(batch_file)
     batch_name = os.path.basename(batch_file)
-    batch_info = monitor_batch(batch_id, batch_name=batch_name)
+    batch_info = monitor_batch(batch_id, poll_interval=poll_interval, batch_name=batch_name)
     output_file = os.path.join(output_dir, batch_name.replace("openai_batch_", "openai_results_"))
     if batch_info.get("status") == "completed":
         download_results(batch_info, output_file)
     else:
         print(f"Batch {batch_file} did not complete successfully. Status: {batch_info.get('status')}")
 
-def process_batch_file_concurrent(batch_file, output_dir):
+def process_batch_file_concurrent(batch_file, output_dir, poll_interval=10):
     try:
         batch_id = submit_batch(batch_file)
         batch_name = os.path.basename(batch_file)
-        batch_info = monitor_batch(batch_id, batch_name=batch_name)
+        batch_info = monitor_batch(batch_id, poll_interval=poll_interval, batch_name=batch_name)
         output_file = os.path.join(output_dir, batch_name.replace("openai_batch_", "openai_results_"))
         if batch_info.get("status") == "completed":
             download_results(batch_info, output_file)
@@ -116,10 +143,184 @@ def process_batch_file_concurrent(batch_file, output_dir):
     except Exception as e:
         print(f"Error processing {batch_file}: {e}")
 
+class TokenBucket:
+    """Blocking token bucket: holds up to `capacity` tokens, refilled at capacity per `period` seconds."""
+
+    def __init__(self, capacity, period=60.0):
+        if capacity <= 0:
+            raise ValueError(f"Token bucket capacity must be positive, got {capacity}")
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1.0):
+        # Requests larger than the bucket would never fit; let them through once it is full.
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Per-model RPM and TPM token buckets, matching how OpenAI applies limits."""
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, model, tokens):
+        with self.lock:
+            if model not in self.buckets:
+                self.buckets[model] = (TokenBucket(self.rpm), TokenBucket(self.tpm))
+            requests_bucket, tokens_bucket = self.buckets[model]
+        requests_bucket.acquire(1)
+        tokens_bucket.acquire(tokens)
+
+
+def estimate_request_tokens(body):
+    """Rough token estimate (4 chars/token) for a chat body, including the completion budget if set."""
+    prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+    return prompt_chars // 4 + body.get("max_completion_tokens", 0)
+
+def retry_after_seconds(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP-date), or None if missing or unparseable."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+def send_chat_completion(body, rate_limiter, max_retries=5):
+    """
+    POST one chat completion, retrying rate-limit, server and connection errors with exponential backoff.
+    Returns:
+        tuple: (status_code, request_id, response_json_or_error_text)
+    """
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    url = f"{OPENAI_BASE_URL}/chat/completions"
+    tokens = estimate_request_tokens(body)
+    for attempt in range(max_retries + 1):
+        rate_limiter.acquire(body.get("model"), tokens)
+        try:
+            response = requests.post(url, headers=headers, json=body, timeout=600)
+        except requests.RequestException as e:
+            status_code, request_id, payload, retry_after = None, None, str(e), None
+        else:
+            status_code = response.status_code
+            request_id = response.headers.get("x-request-id")
+            retry_after = response.headers.get("retry-after")
+            if status_code == 200:
+                try:
+                    return status_code, request_id, response.json()
+                except ValueError:
+                    # e.g. an HTML page from a proxy; retried like a server error and failed if it persists
+                    payload = f"Response body is not JSON: {response.text[:500]}"
+            else:
+                payload = response.text
+                if status_code != 429 and status_code < 500:
+                    return status_code, request_id, payload
+        if attempt == max_retries:
+            break
+        delay = retry_after_seconds(retry_after)
+        if delay is None:
+            delay = min(60.0, 2 ** attempt) + random.random()
+        print(f"Retrying {body.get('model')} request after {status_code}: attempt {attempt + 1}/{max_retries}, sleeping {delay:.1f}s")
+        time.sleep(delay)
+    return status_code, request_id, payload
+
+def realtime_result_line(custom_id, status_code, request_id, payload):
+    """Shape a synchronous response like a line of a batch output file."""
+    # "realtime" tells evaluate_outputs.py to cost these lines at standard rather than batch prices
+    result = {"id": f"batch_req_{request_id or custom_id}", "custom_id": custom_id, "response": None, "error": None, "realtime": True}
+    if status_code == 200 and isinstance(payload, dict):
+        result["response"] = {"status_code": status_code, "request_id": request_id, "body": payload}
+    else:
+        result["error"] = {"code": str(status_code), "message": payload}
+    return result
+
+def process_batch_file_realtime(batch_file, output_dir, rate_limiter, concurrency=8, max_retries=5):
+    """
+    Send every request of a batch file to /chat/completions and write the batch-result JSONL.
+    Failed requests go to the errors file (see result_files.openai_errors_path), as with the Batch API.
+    """
+    batch_name = os.path.basename(batch_file)
+    output_file = os.path.join(output_dir, batch_name.replace("openai_batch_", "openai_results_"))
+    with open(batch_file) as f:
+        requests_list = [json.loads(line) for line in f if line.strip()]
+    errors_file = openai_errors_path(output_file)
+    error_lines = []
+    write_lock = threading.Lock()
+    completed = 0
+    failed = 0
+    start = time.time()
+
+    def run_one(req):
+        status_code, request_id, payload = send_chat_completion(req["body"], rate_limiter, max_retries)
+        return realtime_result_line(req.get("custom_id"), status_code, request_id, payload)
+
+    with open(output_file, "w") as out_f, concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_one, req) for req in requests_list]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            with write_lock:
+                completed += 1
+                if result["error"]:
+                    failed += 1
+                    error_lines.append(json.dumps(result) + "\n")
+                else:
+                    out_f.write(json.dumps(result) + "\n")
+                if completed % 10 == 0 or completed == len(requests_list):
+                    print(f"{batch_name}: {completed}/{len(requests_list)} done, {failed} failed, {time.time() - start:.1f}s elapsed")
+    print(f"Results written to {output_file}")
+    if error_lines:
+        os.makedirs(os.path.dirname(errors_file), exist_ok=True)
+        with open(errors_file, "w") as f:
+            f.writelines(error_lines)
+        print(f"{failed} failed requests written to {errors_file}")
+    elif os.path.exists(errors_file):
+        os.remove(errors_file)
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--run', default='run_1', help='Run directory name (default: run_1)')
+    parser.add_argument('--base-url', default=None, help='API base URL (default: $OPENAI_BASE_URL or https://api.openai.com/v1)')
+    parser.add_argument('--poll-interval', type=float, default=10, help='Seconds between batch status checks (default: 10)')
+    parser.add_argument('--realtime', action='store_true', help='Send batch bodies to /chat/completions instead of the Batch API')
+    parser.add_argument('--concurrency', type=positive_int, default=8, help='Realtime mode: max in-flight requests (default: 8)')
+    parser.add_argument('--rpm', type=positive_int, default=500, help='Realtime mode: requests per minute per model (default: 500)')
+    parser.add_argument('--tpm', type=positive_int, default=200000, help='Realtime mode: tokens per minute per model (default: 200000)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Realtime mode: retries per request (default: 5)')
     args = parser.parse_args()
+    if args.base_url:
+        set_base_url(args.base_url)
     run_dir = os.path.join('data', args.run)
     # Find all open_ai_batches_* directories
     batch_dirs = [os.path.join(run_dir, d) for d in os.listdir(run_dir)
@@ -143,9 +344,21 @@ def main():
             if batch_file.startswith(batch_dir):
                 return output_dir
         return run_dir  # fallback
+    if args.realtime:
+        if not api_key:
+            print("OPENAI_API_KEY environment variable not set.")
+            sys.exit(1)
+        rate_limiter = RateLimiter(args.rpm, args.tpm)
+        for batch_file in all_batch_files:
+            # As in batch mode, a file that fails does not stop the others
+            try:
+                process_batch_file_realtime(batch_file, get_output_dir(batch_file), rate_limiter, args.concurrency, args.max_retries)
+            except Exception as e:
+                print(f"Error processing {batch_file}: {e}")
+        return
     num_workers = len(all_batch_files)
     with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
-        futures = [executor.submit(process_batch_file_concurrent, batch_file, get_output_dir(batch_file)) for batch_file in all_batch_files]
+        futures = [executor.submit(process_batch_file_concurrent, batch_file, get_output_dir(batch_file), args.poll_interval) for batch_file in all_batch_files]
         for future in concurrent.futures.as_completed(futures):
             pass
 
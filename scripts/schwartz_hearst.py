@@ -0,0 +1,114 @@
+import re
+
+# Schwartz & Hearst (2003) style detection of "long form (SF)" abbreviation definitions.
+# detect_abbreviations() resolves the easy cases locally and reports when an abstract
+# needs the LLM (nested or reversed definitions, or abbreviation-like text it cannot resolve).
+
+PAREN_RE = re.compile(r'\(([^()]*)\)')
+SENTENCE_BREAK_RE = re.compile(r'[.;:!?]\s')
+WORD_RE = re.compile(r'\S+')
+ABBREVIATION_LIKE_RE = re.compile(r'^(?=.*[A-Z])[A-Za-z0-9\-/&.+\']{2,10}$')
+
+
+def is_short_form_candidate(sf):
+    """SF rules from Schwartz & Hearst: 2-10 chars, at most two words, has a letter, starts alphanumeric."""
+    if not (2 <= len(sf) <= 10):
+        return False
+    if len(sf.split()) > 2:
+        return False
+    if not any(c.isalpha() for c in sf):
+        return False
+    return sf[0].isalnum()
+
+
+def best_long_form(sf, lf):
+    """
+    Match the short form's characters right-to-left against the candidate long form; the first SF
+    character must start a word. Returns the shortest matching suffix of lf, or None.
+    """
+    s_idx = len(sf) - 1
+    l_idx = len(lf) - 1
+    while s_idx >= 0:
+        c = sf[s_idx].lower()
+        if not c.isalnum():
+            s_idx -= 1
+            continue
+        while l_idx >= 0 and (lf[l_idx].lower() != c or (s_idx == 0 and l_idx > 0 and lf[l_idx - 1].isalnum())):
+            l_idx -= 1
+        if l_idx < 0:
+            return None
+        l_idx -= 1
+        s_idx -= 1
+    start = lf.rfind(' ', 0, l_idx + 1) + 1
+    long_form = lf[start:].strip()
+    if not long_form or len(long_form.split()) > min(len(sf) + 5, len(sf) * 2) or sf.lower() in long_form.lower().split():
+        return None
+    return long_form
+
+
+def nested_spans(text):
+    """Start/end offsets of every parenthetical that contains, or sits inside, another one."""
+    spans = []
+    stack = []  # [start offset, involved in nesting]
+    for i, ch in enumerate(text):
+        if ch == '(':
+            if stack:
+                stack[-1][1] = True
+            stack.append([i, bool(stack)])
+        elif ch == ')' and stack:
+            start, involved = stack.pop()
+            if involved:
+                spans.append((start, i + 1))
+    return spans
+
+
+def candidate_long_form_text(text, paren_start):
+    """The words before '(' in the same sentence, as Schwartz & Hearst restrict the window."""
+    before = text[:paren_start]
+    breaks = [m.end() for m in SENTENCE_BREAK_RE.finditer(before)]
+    return before[breaks[-1]:] if breaks else before
+
+
+def detect_abbreviations(text):
+    """
+    Returns:
+        tuple: (definitions, needs_llm) where definitions is a list of
+        {"abbreviation", "definition"} dicts in the same shape the LLM returns.
+    """
+    definitions = []
+    needs_llm = False
+    nested = nested_spans(text)
+    for m in PAREN_RE.finditer(text):
+        inside = m.group(1).strip()
+        # "(SF; ...)" and "(SF, ...)" carry the short form first
+        sf = re.split(r'[;,]\s', inside, maxsplit=1)[0].strip()
+        abbreviation_like = bool(ABBREVIATION_LIKE_RE.match(sf))
+        if any(start <= m.start() and m.end() <= end for start, end in nested):
+            if abbreviation_like:
+                needs_llm = True
+            continue
+        if not is_short_form_candidate(sf):
+            # "SF (long form)" reversed definitions are left to the LLM
+            words_before = WORD_RE.findall(candidate_long_form_text(text, m.start()))
+            if words_before and ABBREVIATION_LIKE_RE.match(words_before[-1]) and len(inside.split()) > 1:
+                if best_long_form(words_before[-1], inside):
+                    needs_llm = True
+            continue
+        window = candidate_long_form_text(text, m.start())
+        words = WORD_RE.findall(window)
+        max_words = min(len(sf) + 5, len(sf) * 2)
+        lf_candidate = " ".join(words[-max_words:])
+        long_form = best_long_form(sf, lf_candidate)
+        if long_form is None:
+            if abbreviation_like:
+                needs_llm = True
+            continue
+        # The definition must be the exact string from the abstract
+        exact = re.search(r'\s+'.join(re.escape(w) for w in long_form.split()) + r'\s*$', window)
+        definitions.append({"abbreviation": sf, "definition": exact.group(0).strip() if exact else long_form})
+    # A definition that uses another abbreviation has to be fully expanded
+    defined = {d["abbreviation"] for d in definitions}
+    for d in definitions:
+        if any(other != d["abbreviation"] and re.search(rf'\b{re.escape(other)}\b', d["definition"]) for other in defined):
+            needs_llm = True
+    return definitions, needs_llm
@@ -0,0 +1,69 @@
+import json
+from abbreviation_store import AbbreviationStore
+
+def line(pmid, *pairs, source="llm"):
+    return json.dumps({"pmid": pmid, "source": source,
+                       "abbreviation_map": [{"abbreviation": sf, "definition": lf} for sf, lf in pairs]}) + "\n"
+
+def test_sync_stops_at_a_partially_written_line(tmp_path):
+    results = tmp_path / 'results.jsonl'
+    partial = line(2, ("HD", "Huntington disease"))
+    results.write_text(line(1, ("CF", "cystic fibrosis")) + partial[:20])
+    store = AbbreviationStore(str(tmp_path / 'index.db'))
+    assert store.sync(str(results)) == 1
+    assert store.lookup(2, "HD") is None
+    with open(results, 'a') as f:
+        f.write(partial[20:])
+    assert store.sync(str(results)) == 1
+    assert store.sync(str(results)) == 0
+    assert store.lookup(1, "CF") == "cystic fibrosis" and store.lookup("2", "HD") == "Huntington disease"
+    store.close()
+
+def test_sync_rebuilds_when_the_file_shrinks(tmp_path):
+    results = tmp_path / 'results.jsonl'
+    results.write_text(line(1, ("CF", "cystic fibrosis")) + line(2, ("HD", "Huntington disease")))
+    store = AbbreviationStore(str(tmp_path / 'index.db'))
+    assert store.sync(str(results)) == 2
+    assert store.lookup(2, "HD") == "Huntington disease"
+    results.write_text(line(3, ("MS", "multiple sclerosis")))
+    assert store.sync(str(results)) == 1
+    assert store.lookup(2, "HD") is None and store.lookup(3, "MS") == "multiple sclerosis"
+    store.close()
+
+def test_recorded_rows_are_not_read_again(tmp_path):
+    results = tmp_path / 'results.jsonl'
+    db_path = str(tmp_path / 'index.db')
+    store = AbbreviationStore(db_path)
+    with open(results, 'a') as f:
+        for pmid in range(3):
+            f.write(line(pmid, ("CF", f"cystic fibrosis {pmid}")))
+            f.flush()
+            store.record({"pmid": pmid, "abbreviation_map": [{"abbreviation": "CF", "definition": f"cystic fibrosis {pmid}"}]},
+                         str(results), f.tell())
+    store.close()
+    with open(results, 'a') as f:
+        f.write(line(3, ("CF", "cystic fibrosis 3")))
+    store = AbbreviationStore(db_path)
+    assert store.sync(str(results)) == 1
+    assert [store.lookup(pmid, "CF") for pmid in range(4)] == [f"cystic fibrosis {pmid}" for pmid in range(4)]
+    store.close()
+
+def test_malformed_entries_are_skipped(tmp_path):
+    store = AbbreviationStore(str(tmp_path / 'index.db'))
+    store.add_row({"pmid": 1, "abbreviation_map": [{"abbreviation": "CF"}, "CF", {"abbreviation": "HD", "definition": "Huntington disease"}]})
+    store.add_row({"pmid": 2, "abbreviation_map": "not a list"})
+    assert store.definitions(1) == {"HD": "Huntington disease"} and store.definitions(2) == {}
+    store.close()
+
+def test_expand_follows_nested_definitions_up_to_max_depth(tmp_path):
+    store = AbbreviationStore(str(tmp_path / 'index.db'))
+    store.add_row({"pmid": 1, "abbreviation_map": [
+        {"abbreviation": "AD", "definition": "ADP deficiency"},
+        {"abbreviation": "ADP", "definition": "adenosine diphosphate"},
+        {"abbreviation": "X", "definition": "X linked"}]})
+    assert store.expand(1, "AD and ADP") == "adenosine diphosphate deficiency and adenosine diphosphate"
+    assert store.expand(1, "AD", max_depth=1) == "ADP deficiency"
+    # A definition containing its own short form grows once per pass and stops at max_depth
+    assert store.expand(1, "X", max_depth=2) == "X linked linked"
+    assert store.expand(2, "AD") == "AD"
+    store.close()
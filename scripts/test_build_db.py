@@ -0,0 +1,118 @@
+import sqlite3
+import pytest
+from build_db import build_results_table, build_candidates_table, plan_steps, run_build
+
+HEADER = 'model\tthreshold\tindex\texact_matches\tsubclass_matches\tsuperclass_matches\trelated_matches\tnone_matches\n'
+
+def test_results_are_stored_long_with_a_wide_view(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+    (tmp_path / 'results_all.tsv').write_text(HEADER + 'm\t10\t0\tA,B\tC\t\t\t\nn\t10\t0\t\t\t\t\tA\n')
+    build_results_table(db_path, str(tmp_path), [10])
+    # A new threshold is only new rows; outputs of other thresholds are kept
+    (tmp_path / 'results_all.tsv').write_text(HEADER + 'm\t20\t0\tB\t\t\t\t\nm\t10\t0\tA\t\t\t\t\n')
+    build_results_table(db_path, str(tmp_path), [10, 20])
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT threshold, model, color_code FROM result_matches WHERE idx=0 AND relation_type='exact'"
+                        " ORDER BY threshold").fetchall() == [(10, 'm', 'A'), (20, 'm', 'B')]
+    assert conn.execute('SELECT threshold FROM result_thresholds ORDER BY threshold').fetchall() == [(10,), (20,)]
+    assert conn.execute('SELECT model, exact_matches_10, subclass_matches_10, none_matches_10, exact_matches_20 FROM results'
+                        ' ORDER BY model').fetchall() == [('m', 'A', '', '', 'B'), ('n', '', '', 'A', None)]
+    conn.close()
+
+def test_wide_results_table_is_converted(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+    conn = sqlite3.connect(db_path)
+    cols = [f'{rtype}_matches_10' for rtype in ['exact', 'superclass', 'subclass', 'related', 'none']]
+    conn.execute(f"CREATE TABLE results (idx INTEGER, model TEXT, {', '.join(c + ' TEXT' for c in cols)}, PRIMARY KEY (idx, model))")
+    conn.execute("INSERT INTO results VALUES (0, 'm', 'B,A,B', 'C', '', '', '')")
+    conn.commit()
+    conn.close()
+    build_results_table(db_path, str(tmp_path), [10])
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT type FROM sqlite_master WHERE name='results'").fetchone() == ('view',)
+    assert conn.execute("SELECT relation_type, position, color_code FROM result_matches ORDER BY 1, 2").fetchall() == [
+        ('exact', 0, 'B'), ('exact', 1, 'A'), ('exact', 2, 'B'), ('superclass', 0, 'C')]
+    # The view gives back the lists as loaded, order and repeats included
+    assert conn.execute('SELECT exact_matches_10, superclass_matches_10, subclass_matches_10 FROM results').fetchall() == [
+        ('B,A,B', 'C', '')]
+    conn.close()
+
+def test_matches_without_positions_are_numbered(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE result_outputs (idx INTEGER, model TEXT, threshold INTEGER, PRIMARY KEY (idx, model, threshold)) WITHOUT ROWID')
+    conn.execute('''CREATE TABLE result_matches (idx INTEGER, threshold INTEGER, relation_type TEXT, model TEXT, color_code TEXT,
+        PRIMARY KEY (idx, threshold, relation_type, model, color_code)) WITHOUT ROWID''')
+    conn.execute("INSERT INTO result_outputs VALUES (1, 'm', 10)")
+    conn.executemany("INSERT INTO result_matches VALUES (1, 10, 'exact', 'm', ?)", [('B',), ('A',)])
+    conn.commit()
+    conn.close()
+    (tmp_path / 'results_all.tsv').write_text(HEADER + 'm\t10\t0\tC\t\t\t\t\n')
+    build_results_table(db_path, str(tmp_path), [10])
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT idx, exact_matches_10 FROM results ORDER BY idx').fetchall() == [(0, 'C'), (1, 'A,B')]
+    conn.close()
+
+def test_candidates_are_loaded_in_prompt_order(tmp_path):
+    db_path = str(tmp_path / 'results.db')
+    (tmp_path / 'bodies_10_colormap.jsonl').write_text(
+        '{"index": 3, "entity": "x", "labels": {"red": "B", "blue": "A"}, "taxons": {"red": "", "blue": "human"}, "identifiers": {"red": "ID:1", "blue": "ID:2"}}\n'
+        '{"index": 3, "entity": "x", "labels": {"green": "C", "pink": "D", "gold": "E"}}\n')
+    build_candidates_table(db_path, str(tmp_path), [10, 20])
+    build_candidates_table(db_path, str(tmp_path), [10, 20])
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT idx, threshold, position, color, label, taxon, identifier FROM candidates').fetchall() == [
+        (3, 10, 0, 'red', 'B', None, 'ID:1'), (3, 10, 1, 'blue', 'A', 'human', 'ID:2')]
+    conn.close()
+
+def test_build_skips_steps_with_unchanged_inputs(tmp_path):
+    run_dir = tmp_path / 'run'
+    (run_dir / 'parsed_inputs').mkdir(parents=True)
+    (run_dir / 'parsed_inputs' / 'bodies_10_colormap.jsonl').write_text('{"index": 0, "entity": "x", "labels": {"red": "A"}}\n')
+    (run_dir / 'results_all.tsv').write_text(HEADER + 'm\t10\t0\tred\t\t\t\t\n')
+    (tmp_path / 'corpus.jsonl').write_text('{"pmid": 1, "text": "Text"}\n')
+    (tmp_path / 'annotations.jsonl').write_text('{"pmid": 1}\n')
+    db_path = str(run_dir / 'results.db')
+    steps = lambda: plan_steps(str(run_dir), str(tmp_path / 'corpus.jsonl'), str(tmp_path / 'annotations.jsonl'), [10])
+    assert set(run_build(db_path, steps(), workers=2).values()) == {'built'}
+    (tmp_path / 'annotations.jsonl').write_text('{"pmid": 1}\n')
+    (run_dir / 'results_all.tsv').write_text(HEADER + 'm\t10\t0\tred\t\t\t\t\nn\t10\t0\tred\t\t\t\t\n')
+    status = run_build(db_path, steps())
+    assert status['results'] == 'built' and status['index_to_pmid'] == 'skipped'
+    assert [s for s, v in status.items() if v == 'built'] == ['results']
+    assert set(run_build(db_path, steps(), force=True).values()) == {'built'}
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT model FROM result_matches WHERE color_code='red' ORDER BY model").fetchall() == [('m',), ('n',)]
+    assert conn.execute('SELECT entity FROM entities_by_index').fetchall() == [('x',)]
+    assert conn.execute('SELECT COUNT(*) FROM build_manifest').fetchone()[0] == 5
+    conn.close()
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failed_step_is_rolled_back(tmp_path, workers):
+    run_dir = tmp_path / 'run'
+    (run_dir / 'parsed_inputs').mkdir(parents=True)
+    (run_dir / 'parsed_inputs' / 'bodies_10_colormap.jsonl').write_text('{"index": 0, "entity": "x", "labels": {"red": "A"}}\n')
+    # No none_matches column: parsing the results fails after prepare_results() has staged and dropped the wide table
+    (run_dir / 'results_all.tsv').write_text(HEADER.replace('\tnone_matches', '') + 'm\t10\t0\tred\t\t\t\n')
+    (tmp_path / 'corpus.jsonl').write_text('{"pmid": 1, "text": "Text"}\n')
+    (tmp_path / 'annotations.jsonl').write_text('{"pmid": 1}\n')
+    db_path = str(run_dir / 'results.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE results (idx INTEGER, model TEXT, exact_matches_10 TEXT, superclass_matches_10 TEXT,"
+                 " subclass_matches_10 TEXT, related_matches_10 TEXT, none_matches_10 TEXT, PRIMARY KEY (idx, model))")
+    conn.execute("INSERT INTO results VALUES (1, 'old', 'blue', '', '', '', '')")
+    conn.commit()
+    conn.close()
+    steps = lambda: plan_steps(str(run_dir), str(tmp_path / 'corpus.jsonl'), str(tmp_path / 'annotations.jsonl'), [10])
+    status = run_build(db_path, steps(), workers=workers)
+    assert status['results'] == 'failed' and [s for s, v in status.items() if v != 'built'] == ['results']
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT type FROM sqlite_master WHERE name='results'").fetchone() == ('table',)
+    assert conn.execute("SELECT step FROM build_manifest WHERE step='results'").fetchall() == []
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name IN ('result_outputs', 'result_matches')").fetchall() == []
+    conn.close()
+    (run_dir / 'results_all.tsv').write_text(HEADER + 'm\t10\t0\tred\t\t\t\t\nm\tten\t5\tred\t\t\t\t\n')
+    assert run_build(db_path, steps(), workers=workers)['results'] == 'built'
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT idx, model, exact_matches_10 FROM results ORDER BY idx').fetchall() == [(0, 'm', 'red'), (1, 'old', 'blue')]
+    conn.close()
@@ -0,0 +1,36 @@
+import json
+import compare_runs
+from compare_runs import RunComparison, discover_runs, load_run_frame
+
+def write_run(data_dir, run, rows):
+    run_dir = data_dir / run
+    run_dir.mkdir(parents=True)
+    (run_dir / "evaluation_summary_all.jsonl").write_text("".join(json.dumps(r) + "\n" for r in rows))
+    return run_dir
+
+def row(index, model, exact, cost):
+    return {"index": index, "model name": model, "threshold": "10", "Number of exact matches": exact,
+            "exact candidates": "X" * exact, "Valid JSON": True, "Colormap Length": 2, "Cost (USD)": cost}
+
+def test_deltas_against_base(tmp_path):
+    write_run(tmp_path, "run_10", [row(0, "a", 1, 0.2), row(1, "a", 1, 0.2), row(0, "b", 1, 0.1)])
+    write_run(tmp_path, "run_2", [row(0, "a", 1, 0.1), row(1, "a", 0, 0.1)])
+    assert discover_runs(str(tmp_path)) == ["run_2", "run_10"]
+    comparison = RunComparison(data_dir=str(tmp_path))
+    frame = comparison.frame()
+    assert list(frame["run"].cat.categories) == ["run_2", "run_10"] and len(frame) == 5
+    deltas = comparison.deltas()
+    assert len(deltas) == 1
+    d = deltas.iloc[0]
+    assert d["run"] == "run_10" and d["base"] == "run_2" and d["model"] == "a"
+    assert d["delta_frac_single_exact"] == 0.5 and abs(d["delta_avg_cost"] - 0.1) < 1e-12
+
+def test_frames_are_cached_until_the_summary_changes(tmp_path):
+    run_dir = write_run(tmp_path, "run_1", [row(0, "a", 1, 0.1)])
+    first = load_run_frame(str(run_dir))
+    assert load_run_frame(str(run_dir)) is first
+    compare_runs._FRAMES.clear()
+    assert (run_dir / ".evaluation_cache" / "evaluation_frame.pkl").exists()
+    assert load_run_frame(str(run_dir)).equals(first)
+    (run_dir / "evaluation_summary_all.jsonl").write_text(json.dumps(row(0, "a", 1, 0.1)) + "\n" + json.dumps(row(1, "a", 0, 0.1)) + "\n")
+    assert len(load_run_frame(str(run_dir))) == 2
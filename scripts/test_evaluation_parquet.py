@@ -0,0 +1,49 @@
+import pytest
+from evaluation_parquet import split_row, ParquetSummaryWriter, read_evaluation_dataset
+
+ROW = {
+    "index": 3, "entity": "cystic fibrosis", "model name": "gpt-4.1", "threshold": "20",
+    "Number of missing codes": 0, "Number of mismatched codes": 0, "Number of exact matches": 1,
+    "exact candidates": "Cystic Fibrosis", "Valid JSON": True, "Colormap Length": 2, "Candidate List Length": 2,
+    "Cost (USD)": 0.001, "Prompt Tokens": 900, "Completion Tokens": 120,
+    "candidates": [
+        {"candidate": "Cystic Fibrosis", "color_code": "red", "relation_type": "exact", "vocabulary_class": "Disease"},
+        {"candidate": "Lung disease", "color_code": "blue", "relation_type": "superclass"},
+    ],
+}
+
+def test_split_row_flattens_candidates():
+    summary, candidates = split_row(ROW)
+    assert summary["index"] == 3 and summary["Structured Output"] is False
+    assert summary["Duration (s)"] is None
+    assert [c["position"] for c in candidates] == [0, 1]
+    assert candidates[1]["vocabulary_class"] is None
+    assert all(c["index"] == 3 for c in candidates)
+
+def test_split_row_drops_non_integer_index():
+    summary, _ = split_row(dict(ROW, index="abc", candidates=["not a dict"]))
+    assert summary["index"] is None
+
+def test_round_trip_partitioned_dataset(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset as ds
+    writer = ParquetSummaryWriter(str(tmp_path))
+    writer.write_file("gpt-4.1", "20", [ROW, dict(ROW, index=4)])
+    writer.write_file("gemma3:27b", "20", [dict(ROW, **{"model name": "gemma3:27b"})])
+    summary = read_evaluation_dataset(str(tmp_path), columns=["model", "index"], filter_expr=ds.field("model") == "gemma3:27b")
+    assert summary.column("index").to_pylist() == [3]
+    candidates = read_evaluation_dataset(str(tmp_path), table="candidates", columns=["model", "relation_type"])
+    assert candidates.num_rows == 6
+
+def test_rows_are_streamed_in_row_groups(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import glob
+    import pyarrow.parquet as pq
+    import evaluation_parquet
+    monkeypatch.setattr(evaluation_parquet, "ROW_GROUP_ROWS", 2)
+    writer = ParquetSummaryWriter(str(tmp_path))
+    writer.write_file("gpt-4.1", "20", (dict(ROW, index=i) for i in range(5)))
+    summary_part, = glob.glob(str(tmp_path / "evaluation_summary_parquet" / "summary" / "*" / "*" / "*.parquet"))
+    assert pq.ParquetFile(summary_part).metadata.num_row_groups == 3
+    assert read_evaluation_dataset(str(tmp_path), columns=["index"]).column("index").to_pylist() == [0, 1, 2, 3, 4]
+    assert read_evaluation_dataset(str(tmp_path), table="candidates", columns=["index"]).num_rows == 10
@@ -0,0 +1,68 @@
+import json
+import sqlite3
+import pytest
+from create_evaluation_database_files import (iter_abstract_rows, iter_entity_rows, iter_recognized_entity_rows,
+                                              iter_result_rows, write_tsv)
+from load_evaluation_db import load_sources
+from load_sqlite import TABLES, TSV_FILES, SQLiteBulkWriter, load_all
+
+def write_sources(tmp_path):
+    (tmp_path / 'corpus.jsonl').write_text(json.dumps({'pmid': 1, 'text': 'Line one\n"quoted"\ttabbed'}) + '\n')
+    (tmp_path / 'entity_map.json').write_text(json.dumps({'e': [{'pmid': 1, 'original_entity': 'ab', 'medmentions': {
+        'identifier': 'MESH:1', 'label': 'A', 'description': None, 'biolink_types': ['biolink:Disease']}}]}))
+    (tmp_path / 'expanded.jsonl').write_text(json.dumps({'MESH:1': {'name': 'dup'}, 'MESH:2': {'name': 'B', 'taxa': 'NCBITaxon:9606'}}) + '\n')
+    (tmp_path / 'annotation_list.jsonl').write_text(
+        json.dumps({'id': 0, 'pmid': 1, 'expanded_text': 'a b', 'original_text': 'ab'}) + '\n'
+        + json.dumps({'id': 1, 'pmid': 1, 'expanded_text': 'c', 'original_text': 'c'}) + '\n')
+    (tmp_path / 'colormap.jsonl').write_text(json.dumps({'index': 0, 'identifiers': {'red': 'MESH:2'}}) + '\n')
+    (tmp_path / 'results_all.tsv').write_text('index\tmodel\texact_matches\n0\tm\tred\n0\tm\tblue\n1\tm\tnull\n')
+
+def sources(tmp_path):
+    p = lambda name: str(tmp_path / name)
+    return [
+        ('abstracts', iter_abstract_rows(p('corpus.jsonl'))),
+        ('entities', iter_entity_rows(p('entity_map.json'), p('expanded.jsonl'))),
+        ('recognized_entities', iter_recognized_entity_rows(p('annotation_list.jsonl'))),
+        ('results', iter_result_rows(p('annotation_list.jsonl'), p('entity_map.json'), p('colormap.jsonl'), p('results_all.tsv'))),
+        ('assessment', iter([])),
+    ]
+
+def dump(db_path):
+    conn = sqlite3.connect(db_path)
+    tables = {table: conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2').fetchall() for table in TABLES}
+    conn.close()
+    return tables
+
+def test_direct_load_matches_tsv_load(tmp_path):
+    write_sources(tmp_path)
+    load_sources(SQLiteBulkWriter(str(tmp_path / 'direct.db')), sources(tmp_path))
+    for table, rows in sources(tmp_path):
+        write_tsv(str(tmp_path / TSV_FILES[table]), TABLES[table][2], rows)
+    load_all(str(tmp_path / 'tsv.db'), str(tmp_path))
+    direct = dump(str(tmp_path / 'direct.db'))
+    assert direct == dump(str(tmp_path / 'tsv.db'))
+    assert direct['abstracts'] == [('1', 'Line one\n"quoted"\ttabbed')]
+    assert [row[0] for row in direct['entities']] == ['MESH:1', 'MESH:2']
+    assert direct['results'] == [(0, 'm', 'MESH:2'), (0, 'medmentions', 'MESH:1'), (1, 'm', None)]
+
+def test_identifiers_of_a_bad_line_can_come_from_a_later_line(tmp_path):
+    (tmp_path / 'entity_map.json').write_text('{}')
+    (tmp_path / 'expanded.jsonl').write_text(json.dumps({'MESH:3': {'name': 'C'}, 'MESH:4': 'not an object'}) + '\n'
+                                             + json.dumps({'MESH:3': {'name': 'C2'}}) + '\n')
+    rows = list(iter_entity_rows(str(tmp_path / 'entity_map.json'), str(tmp_path / 'expanded.jsonl')))
+    assert rows == [('MESH:3', 'C2', None, None, None)]
+
+def test_failed_source_aborts_the_load(tmp_path):
+    write_sources(tmp_path)
+    db_path = str(tmp_path / 'direct.db')
+    load_sources(SQLiteBulkWriter(db_path), sources(tmp_path))
+    before = dump(db_path)
+    (tmp_path / 'corpus.jsonl').write_text(json.dumps({'pmid': 2, 'text': 'Line two'}) + '\n')
+    (tmp_path / 'results_all.tsv').unlink()
+    with pytest.raises(FileNotFoundError):
+        load_sources(SQLiteBulkWriter(db_path), sources(tmp_path))
+    assert dump(db_path) == before
+    conn = sqlite3.connect(db_path)
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    conn.close()
+    assert {'idx_results_model', 'idx_assessment_assessor', 'idx_recognized_entities_pmid'} <= indexes
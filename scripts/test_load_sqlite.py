@@ -0,0 +1,55 @@
+import sqlite3
+import pytest
+from load_sqlite import TABLES, TSV_FILES, load_all, update_results
+
+def write_tsvs(input_dir):
+    contents = {
+        'abstracts': 'pmid\tabstract\n1\tText one\n2\tText two\n',
+        'entities': 'identifier\tlabel\tdescription\ttype\ttaxon\nMESH:1\tA\t\tbiolink:Disease\t\n',
+        'recognized_entities': 'id\tpmid\texpanded_text\toriginal_text\n0\t1\ta b\tab\n',
+        'results': 'idx\tmodel\tidentifier\n0\tm\tMESH:1\n0\tn\t\n',
+        'assessment': 'idx\tidentifier\tuser\tassessment\n0\tMESH:1\tx\tTrue\n',
+    }
+    for table in TABLES:
+        (input_dir / TSV_FILES[table]).write_text(contents[table])
+
+def test_load_all_is_idempotent_and_indexed(tmp_path):
+    write_tsvs(tmp_path)
+    db_path = str(tmp_path / 'evaluation.db')
+    load_all(db_path, str(tmp_path))
+    load_all(db_path, str(tmp_path))
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM abstracts').fetchone()[0] == 2
+    assert conn.execute('SELECT model FROM results WHERE identifier IS NULL').fetchall() == [('n',)]
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {'idx_results_model', 'idx_assessment_assessor', 'idx_recognized_entities_pmid'} <= indexes
+    assert conn.execute('SELECT assessor FROM assessment').fetchall() == [('x',)]
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    conn.close()
+
+def test_update_results_appends_or_applies_delta(tmp_path):
+    write_tsvs(tmp_path)
+    db_path = str(tmp_path / 'evaluation.db')
+    load_all(db_path, str(tmp_path))
+    (tmp_path / 'results.tsv').write_text('idx\tmodel\tidentifier\n0\tm\tMESH:2\n0\tn\t\n1\tm\tMESH:1\n')
+    assert update_results(db_path, str(tmp_path / 'results.tsv')) == (1, 0)
+    assert update_results(db_path, str(tmp_path / 'results.tsv'), delta=True) == (0, 1)
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT idx, model, identifier FROM results ORDER BY idx, model').fetchall() == [
+        (0, 'm', 'MESH:2'), (0, 'n', None), (1, 'm', 'MESH:1')]
+    conn.close()
+
+def test_failed_load_is_rolled_back_with_its_indexes(tmp_path):
+    write_tsvs(tmp_path)
+    db_path = str(tmp_path / 'evaluation.db')
+    load_all(db_path, str(tmp_path))
+    (tmp_path / 'abstracts.tsv').write_text('pmid\tabstract\n1\tText one\n2\tText two\n3\tText three\n')
+    (tmp_path / 'results.tsv').unlink()
+    with pytest.raises(FileNotFoundError):
+        load_all(db_path, str(tmp_path))
+    conn = sqlite3.connect(db_path)
+    assert conn.execute('SELECT COUNT(*) FROM abstracts').fetchone()[0] == 2
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {'idx_results_model', 'idx_assessment_assessor', 'idx_recognized_entities_pmid'} <= indexes
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    conn.close()
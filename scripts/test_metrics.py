@@ -0,0 +1,95 @@
+import json
+import pandas as pd
+import numpy as np
+import pytest
+from metrics import (load_evaluation_frame, model_threshold_metrics, pairwise_agreement, agreement_by_model,
+                     agreement_summary, per_index_identifiers, presence_confusion, assessment_confusion,
+                     bootstrap_means, bootstrap_intervals, corpus_extrapolation)
+
+def write_rows(path, rows):
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows))
+
+def test_model_threshold_metrics(tmp_path):
+    path = tmp_path / "evaluation_summary_all.jsonl"
+    write_rows(path, [
+        {"index": 0, "model name": "a", "threshold": "10", "Number of exact matches": 1, "exact candidates": "X", "Valid JSON": True,
+         "Colormap Length": 4, "Number of missing codes": 1, "Number of mismatched codes": 0, "Duration (s)": 2.0},
+        {"index": 1, "model name": "a", "threshold": "10", "Number of exact matches": 2, "exact candidates": "X|Y", "Valid JSON": False,
+         "Colormap Length": 0, "Number of missing codes": 0, "Number of mismatched codes": 0},
+        {"index": 0, "model name": "a", "threshold": "5", "Number of exact matches": 1, "exact candidates": "X", "Valid JSON": True,
+         "Colormap Length": 2, "Number of missing codes": 0, "Number of mismatched codes": 1},
+    ])
+    summary = model_threshold_metrics(load_evaluation_frame(str(path)))
+    assert list(summary["threshold"]) == ["5", "10"]
+    row = summary.iloc[1]
+    assert row["completed"] == 2 and row["frac_single_exact"] == 0.5 and row["frac_json_error"] == 0.5
+    assert row["avg_num_exact"] == 1.5 and row["avg_frac_missing"] == 0.125 and row["avg_duration"] == 2.0
+    assert pd.isna(row["avg_cost"])
+
+def test_pairwise_agreement_ignores_candidate_order(tmp_path):
+    path = tmp_path / "evaluation_summary_all.jsonl"
+    write_rows(path, [
+        {"index": 0, "model name": "a", "threshold": "10", "exact candidates": "X|Y"},
+        {"index": 0, "model name": "b", "threshold": "10", "exact candidates": "Y|X"},
+        {"index": 1, "model name": "a", "threshold": "10", "exact candidates": "X"},
+        {"index": 1, "model name": "b", "threshold": "10", "exact candidates": ""},
+        {"index": 2, "model name": "a", "threshold": "10", "exact candidates": "X"},
+    ])
+    agreement = pairwise_agreement(load_evaluation_frame(str(path)))
+    assert agreement.to_dict("records") == [{"threshold": "10", "model_a": "a", "model_b": "b", "shared": 2, "agreement": 0.5}]
+
+RESULTS = pd.DataFrame([
+    (1, "medmentions", "E1"), (1, "m", "E1"),
+    (2, "medmentions", "E2"), (2, "m", "E9"),
+    (3, "medmentions", "E3"), (3, "m", None),
+    (4, "medmentions", "E4"),
+    (5, "m", "E5"),
+], columns=["idx", "model", "identifier"])
+
+def test_agreement_and_presence_confusion():
+    assert agreement_summary(agreement_by_model(RESULTS), "m") == {"match": 1, "disagree": 1, "null": 1, "total": 3}
+    matrix = presence_confusion(per_index_identifiers(RESULTS, "m"))
+    assert matrix["medmentions_present"] == {"agrees": 1, "disagrees": 1, "is_null": 2}
+    assert matrix["medmentions_null"] == {"agrees": 0, "disagrees": 1, "is_null": 0}
+
+def test_assessment_confusion_requires_assessed_identifiers():
+    assessments = pd.DataFrame([
+        (2, "E2", "agree"), (2, "E9", "Disagree"),
+        (3, "E3", "unsure"),
+        (5, "E5", "agree"),
+    ], columns=["idx", "identifier", "assessment"])
+    matrix = assessment_confusion(per_index_identifiers(RESULTS, "m"), assessments)
+    assert matrix["True"] == {"True": 1, "False": 1, "Unsure": 0, "Null": 0}
+    assert matrix["Unsure"]["Null"] == 1
+    assert sum(sum(row.values()) for row in matrix.values()) == 3
+
+def test_bootstrap_multinomial_matches_index_resampling():
+    values = np.array([0.0] * 700 + [1.0] * 300)
+    by_levels = bootstrap_means(values, 4000, np.random.default_rng(1))
+    # Jitter makes every value distinct, which forces the index-resampling path
+    by_index = bootstrap_means(values + np.linspace(0, 1e-9, len(values)), 4000, np.random.default_rng(1), max_block=100_000)
+    assert abs(by_levels.mean() - 0.3) < 0.002 and abs(by_index.mean() - 0.3) < 0.002
+    assert abs(by_levels.std() - by_index.std()) < 0.002
+
+def test_bootstrap_intervals_bracket_point_estimates(tmp_path):
+    path = tmp_path / "evaluation_summary_all.jsonl"
+    rows = [{"index": i, "model name": "a", "threshold": "10", "Number of exact matches": i % 3, "Valid JSON": i % 10 != 0}
+            for i in range(300)]
+    write_rows(path, rows)
+    df = load_evaluation_frame(str(path))
+    ci = bootstrap_intervals(df, n_boot=500, seed=3).iloc[0]
+    summary = model_threshold_metrics(df).iloc[0]
+    for name, col in (("FracSingleExact", "frac_single_exact"), ("FracJsonError", "frac_json_error"), ("AvgNumExact", "avg_num_exact")):
+        assert ci[f"{name}Low"] < summary[col] < ci[f"{name}High"]
+    assert bootstrap_intervals(df, n_boot=500, seed=3).equals(bootstrap_intervals(df, n_boot=500, seed=3))
+
+def test_corpus_extrapolation_scales_by_prompts_and_parallelism():
+    summary = pd.DataFrame({"model": ["a", "a", "b"], "structured": [False] * 3, "threshold": ["5", "10", "5"],
+                            "avg_duration": [8.64, 4.32, np.nan], "avg_cost": [0.5, np.nan, 0.25]})
+    out = corpus_extrapolation(summary, {"5": 10000}, concurrency=4, hosts=2)
+    assert out.loc[0, "corpus_prompts"] == 10000
+    assert out.loc[0, "total_duration_days"] == pytest.approx(10000 * 8.64 / 8 / 86400)
+    assert out.loc[0, "prompts_per_hour"] == pytest.approx(3600 * 8 / 8.64)
+    assert out.loc[0, "total_cost"] == 5000
+    assert pd.isna(out.loc[1, "corpus_prompts"]) and pd.isna(out.loc[1, "total_duration_days"])
+    assert pd.isna(out.loc[2, "total_duration_days"]) and out.loc[2, "total_cost"] == 2500
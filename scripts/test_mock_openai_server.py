@@ -0,0 +1,157 @@
+import json
+import argparse
+import time
+import threading
+import email.utils
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("requests")
+from werkzeug.serving import make_server
+import run_openai
+import mock_openai_server
+from evaluate_outputs import find_evaluation_jobs, evaluate_job_to_shard, get_llm_content
+from result_files import openai_errors_path
+
+PROMPTS = 20
+
+def write_run(run_dir):
+    """A run with one threshold-10 batch file of PROMPTS requests and the matching colormap."""
+    (run_dir / 'parsed_inputs').mkdir(parents=True)
+    (run_dir / 'open_ai_batches_10').mkdir()
+    with open(run_dir / 'parsed_inputs' / 'bodies_10_colormap.jsonl', 'w') as cm, \
+            open(run_dir / 'open_ai_batches_10' / 'openai_batch_gpt-4.1_bodies_10.jsonl', 'w') as batch:
+        for i in range(PROMPTS):
+            labels = {"red": f"label {i}a", "blue": f"label {i}b"}
+            cm.write(json.dumps({"index": i, "entity": f"entity {i}", "labels": labels}) + "\n")
+            body = {"model": "gpt-4.1", "messages": [{"role": "user", "content": f"entity {i}: {labels}"}]}
+            batch.write(json.dumps({"custom_id": f"{i}_gpt-4.1", "method": "POST", "url": "/v1/chat/completions", "body": body}) + "\n")
+    return run_dir / 'open_ai_batches_10' / 'openai_batch_gpt-4.1_bodies_10.jsonl'
+
+@pytest.fixture
+def mock_server(tmp_path, monkeypatch):
+    """Serve mock_openai_server on a free port and point run_openai at it. Yields the run directory."""
+    run_dir = tmp_path / 'run'
+    batch_file = write_run(run_dir)
+    server = make_server('127.0.0.1', 0, mock_openai_server.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(run_openai, 'api_key', 'test')
+    monkeypatch.setattr(run_openai, 'OPENAI_BASE_URL', run_openai.OPENAI_BASE_URL)
+    monkeypatch.setattr(run_openai, 'OPENAI_API_URL', run_openai.OPENAI_API_URL)
+    monkeypatch.setattr(run_openai, 'OPENAI_FILES_URL', run_openai.OPENAI_FILES_URL)
+    run_openai.set_base_url(f"http://127.0.0.1:{server.server_port}/v1")
+    yield run_dir, batch_file
+    server.shutdown()
+    thread.join()
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def test_failed_batch_lines_do_not_reach_the_evaluator(mock_server, tmp_path):
+    run_dir, batch_file = mock_server
+    mock_openai_server.configure(str(run_dir), batch_duration=0.2, error_rate=0.3, seed=1)
+    output_dir = run_dir / 'open_ai_results_10'
+    output_dir.mkdir()
+    run_openai.process_batch_file(str(batch_file), str(output_dir), poll_interval=0.1)
+
+    results_path = output_dir / 'openai_results_gpt-4.1_bodies_10.jsonl'
+    results = read_jsonl(results_path)
+    errors = read_jsonl(openai_errors_path(str(results_path)))
+    assert errors and all(e["response"] is None and e["error"] for e in errors)
+    assert all(r["response"]["status_code"] == 200 for r in results)
+    assert sorted(r["custom_id"] for r in results + errors) == sorted(f"{i}_gpt-4.1" for i in range(PROMPTS))
+
+    jobs = find_evaluation_jobs(str(run_dir), ['10'], str(run_dir / 'parsed_inputs'))
+    assert [job["fname"] for job in jobs] == ['openai_results_gpt-4.1_bodies_10.jsonl']
+    evaluated = evaluate_job_to_shard(jobs[0], {}, str(tmp_path / 'shard.jsonl'))
+    assert evaluated["error"] is None and evaluated["rows"] == len(results)
+
+def test_batch_object_matches_the_api(mock_server):
+    run_dir, batch_file = mock_server
+    mock_openai_server.configure(str(run_dir), batch_duration=0.2)
+    batch_id = run_openai.submit_batch(str(batch_file))
+    batch_info = run_openai.monitor_batch(batch_id, poll_interval=0.1)
+    assert batch_info["status"] == "completed" and batch_info["error_file_id"] is None
+    assert isinstance(batch_info["created_at"], int) and "started" not in batch_info
+    assert batch_info["request_counts"] == {"total": PROMPTS, "completed": PROMPTS, "failed": 0}
+
+def test_realtime_failures_go_to_the_errors_file(mock_server, tmp_path):
+    run_dir, batch_file = mock_server
+    mock_openai_server.configure(str(run_dir), error_rate=0.3, seed=2)
+    output_dir = run_dir / 'open_ai_results_10'
+    output_dir.mkdir()
+    limiter = run_openai.RateLimiter(rpm=10000, tpm=10000000)
+    run_openai.process_batch_file_realtime(str(batch_file), str(output_dir), limiter, concurrency=4, max_retries=0)
+
+    results_path = output_dir / 'openai_results_gpt-4.1_bodies_10.jsonl'
+    results = read_jsonl(results_path)
+    errors = read_jsonl(openai_errors_path(str(results_path)))
+    assert errors and all(e["error"]["code"] == "500" for e in errors)
+    assert all(r["realtime"] and r["response"]["status_code"] == 200 for r in results)
+    assert len(results) + len(errors) == PROMPTS
+    jobs = find_evaluation_jobs(str(run_dir), ['10'], str(run_dir / 'parsed_inputs'))
+    evaluated = evaluate_job_to_shard(jobs[0], {}, str(tmp_path / 'shard.jsonl'))
+    assert evaluated["error"] is None and evaluated["rows"] == len(results)
+
+def test_realtime_retries_rate_limited_requests(mock_server):
+    run_dir, batch_file = mock_server
+    mock_openai_server.configure(str(run_dir), rate_limit_rate=0.5, retry_after=0, seed=3)
+    output_dir = run_dir / 'open_ai_results_10'
+    output_dir.mkdir()
+    limiter = run_openai.RateLimiter(rpm=10000, tpm=10000000)
+    run_openai.process_batch_file_realtime(str(batch_file), str(output_dir), limiter, concurrency=1, max_retries=10)
+    results = read_jsonl(output_dir / 'openai_results_gpt-4.1_bodies_10.jsonl')
+    assert len(results) == PROMPTS and all(r["response"]["status_code"] == 200 for r in results)
+    assert not (run_dir / 'open_ai_errors_10').exists()
+
+def test_retry_after_header():
+    assert run_openai.retry_after_seconds("2") == 2.0
+    assert run_openai.retry_after_seconds(None) is None
+    assert run_openai.retry_after_seconds("soon") is None
+    assert run_openai.retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    later = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < run_openai.retry_after_seconds(later) <= 30
+
+def test_token_bucket_waits_for_refill():
+    bucket = run_openai.TokenBucket(10, period=1.0)
+    start = time.monotonic()
+    bucket.acquire(10)
+    assert time.monotonic() - start < 0.1
+    bucket.acquire(5)
+    assert time.monotonic() - start >= 0.45
+
+def html_app(environ, start_response):
+    """A proxy that answers every request with a 200 HTML page."""
+    start_response('200 OK', [('Content-Type', 'text/html')])
+    return [b'<html>Gateway login</html>']
+
+def test_realtime_non_json_responses_are_failures(mock_server):
+    run_dir, batch_file = mock_server
+    server = make_server('127.0.0.1', 0, html_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    run_openai.set_base_url(f"http://127.0.0.1:{server.server_port}/v1")
+    output_dir = run_dir / 'open_ai_results_10'
+    output_dir.mkdir()
+    limiter = run_openai.RateLimiter(rpm=10000, tpm=10000000)
+    try:
+        run_openai.process_batch_file_realtime(str(batch_file), str(output_dir), limiter, concurrency=4, max_retries=0)
+    finally:
+        server.shutdown()
+        thread.join()
+    results_path = output_dir / 'openai_results_gpt-4.1_bodies_10.jsonl'
+    assert read_jsonl(results_path) == []
+    errors = read_jsonl(openai_errors_path(str(results_path)))
+    assert len(errors) == PROMPTS and all("not JSON" in e["error"]["message"] for e in errors)
+
+def test_rate_limits_must_be_positive():
+    with pytest.raises(ValueError):
+        run_openai.TokenBucket(0)
+    with pytest.raises(argparse.ArgumentTypeError):
+        run_openai.positive_int("0")
+    assert run_openai.positive_int("500") == 500
+
+def test_error_lines_have_no_content():
+    assert get_llm_content({"custom_id": "0_m", "response": None, "error": {"code": "500"}}) is None
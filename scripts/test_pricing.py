@@ -0,0 +1,31 @@
+from pricing import PRICING_PATH, parse_pricing, PriceResolver, find_price_info
+
+def test_first_row_is_not_skipped():
+    pricing = parse_pricing(PRICING_PATH)
+    assert pricing["gpt-5"] == {"input": 0.625, "cached_input": 0.0625, "output": 5.0}
+
+def test_missing_cached_price_falls_back_to_input(tmp_path):
+    path = tmp_path / "pricing.txt"
+    path.write_text("Model\tInput\tCached input\tOutput\nm1\t$1.00\t-\t$4.00\n")
+    assert parse_pricing(str(path)) == {"m1": {"input": 1.0, "cached_input": 1.0, "output": 4.0}}
+
+def test_dated_names_resolve_to_longest_prefix():
+    resolver = PriceResolver(parse_pricing(PRICING_PATH))
+    assert resolver.resolve("gpt-4.1-mini-2025-04-14") == "gpt-4.1-mini"
+    assert resolver.resolve("o3-mini-2025-01-31") == "o3-mini"
+    assert resolver.resolve("gpt-4o-2024-05-13") == "gpt-4o-2024-05-13"
+    assert resolver.resolve("gpt-4o-2024-08-06") == "gpt-4o"
+
+def test_unknown_model_warns_once(capsys):
+    resolver = PriceResolver({"gpt-4.1": {"input": 1.0, "cached_input": 1.0, "output": 4.0}})
+    for _ in range(3):
+        assert resolver.price("llama-3") == {"input": 0.0, "cached_input": 0.0, "output": 0.0}
+    assert capsys.readouterr().out.count("No pricing found") == 1
+
+def test_standard_tier_costs_twice_batch():
+    pricing = {"gpt-4.1": {"input": 1.0, "cached_input": 0.5, "output": 4.0}}
+    resolver = PriceResolver(pricing)
+    batch = resolver.cost("gpt-4.1-2025-04-14", 1_000_000, 200_000, 500_000)
+    assert batch == 0.8 + 0.1 + 2.0
+    assert resolver.cost("gpt-4.1", 1_000_000, 200_000, 500_000, tier="standard") == 2 * batch
+    assert find_price_info("gpt-4.1", pricing, tier="standard")["output"] == 8.0
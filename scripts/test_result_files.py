@@ -0,0 +1,35 @@
+from result_files import (ResultFile, parse_openai_results_name, parse_ollama_output_name, parse_result_file,
+                          threshold_from_colormap_name, threshold_from_bodies_name, threshold_from_results_column,
+                          index_from_custom_id, openai_errors_path)
+
+def test_openai_results_name():
+    assert parse_openai_results_name("openai_results_gpt-4.1-mini_bodies_20.jsonl") == ResultFile("OpenAI", "gpt-4.1-mini", "20", False)
+
+def test_openai_structured_results_name():
+    parsed = parse_openai_results_name("open_ai_results_10/openai_results_o4-mini_structured_bodies_10.jsonl")
+    assert parsed == ResultFile("OpenAI", "o4-mini", "10", True)
+
+def test_ollama_output_name():
+    assert parse_ollama_output_name("gemma3_27b__bodies_5_message_output.jsonl") == ResultFile("Ollama", "gemma3_27b", "5", False)
+    assert parse_ollama_output_name("gemma3_27b__bodies_5_response_output.jsonl") is None
+
+def test_unrelated_names():
+    assert parse_result_file("openai_batch_gpt-4.1_bodies_20.jsonl") is None
+    assert parse_result_file("notes.jsonl") is None
+
+def test_thresholds_from_names():
+    assert threshold_from_colormap_name("bodies_20_colormap.jsonl") == 20
+    assert threshold_from_colormap_name("bodies_20.jsonl") is None
+    assert threshold_from_bodies_name("data/run_1/parsed_inputs/bodies_20.jsonl") == 20
+    assert threshold_from_results_column("exact_matches_10") == 10
+    assert threshold_from_results_column("model") is None
+
+def test_index_from_custom_id():
+    assert index_from_custom_id("170_gpt-4.1") == 170
+    assert index_from_custom_id("gpt-4.1") is None
+    assert index_from_custom_id("12a_gpt") is None
+    assert index_from_custom_id(None) is None
+
+def test_openai_errors_path():
+    assert openai_errors_path("data/run_1/open_ai_results_10/openai_results_o4-mini_structured_bodies_10.jsonl") == \
+        "data/run_1/open_ai_errors_10/openai_errors_o4-mini_structured_bodies_10.jsonl"
@@ -0,0 +1,43 @@
+from schwartz_hearst import detect_abbreviations, best_long_form
+
+def test_simple_definition_resolved_locally():
+    definitions, needs_llm = detect_abbreviations("Patients with cystic fibrosis (CF) are frequently misdiagnosed.")
+    assert definitions == [{"abbreviation": "CF", "definition": "cystic fibrosis"}]
+    assert not needs_llm
+
+def test_multiple_definitions_and_non_abbreviation_parentheticals():
+    text = "We measured tumor necrosis factor alpha (TNF-alpha) and interleukin-6 (IL-6) levels (p < 0.05; n = 12)."
+    definitions, needs_llm = detect_abbreviations(text)
+    assert [d["abbreviation"] for d in definitions] == ["TNF-alpha", "IL-6"]
+    assert definitions[0]["definition"] == "tumor necrosis factor alpha"
+    assert not needs_llm
+
+def test_short_form_with_trailing_annotation():
+    definitions, needs_llm = detect_abbreviations("Primary ciliary dyskinesia (PCD; OMIM 244400) is rare.")
+    assert definitions == [{"abbreviation": "PCD", "definition": "Primary ciliary dyskinesia"}]
+    assert not needs_llm
+
+def test_no_parentheses_needs_no_llm():
+    assert detect_abbreviations("Text with no abbreviations at all.") == ([], False)
+
+def test_nested_definition_goes_to_llm():
+    _, needs_llm = detect_abbreviations("The protein (heat shock protein 70 (HSP70)) was measured.")
+    assert needs_llm
+
+def test_reversed_definition_goes_to_llm():
+    _, needs_llm = detect_abbreviations("The HSP70 (heat shock protein 70) level was high.")
+    assert needs_llm
+
+def test_unresolved_abbreviation_goes_to_llm():
+    _, needs_llm = detect_abbreviations("The level of XYZQ (ABC) was high.")
+    assert needs_llm
+
+def test_abbreviation_inside_definition_goes_to_llm():
+    text = "In cystic fibrosis (CF) the CF transmembrane regulator (CFTR) is mutated."
+    definitions, needs_llm = detect_abbreviations(text)
+    assert {"abbreviation": "CFTR", "definition": "CF transmembrane regulator"} in definitions
+    assert needs_llm
+
+def test_best_long_form_requires_word_start():
+    assert best_long_form("CF", "cystic fibrosis") == "cystic fibrosis"
+    assert best_long_form("XZ", "cystic fibrosis") is None
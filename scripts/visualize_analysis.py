@@ -1,7 +1,26 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import argparse
 import os
+import io
+import re
+import html
+import base64
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+
+COLUMNS_TO_PLOT = [
+    'Completed', 'FracSingleExact', 'FracJsonError', 'AvgNumExact',
+    'AvgFracMissing', 'AvgFracMismatched', 'AvgDuration', 'PromptsPerHour', 'TotalDurationDays',
+    'AvgCost', 'TotalCost'
+]
+COST_COLUMNS = ['AvgCost', 'TotalCost']
+TITLES = {'TotalDurationDays': 'Total Duration'}
+YLABELS = {'TotalDurationDays': 'Total Duration (days)'}
+# Runs compared in one plot are told apart by line style; models keep one color across all plots
+LINESTYLES = ['-', '--', ':', '-.']
+
 
 def parse_duration_to_days(s):
     if pd.isnull(s) or not isinstance(s, str):
@@ -16,7 +35,6 @@ def parse_duration_to_days(s):
     except Exception:
         pass
     # Try manual parsing (e.g., '1 days 02:03:04')
-    import re
     match = re.match(r"(?:(\d+) days? )?(\d+):(\d+):(\d+)", s)
     if match:
         days = int(match.group(1)) if match.group(1) else 0
@@ -26,11 +44,180 @@ def parse_duration_to_days(s):
         return days + (hours * 3600 + minutes * 60 + seconds) / 86400
     return None
 
+
+def load_aggregated(input_path):
+    """Read an aggregated TSV with every plotted column (and its CI bounds) converted to numbers once."""
+    df = pd.read_csv(input_path, sep='\t')
+    df.columns = [col.strip() for col in df.columns]
+    df['Threshold'] = pd.to_numeric(df['Threshold'], errors='coerce')
+    df = df.dropna(subset=['Threshold', 'Model']).copy()
+    df['Model'] = df['Model'].astype(str)
+    # Plot structured-output variants as their own series
+    if 'Structured' in df.columns:
+        structured = df['Structured'].astype(str) == 'True'
+        df.loc[structured, 'Model'] = df.loc[structured, 'Model'] + ' [structured]'
+    # Aggregated TSVs from before TotalDurationDays hold a "Xd Yh Zm" TotalDuration string
+    if 'TotalDurationDays' not in df.columns and 'TotalDuration' in df.columns:
+        df['TotalDurationDays'] = df['TotalDuration'].apply(parse_duration_to_days)
+    for col in COLUMNS_TO_PLOT:
+        for name in (col, f'{col}Low', f'{col}High'):
+            if name in df.columns:
+                df[name] = pd.to_numeric(df[name], errors='coerce')
+    return df
+
+
+def metric_series(df, col):
+    """The rows of df to plot for col and the model order, or None when there is nothing to plot."""
+    if col not in df.columns:
+        return None
+    rows = df.dropna(subset=[col])
+    if col in COST_COLUMNS:
+        # Only plot models that actually have cost data, most expensive at threshold 20 first
+        has_cost = rows.groupby('Model')[col].apply(lambda x: (x != 0).any())
+        rows = rows[rows['Model'].isin(has_cost[has_cost].index)]
+        cost_at_20 = rows[rows['Threshold'] == 20].set_index('Model')[col]
+        models = cost_at_20.sort_values(ascending=False).index.tolist()
+        models += sorted(set(rows['Model']) - set(models))
+    else:
+        models = sorted(rows['Model'].unique())
+    if rows.empty:
+        return None
+    keep = [c for c in ('Model', 'Threshold', col, f'{col}Low', f'{col}High') if c in rows.columns]
+    return rows[keep].sort_values('Threshold', kind='stable'), models
+
+
+def draw_metric(ax, col, runs, colors):
+    """
+    Plot col against threshold on ax, one line per model and run. runs is a list of (run name, rows, models);
+    the run name is only added to the labels when several runs are compared.
+    """
+    low_col, high_col = f'{col}Low', f'{col}High'
+    has_ci = False
+    for i, (run, rows, models) in enumerate(runs):
+        run_has_ci = low_col in rows.columns and high_col in rows.columns
+        has_ci = has_ci or run_has_ci
+        groups = dict(tuple(rows.groupby('Model', sort=False)))
+        for model in models:
+            group = groups[model]
+            style = dict(marker='o', color=colors.get(model), linestyle=LINESTYLES[i % len(LINESTYLES)],
+                         label=model if len(runs) == 1 else f'{model} ({run})')
+            if run_has_ci:
+                # Bootstrap confidence intervals from analyze.py become error bars
+                yerr = [(group[col] - group[low_col]).clip(lower=0).fillna(0), (group[high_col] - group[col]).clip(lower=0).fillna(0)]
+                ax.errorbar(group['Threshold'], group[col], yerr=yerr, capsize=3, **style)
+            else:
+                ax.plot(group['Threshold'], group[col], **style)
+    ax.set_xlabel('Threshold')
+    ax.set_ylabel(YLABELS.get(col, col))
+    ax.set_title(f'{TITLES.get(col, col)} vs Threshold by Model' + (' (bootstrap CI)' if has_ci else ''))
+
+
+def figure_output(fig, out_path):
+    """Write fig to out_path, or return it as a base64 PNG when out_path is None, then release it."""
+    if out_path is None:
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', bbox_inches='tight')
+        result = base64.b64encode(buf.getvalue()).decode('ascii')
+    else:
+        fig.savefig(out_path, bbox_inches='tight')
+        result = out_path
+    fig.clear()
+    return result
+
+
+def render_metric(task):
+    """Draw one metric into its own Agg figure. Runs in a worker process when --workers > 1."""
+    col, runs, colors, out_path = task
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    draw_metric(ax, col, runs, colors)
+    ax.legend(title='Model', bbox_to_anchor=(1.05, 1), loc='upper left')
+    return figure_output(fig, out_path)
+
+
+def render_grid(task):
+    """Draw every metric as one facet of a single figure with a shared legend."""
+    metric_runs, colors, out_path = task
+    ncols = min(3, len(metric_runs))
+    nrows = -(-len(metric_runs) // ncols)
+    fig = Figure(figsize=(6 * ncols, 4 * nrows))
+    axes = fig.subplots(nrows, ncols, squeeze=False).ravel()
+    for ax, (col, runs) in zip(axes, metric_runs):
+        draw_metric(ax, col, runs, colors)
+    for ax in axes[len(metric_runs):]:
+        ax.set_visible(False)
+    legend = {}
+    for ax in axes[:len(metric_runs)]:
+        for handle, label in zip(*ax.get_legend_handles_labels()):
+            legend.setdefault(label, handle)
+    fig.legend(list(legend.values()), list(legend.keys()), title='Model', loc='upper left', bbox_to_anchor=(1.0, 1.0))
+    fig.tight_layout()
+    return figure_output(fig, out_path)
+
+
+def model_colors(frames):
+    """One color per model across every plot, in sorted model order."""
+    cycle = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+    models = sorted(set().union(*(df['Model'] for df in frames)))
+    return {model: cycle[i % len(cycle)] for i, model in enumerate(models)}
+
+
+def metric_runs(named_frames):
+    """[(col, [(run, rows, models), ...])] for every metric with data in at least one run, in COLUMNS_TO_PLOT order."""
+    found = []
+    for col in COLUMNS_TO_PLOT:
+        runs = []
+        for run, df in named_frames:
+            series = metric_series(df, col)
+            if series is not None:
+                runs.append((run, *series))
+        if runs:
+            found.append((col, runs))
+    return found
+
+
+def write_dashboard(named_frames, images, grid_image, out_path):
+    """A single HTML file with the plots inlined as base64 PNGs and the aggregated table of every run."""
+    runs = ', '.join(html.escape(run) for run, _ in named_frames)
+    parts = [
+        '<!DOCTYPE html>', '<html><head><meta charset="utf-8">', f'<title>BAGEL analysis: {runs}</title>',
+        '<style>body{font-family:sans-serif;margin:2em}img{max-width:100%}'
+        'table{border-collapse:collapse;font-size:0.85em}td,th{border:1px solid #ccc;padding:2px 6px}'
+        '.plots{display:grid;grid-template-columns:repeat(auto-fill,minmax(600px,1fr));gap:1em}</style>',
+        '</head><body>', f'<h1>BAGEL analysis: {runs}</h1>',
+    ]
+    if len(named_frames) > 1:
+        parts.append('<p>Line styles: ' + ', '.join(
+            f'{html.escape(run)} <code>{LINESTYLES[i % len(LINESTYLES)]}</code>' for i, (run, _) in enumerate(named_frames)) + '</p>')
+    if grid_image:
+        parts += ['<h2>All metrics</h2>', f'<img src="data:image/png;base64,{grid_image}" alt="All metrics">']
+    parts.append('<h2>Metrics</h2><div class="plots">')
+    for col, image in images:
+        parts.append(f'<div><h3>{html.escape(col)}</h3><img src="data:image/png;base64,{image}" alt="{html.escape(col)}"></div>')
+    parts.append('</div>')
+    for run, df in named_frames:
+        parts += [f'<h2>Aggregated results: {html.escape(run)}</h2>', df.to_html(index=False, na_rep='', float_format=lambda v: f'{v:.4g}')]
+    parts.append('</body></html>')
+    with open(out_path, 'w') as f:
+        f.write('\n'.join(parts))
+
+
+def render_all(render, tasks, workers):
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(render, tasks))
+    return [render(task) for task in tasks]
+
+
 def main():
     parser = argparse.ArgumentParser(description="Visualize analysis output for BAGEL.")
     parser.add_argument('--run', default='run_1', help='Run directory name (default: run_1)')
     parser.add_argument('--input', help='Aggregated analysis TSV file')
     parser.add_argument('--out', help='Output plot file (for duration plot)')
+    parser.add_argument('--grid', action='store_true', help='Also draw all metrics as facets of one figure (metrics_grid.png)')
+    parser.add_argument('--dashboard', action='store_true', help='Also write a self-contained dashboard.html')
+    parser.add_argument('--compare', nargs='+', default=[], metavar='RUN', help='Other runs to overlay in the dashboard')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes rendering plots (default: 1)')
     args = parser.parse_args()
 
     run_dir = os.path.join('data', args.run)
@@ -39,68 +226,34 @@ def main():
     os.makedirs(viz_dir, exist_ok=True)
     out_path = args.out if args.out else os.path.join(viz_dir, 'avg_duration_vs_threshold.png')
 
-    # Generalized: Plot all relevant columns vs Threshold by Model
-    df_agg = pd.read_csv(input_path, sep='\t')
-    df_agg.columns = [col.strip() for col in df_agg.columns]
-    df_agg['Threshold'] = pd.to_numeric(df_agg['Threshold'], errors='coerce')
-    df_agg = df_agg.dropna(subset=['Threshold', 'Model'])
-    columns_to_plot = [
-        'Completed', 'FracSingleExact', 'FracJsonError', 'AvgNumExact',
-        'AvgFracMissing', 'AvgFracMismatched', 'AvgDuration', 'TotalDuration',
-        'AvgCost', 'TotalCost'
-    ]
-    for col in columns_to_plot:
-        if col not in df_agg.columns:
-            continue
-        if col == 'TotalDuration':
-            df_plot = df_agg[df_agg[col] != '']
-            df_plot['TotalDurationDays'] = df_plot[col].apply(parse_duration_to_days)
-            df_plot = df_plot.dropna(subset=['TotalDurationDays', 'Threshold', 'Model'])
-            if df_plot.empty:
-                continue
-            sorted_models = sorted(df_plot['Model'].unique())
-            plt.figure(figsize=(10, 6))
-            for model in sorted_models:
-                group = df_plot[df_plot['Model'] == model]
-                plt.plot(group['Threshold'], group['TotalDurationDays'], marker='o', label=model)
-            plt.xlabel('Threshold')
-            plt.ylabel('Total Duration (days)')
-            plt.title('Total Duration vs Threshold by Model')
-            plt.legend()
-            plt.tight_layout()
-            plt.savefig(out_path)
-            print(f"Saved plot to {out_path}")
-        else:
-            df_plot = df_agg[df_agg[col] != '']
-            df_plot[col] = pd.to_numeric(df_plot[col], errors='coerce')
-            df_plot = df_plot.dropna(subset=[col, 'Threshold', 'Model'])
-            if df_plot.empty:
+    # Load and prepare every series once; figures are built from these frames
+    df_agg = load_aggregated(input_path)
+    colors = model_colors([df_agg])
+    metrics = metric_runs([(args.run, df_agg)])
+    tasks = [(col, runs, colors, out_path if col == 'TotalDurationDays' else os.path.join(viz_dir, f'{col.lower()}_vs_threshold.png'))
+             for col, runs in metrics]
+    for path in render_all(render_metric, tasks, args.workers):
+        print(f"Saved plot to {path}")
+    if args.grid and metrics:
+        grid_path = os.path.join(viz_dir, 'metrics_grid.png')
+        render_grid((metrics, colors, grid_path))
+        print(f"Saved plot to {grid_path}")
+
+    if args.dashboard:
+        named_frames = [(args.run, df_agg)]
+        for run in args.compare:
+            compare_path = os.path.join('data', run, 'evaluation_summary_all_aggregated.tsv')
+            if not os.path.exists(compare_path):
+                print(f"Warning: {compare_path} does not exist; skipping run {run}.")
                 continue
-            # For cost columns, only plot models that actually have cost data
-            if col in ['AvgCost', 'TotalCost']:
-                # Find models with at least one non-null, non-zero cost value
-                models_with_cost = df_plot.groupby('Model')[col].apply(lambda x: (x.notnull() & (x != 0)).any())
-                valid_models = models_with_cost[models_with_cost].index
-                df_plot = df_plot[df_plot['Model'].isin(valid_models)]
-                if df_plot.empty:
-                    continue
-                # Sort models by value at threshold=20 (descending)
-                cost_at_20 = df_plot[df_plot['Threshold'] == 20].set_index('Model')[col]
-                sorted_models = cost_at_20.sort_values(ascending=False).index.tolist()
-            else:
-                sorted_models = sorted(df_plot['Model'].unique())
-            plt.figure(figsize=(10, 6))
-            for model in sorted_models:
-                group = df_plot[df_plot['Model'] == model]
-                plt.plot(group['Threshold'], group[col], marker='o', label=model)
-            plt.xlabel('Threshold')
-            plt.ylabel(col)
-            plt.title(f'{col} vs Threshold by Model')
-            plt.legend(title='Model', bbox_to_anchor=(1.05, 1), loc='upper left')
-            plt.tight_layout()
-            out_path = os.path.join(viz_dir, f'{col.lower()}_vs_threshold.png')
-            plt.savefig(out_path)
-            print(f"Saved plot to {out_path}")
+            named_frames.append((run, load_aggregated(compare_path)))
+        colors = model_colors([df for _, df in named_frames])
+        compared = metric_runs(named_frames)
+        images = render_all(render_metric, [(col, runs, colors, None) for col, runs in compared], args.workers)
+        grid_image = render_grid((compared, colors, None)) if args.grid and compared else None
+        dashboard_path = os.path.join(viz_dir, 'dashboard.html')
+        write_dashboard(named_frames, [(col, image) for (col, _), image in zip(compared, images)], grid_image, dashboard_path)
+        print(f"Saved dashboard to {dashboard_path}")
 
 if __name__ == "__main__":
     main()